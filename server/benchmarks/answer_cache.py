@@ -0,0 +1,130 @@
+"""Latency and LLM calls saved by the semantic answer cache on a repetitive workload.
+
+Questions are drawn from a small set of topics with a skewed popularity, each
+asked in several phrasings. The stub embedder maps phrasings of the same
+question to nearby vectors, like a real embedding model would.
+
+    python -m benchmarks.answer_cache --requests 300 --topics 30
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("BM25_ENABLED", "false")
+
+import httpx
+from fastapi import FastAPI
+
+import routes.chat
+from benchmarks.stubs import FakeChatModel, FakeEmbeddings, FakeIndex, fake_vector, seed_index
+from modules.answer_cache import get_answer_cache
+from modules.llm import get_llm_chain
+from modules.resources import ResourceRegistry
+from routes.chat import router as chat_router
+from routes.stats import router as stats_router
+
+PHRASINGS = [
+    "What does section {n} explain?",
+    "what does section {n} explain",
+    "What does Section {n} explain ?",
+    "WHAT DOES SECTION {n} EXPLAIN?",
+]
+
+
+class ParaphraseEmbeddings(FakeEmbeddings):
+    """Case and punctuation changes move the vector only slightly"""
+
+    def embed_queries(self, texts, **kwargs):
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str, **kwargs):
+        return self.embed_queries([text])[0]
+
+    def _vector(self, text: str):
+        canonical = fake_vector(re.sub(r"[^a-z0-9 ]", "", text.lower()).strip(), self.dimension)
+        noise = fake_vector(text, self.dimension)
+        return [c + 0.05 * n for c, n in zip(canonical, noise)]
+
+
+def build_app(args, llm: FakeChatModel) -> FastAPI:
+    index = FakeIndex(latency=args.query_latency)
+    embeddings = ParaphraseEmbeddings(latency=args.embed_latency)
+    seed_index(index, embeddings, [f"Section {i} explains stub behaviour number {i} at length." for i in range(50)])
+    app = FastAPI()
+    app.state.resources = ResourceRegistry({
+        "index": lambda: index,
+        "embeddings": lambda: embeddings,
+        "chain": lambda: get_llm_chain(llm=llm),
+    })
+    app.include_router(chat_router)
+    app.include_router(stats_router)
+    return app
+
+
+async def run(app: FastAPI, questions, concurrency: int) -> list:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(question: str):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/chat/", data={"question": question})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(question) for question in questions))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--topics", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--query-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(args.topics)]
+    questions = [
+        rng.choice(PHRASINGS).format(n=rng.choices(range(args.topics), weights)[0])
+        for _ in range(args.requests)
+    ]
+
+    for enabled in (False, True):
+        routes.chat.ANSWER_CACHE_ENABLED = enabled
+        get_answer_cache().clear()
+        llm = FakeChatModel(latency=args.llm_latency)
+        app = build_app(args, llm)
+        start = time.perf_counter()
+        latencies = asyncio.run(run(app, questions, args.concurrency))
+        elapsed = time.perf_counter() - start
+        print(
+            f"cache {'on ' if enabled else 'off'}: {len(latencies) / elapsed:6.1f} req/s  "
+            f"mean {statistics.mean(latencies) * 1000:7.1f}ms  "
+            f"p50 {statistics.median(latencies) * 1000:7.1f}ms  wall {elapsed:.1f}s"
+        )
+
+    info = get_answer_cache().info()
+    print(
+        f"hit rate {info['hit_rate']:.1%} ({info['hits']} hits, {info['stores']} answers stored), "
+        f"LLM time saved {info['seconds_saved']:.1f}s"
+    )
+    dropped = get_answer_cache().invalidate_files(["stub.pdf"])
+    print(f"re-indexing stub.pdf invalidates {dropped} cached answers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Questions per minute of /chat/batch vs. one /chat/ call per question, on local stubs.
+
+The corpus is seeded into the stub index with texts in a temporary chunk
+store, like ingestion leaves it. Questions are drawn from a few templates
+over section topics so retrieved chunks overlap, and `--duplicates` of them
+repeat an earlier question. The baseline posts each question to /chat/ with
+`--concurrency` clients in parallel, the way a regression script does today;
+the batch run uploads the same questions as one JSONL file. With
+`--llm-quota` the LLM stub accepts that many requests per second and answers
+the rest with a 429 and a Retry-After; both paths then go at the rate the
+Groq limiter (modules.rate_limit) learns from those 429s. Vectors live in a local index behind a simulated round
+trip, and batch generations get as many slots as the baseline has clients.
+
+    python -m benchmarks.batch_questions --questions 500 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "stub")
+# Evaluation runs want fresh answers, not answer cache hits
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("BM25_ENABLED", "false")
+os.environ.setdefault("CHUNK_STORE_PATH", os.path.join(tempfile.mkdtemp(), "chunk_store.db"))
+os.environ.setdefault("BATCH_LLM_CONCURRENCY", "8")
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.stubs import FakeChatModel, FakeEmbeddings, Quota, RemoteIndex, fake_vector
+from modules.batch_questions import generation_scheduler
+from modules.chunk_store import get_chunk_store, index_metadata
+from modules.llm import get_llm_chain
+from modules.rate_limit import get_limiter
+from modules.resources import ResourceRegistry
+from routes.chat import router as chat_router
+
+TOPICS = ["replication", "backups", "failover", "indexing", "compaction", "quotas", "auditing", "encryption"]
+TEMPLATES = [
+    "How does {topic} work in section {n}?",
+    "What are the limits of {topic} described in section {n}?",
+    "Which settings control {topic} according to section {n}?",
+]
+
+
+def build_app(args) -> FastAPI:
+    index = RemoteIndex(tempfile.mkdtemp())
+    index.latency = args.query_latency
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    texts = [
+        f"Section {n} covers {topic}: how {topic} is configured, its limits and the settings that control it in detail."
+        for n in range(args.sections) for topic in TOPICS
+    ]
+    ids = [f"manual.pdf:{i}" for i in range(len(texts))]
+    metadatas = [{"filename": "manual.pdf", "page": i, "page_label": str(i + 1)} for i in range(len(texts))]
+    get_chunk_store().put("manual.pdf", {"title": "Operations Manual"}, ids, texts, metadatas)
+    index.upsert([
+        {"id": vector_id, "values": fake_vector(text), "metadata": index_metadata({**metadata, "text": text})}
+        for vector_id, text, metadata in zip(ids, texts, metadatas)
+    ])
+    llm = FakeChatModel(latency=args.llm_latency, quota=Quota(args.llm_quota) if args.llm_quota else None)
+    app = FastAPI()
+    app.state.resources = ResourceRegistry({
+        "index": lambda: index,
+        "embeddings": lambda: embeddings,
+        "chain": lambda: get_llm_chain(llm=llm),
+    })
+    app.include_router(chat_router)
+    app.state.stubs = {"embeddings": embeddings, "llm": llm}
+    return app
+
+
+def make_questions(count: int, sections: int, duplicates: float, rng: random.Random) -> list:
+    questions = []
+    for _ in range(count):
+        if questions and rng.random() < duplicates:
+            questions.append(rng.choice(questions))
+        else:
+            questions.append(rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS), n=rng.randrange(sections)))
+    return questions
+
+
+async def run_single(app: FastAPI, questions: list, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        failed = 0
+
+        async def one(question: str):
+            nonlocal failed
+            async with semaphore:
+                response = await client.post("/chat/", data={"question": question})
+                if response.status_code != 200 or response.json().get("answer") in (None, "No answer provided"):
+                    failed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(question) for question in questions))
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "failed": failed}
+
+
+async def run_batch(app: FastAPI, questions: list) -> dict:
+    body = "".join(json.dumps({"id": i, "question": question}) + "\n" for i, question in enumerate(questions))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        start = time.perf_counter()
+        lines = []
+        async with client.stream("POST", "/chat/batch", files={"questions": ("questions.jsonl", body)}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    lines.append(json.loads(line))
+        seconds = time.perf_counter() - start
+    summary = lines[-1]["summary"]
+    return {"seconds": seconds, "failed": summary["failed"], "summary": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--sections", type=int, default=40)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--query-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--llm-quota", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = build_app(args)
+    questions = make_questions(args.questions, args.sections, args.duplicates, random.Random(0))
+    print(f"{len(questions)} questions, {len(set(questions))} distinct, {args.sections * len(TOPICS)} chunks")
+
+    for label, run in (
+        (f"/chat/ x{len(questions)}, {args.concurrency} concurrent", lambda: run_single(app, questions, args.concurrency)),
+        ("/chat/batch", lambda: run_batch(app, questions)),
+    ):
+        embeddings, llm = app.state.stubs["embeddings"], app.state.stubs["llm"]
+        calls, llm_rejected = embeddings.calls, llm.quota.rejected if llm.quota else 0
+        result = asyncio.run(run())
+        print(
+            f"{label}: {result['seconds']:.2f}s  {len(questions) / result['seconds'] * 60:8,.0f} questions/min  "
+            f"{result['failed']} failed  {embeddings.calls - calls} embedding calls  {(llm.quota.rejected if llm.quota else 0) - llm_rejected} LLM 429s"
+        )
+        if "summary" in result:
+            summary = result["summary"]
+            print(
+                f"  {summary['unique']} unique, {summary['chunks_fetched']} chunks read from the store, "
+                f"{summary['chunks_reused']} reused"
+            )
+    print(f"scheduler: {generation_scheduler.info()}  groq limiter: {get_limiter('groq').info()}")
+
+
+if __name__ == "__main__":
+    main()
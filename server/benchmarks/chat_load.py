@@ -0,0 +1,94 @@
+"""Load test /chat/ against local stub services to check that requests overlap.
+
+Embedding and index stubs block their calling thread, the LLM stub awaits,
+mirroring the real SDKs. With the staged async pipeline throughput should grow
+with client concurrency instead of staying flat, and a cheap endpoint polled
+alongside should stay fast.
+
+    python -m benchmarks.chat_load --requests 64 --levels 1,4,16
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "stub")
+# Measure the full request path, not answer cache hits
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("BM25_ENABLED", "false")
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.stubs import FakeChatModel, FakeEmbeddings, FakeIndex, seed_index
+from modules.llm import get_llm_chain
+from modules.resources import ResourceRegistry
+from routes.chat import router as chat_router
+from routes.stats import router as stats_router
+
+
+def build_app(args) -> FastAPI:
+    index = FakeIndex(latency=args.query_latency)
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    seed_index(index, embeddings, [f"Section {i} explains stub behaviour number {i} at length." for i in range(50)])
+    app = FastAPI()
+    app.state.resources = ResourceRegistry({
+        "index": lambda: index,
+        "embeddings": lambda: embeddings,
+        "chain": lambda: get_llm_chain(llm=FakeChatModel(latency=args.llm_latency)),
+    })
+    app.include_router(chat_router)
+    app.include_router(stats_router)
+    return app
+
+
+async def run_level(app: FastAPI, concurrency: int, total: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+        probe_latencies = []
+
+        async def one(i: int):
+            async with semaphore:
+                response = await client.post("/chat/", data={"question": f"What does section {i} explain?"})
+                response.raise_for_status()
+
+        async def probe():
+            # A cheap request that should never wait behind slow chat calls
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/stats/pool")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    return {
+        "concurrency": concurrency,
+        "requests_per_second": round(total / elapsed, 2),
+        "probe_max_ms": round(1000 * max(probe_latencies, default=0.0), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--levels", default="1,4,16")
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--query-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    app = build_app(args)
+    for level in (int(level) for level in args.levels.split(",")):
+        print(asyncio.run(run_level(app, level, args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare /chat/ throughput with shared clients vs per-request construction.
+
+Run from the server directory:
+
+    python -m benchmarks.chat_pool --requests 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "stub")
+# Measure the full request path, not answer cache hits
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("BM25_ENABLED", "false")
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.stubs import FakeChatModel, FakeEmbeddings, FakeIndex, FakePinecone, seed_index
+from modules.llm import get_llm_chain
+from modules.resources import ResourceRegistry
+from routes.chat import router as chat_router
+from routes.stats import router as stats_router
+
+
+class PerRequestRegistry(ResourceRegistry):
+    """Rebuilds every client on each use, like the old /chat/ handler did"""
+
+    def get(self, name: str):
+        start = time.perf_counter()
+        resource = self._factories[name]()
+        stats = self._stats[name]
+        stats["created"] += 1
+        stats["build_seconds"] += time.perf_counter() - start
+        return resource
+
+
+def build_factories(args, index: FakeIndex) -> dict:
+    return {
+        "index": lambda: FakePinecone(setup_cost=args.client_setup, index=index).Index("ragindex"),
+        "embeddings": lambda: FakeEmbeddings(latency=args.embed_latency, setup_cost=args.client_setup),
+        "chain": lambda: get_llm_chain(llm=FakeChatModel(latency=args.llm_latency)),
+    }
+
+
+async def run(registry: ResourceRegistry, args) -> dict:
+    app = FastAPI()
+    app.state.resources = registry
+    app.include_router(chat_router)
+    app.include_router(stats_router)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(i: int):
+            async with semaphore:
+                response = await client.post("/chat/", data={"question": f"What does section {i % 7} say?"})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        stats = (await client.get("/stats/pool")).json()
+
+    build_seconds = sum(r["build_seconds"] for r in stats["resources"].values())
+    return {
+        "requests_per_second": round(args.requests / elapsed, 1),
+        "setup_ms_per_request": round(1000 * build_seconds / args.requests, 2),
+        "clients_created": sum(r["created"] for r in stats["resources"].values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--client-setup", type=float, default=0.02, help="seconds to build one client")
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    index = FakeIndex()
+    embeddings = FakeEmbeddings()
+    seed_index(index, embeddings, [f"Section {i} describes stub behaviour number {i} in detail." for i in range(50)])
+
+    for label, registry_cls in (("per-request", PerRequestRegistry), ("shared", ResourceRegistry)):
+        result = asyncio.run(run(registry_cls(build_factories(args, index)), args))
+        print(f"{label:>12}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Time to first byte of /chat/stream vs. the blocking /chat/ endpoint.
+
+Requests are driven straight through the ASGI interface so every body chunk
+is timestamped as the app sends it (httpx's ASGI transport buffers). The last
+part disconnects a client mid-answer and checks that generation stops.
+
+    python -m benchmarks.chat_stream --requests 20 --llm-latency 0.4 --token-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from urllib.parse import urlencode
+
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("BM25_ENABLED", "false")
+
+from fastapi import FastAPI
+
+from benchmarks.stubs import FakeChatModel, FakeEmbeddings, FakeIndex, seed_index
+from modules.llm import get_llm_chain
+from modules.resources import ResourceRegistry
+from routes.chat import router as chat_router
+from routes.stats import router as stats_router
+
+ANSWER = " ".join(f"word{i}" for i in range(60))
+
+
+def build_app(args, llm: FakeChatModel) -> FastAPI:
+    index = FakeIndex(latency=args.query_latency)
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    seed_index(index, embeddings, [f"Section {i} explains stub behaviour number {i} at length." for i in range(50)])
+    app = FastAPI()
+    app.state.resources = ResourceRegistry({
+        "index": lambda: index,
+        "embeddings": lambda: embeddings,
+        "chain": lambda: get_llm_chain(llm=llm),
+    })
+    app.include_router(chat_router)
+    app.include_router(stats_router)
+    return app
+
+
+async def asgi_post(app: FastAPI, path: str, form: dict, disconnect_after_events: int = None) -> dict:
+    """POST a form and timestamp each response body chunk"""
+    body = urlencode(form).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    }
+    disconnected = asyncio.Event()
+    request_sent = False
+    result = {"first_byte": None, "events": 0, "body": b""}
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            if result["first_byte"] is None:
+                result["first_byte"] = time.perf_counter() - start
+            result["body"] += message["body"]
+            result["events"] += message["body"].count(b"\n\n")
+            if disconnect_after_events and result["events"] >= disconnect_after_events:
+                disconnected.set()
+
+    await app(scope, receive, send)
+    disconnected.set()
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+def sse_events(body: bytes) -> list:
+    events = []
+    for block in body.decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--query-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="seconds until the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds between tokens")
+    args = parser.parse_args()
+
+    llm = FakeChatModel(latency=args.llm_latency + args.token_latency * (len(ANSWER.split()) - 1), answer=ANSWER)
+    blocking_app = build_app(args, llm)
+    streaming_llm = FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency, answer=ANSWER)
+    streaming_app = build_app(args, streaming_llm)
+
+    async def run():
+        blocking = [await asgi_post(blocking_app, "/chat/", {"question": f"What does section {i} explain?"}) for i in range(args.requests)]
+        streamed = [await asgi_post(streaming_app, "/chat/stream", {"question": f"What does section {i} explain?"}) for i in range(args.requests)]
+        done = [dict(sse_events(r["body"]))["done"] for r in streamed]
+        print(f"/chat/        first byte {statistics.mean(r['first_byte'] for r in blocking) * 1000:7.1f}ms  total {statistics.mean(r['total'] for r in blocking) * 1000:7.1f}ms")
+        print(
+            f"/chat/stream  first byte {statistics.mean(r['first_byte'] for r in streamed) * 1000:7.1f}ms  "
+            f"first token {statistics.mean(d['first_token_ms'] for d in done):7.1f}ms  "
+            f"total {statistics.mean(r['total'] for r in streamed) * 1000:7.1f}ms"
+        )
+
+        before = streaming_llm.tokens_streamed
+        # sources + 5 tokens, then the client goes away
+        await asgi_post(streaming_app, "/chat/stream", {"question": "What does section 1 explain?"}, disconnect_after_events=6)
+        await asyncio.sleep(args.token_latency * 10)
+        produced = streaming_llm.tokens_streamed - before
+        print(f"disconnect after 5 tokens: generation stopped at {produced}/{len(ANSWER.split())} tokens")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Vector payload sizes and query latency with chunk texts in the chunk store.
+
+Chunks come from the chunking benchmark's synthetic pages and document
+metadata, split by ChunkTable. The baseline is the previous layout, every
+vector carrying its text and all PDF metadata; the new one keeps only
+INDEX_METADATA_FIELDS in the index and puts the rest in a ChunkStore. Sizes
+are the JSON a Pinecone upsert / query sends, latency is top-k queries on the
+local index with metadata, plus the chunk store lookup /chat/ adds to hydrate
+the matches.
+
+    python -m benchmarks.chunk_store --pages 500 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.chunking import DOCUMENT_METADATA, page_text
+from modules.chunk_store import COMPRESSION, ChunkStore, index_metadata
+from modules.chunker import ChunkTable
+from modules.local_index import LocalVectorIndex
+
+FILENAME = "pipeline-operations-manual-rev7.pdf"
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def payload_bytes(vectors: list) -> int:
+    return len(json.dumps(vectors).encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=40)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    table = ChunkTable(dict(DOCUMENT_METADATA))
+    table.add_pages([(number, str(number + 1), page_text(rng)) for number in range(args.pages)])
+    chunks = list(table)
+    ids = [f"{FILENAME}:{i}" for i in range(len(chunks))]
+    full = [{**table.document, **chunk.metadata, "text": chunk.text, "filename": FILENAME} for chunk in chunks]
+    minimal = [index_metadata(metadata) for metadata in full]
+
+    vectors = np.random.default_rng(0).standard_normal((len(chunks), args.dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[np.random.default_rng(1).integers(0, len(chunks), args.queries)]
+    values = [[round(float(x), 7) for x in row] for row in vectors[:100]]
+    print(f"{len(chunks)} chunks from {args.pages} pages, {args.dimension}-d vectors, top_k {args.top_k}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChunkStore(os.path.join(directory, "chunk_store.db"))
+        start = time.perf_counter()
+        store.put(FILENAME, table.document, ids, [c.text for c in chunks], [c.metadata for c in chunks])
+        put_seconds = time.perf_counter() - start
+        info = store.info()
+        raw = sum(len(json.dumps(metadata).encode("utf-8")) for metadata in full)
+
+        for label, metadatas in (("text + metadata in index", full), ("chunk store", minimal)):
+            index = LocalVectorIndex(os.path.join(directory, label.replace(" ", "_")), dimension=args.dimension)
+            index.upsert([{"id": i, "values": v, "metadata": m} for i, v, m in zip(ids, vectors, metadatas)])
+            upsert = payload_bytes([{"id": i, "values": v, "metadata": m} for i, v, m in zip(ids, values, metadatas)])
+            response = index.query(queries[0], top_k=args.top_k, include_metadata=True)
+            query_bytes = payload_bytes(response["matches"])
+
+            latencies, hydrate = [], []
+            for query in queries:
+                start = time.perf_counter()
+                response = index.query(query, top_k=args.top_k, include_metadata=True)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if metadatas is minimal:
+                    start = time.perf_counter()
+                    store.get_many([match["id"] for match in response["matches"]])
+                    hydrate.append((time.perf_counter() - start) * 1000)
+            print(f"{label}:")
+            print(
+                f"  {statistics.mean(len(json.dumps(m)) for m in metadatas):7.0f} metadata bytes per vector  "
+                f"{upsert / 2**10:7.1f} KiB per 100-vector upsert  {query_bytes / 2**10:6.1f} KiB per query response"
+            )
+            print(f"  query p50 {statistics.median(latencies):.2f}ms  p95 {percentile(latencies, 0.95):.2f}ms")
+            if hydrate:
+                print(f"  hydrate p50 {statistics.median(hydrate):.2f}ms  p95 {percentile(hydrate, 0.95):.2f}ms")
+            index.close()
+
+        print(
+            f"chunk store ({COMPRESSION}): {info['stored_bytes'] / 2**20:.2f} MiB for {raw / 2**20:.2f} MiB of chunk JSON "
+            f"({raw / max(info['stored_bytes'], 1):.1f}x), written in {put_seconds * 1000:.0f}ms"
+        )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Throughput and memory of the token chunker vs. RecursiveCharacterTextSplitter.
+
+The baseline is the previous ingestion path: one Document per page carrying
+the PDF's metadata, split by RecursiveCharacterTextSplitter(500, 50) into
+Documents that each hold their own copy of it. The new path keeps pages as
+text, splits on precomputed boundary offsets within CHUNK_MAX_TOKENS and
+stores chunks as rows of a ChunkTable per INGEST_PAGES_PER_TASK page range. Pages come from the synthetic PDF
+word list, in sentences, lines and paragraphs, with the kind of document
+metadata pypdf reports. Both paths are timed on the same pages; memory is the
+tracemalloc peak while splitting, the size left allocated afterwards and the
+pickled size a worker process sends back.
+
+    python -m benchmarks.chunking --pages 2000
+"""
+import argparse
+import gc
+import pickle
+import random
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.synthetic_pdf import WORDS
+from modules.chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, ChunkTable
+from modules.context_builder import count_tokens
+from modules.pdf_extract import INGEST_PAGES_PER_TASK
+
+DOCUMENT_METADATA = {
+    "producer": "Microsoft® Word for Microsoft 365", "creator": "Microsoft® Word for Microsoft 365",
+    "creationdate": "2024-03-05T10:21:07+01:00", "moddate": "2024-03-05T10:21:07+01:00",
+    "author": "Documentation Team", "title": "Pipeline Operations Manual, Revision 7",
+    "source": "uploaded_docs/pipeline-operations-manual-rev7.pdf", "total_pages": 2000,
+}
+
+
+def page_text(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(3, 6)):
+        lines = []
+        for _ in range(rng.randint(2, 5)):
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + rng.choice(".;.?")
+                for _ in range(rng.randint(1, 3))
+            ]
+            lines.append(" ".join(sentences))
+        paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+
+def split_old(pages: list) -> list:
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, add_start_index=True)
+    documents = [
+        Document(page_content=text, metadata={**DOCUMENT_METADATA, "page": number, "page_label": str(number + 1)})
+        for number, text in enumerate(pages)
+    ]
+    return splitter.split_documents(documents)
+
+
+def split_new(pages: list) -> list:
+    # One table per page range, like the parse workers produce
+    tables = []
+    for first in range(0, len(pages), INGEST_PAGES_PER_TASK):
+        table = ChunkTable(dict(DOCUMENT_METADATA))
+        table.add_pages([(number, str(number + 1), pages[number]) for number in range(first, min(first + INGEST_PAGES_PER_TASK, len(pages)))])
+        tables.append(table)
+    return tables
+
+
+def measure(split, pages: list, runs: int) -> dict:
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        split(pages)
+        seconds.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    # Page texts are shared input, only what splitting adds is counted
+    result = split(pages)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": statistics.median(seconds), "peak": peak, "retained": retained, "result": result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [page_text(rng) for _ in range(args.pages)]
+    chars = sum(len(text) for text in pages)
+    print(f"{args.pages} pages, {chars / 2**20:.1f} MiB of text, {chars // args.pages} chars per page")
+
+    old = measure(split_old, pages, args.runs)
+    new = measure(split_new, pages, args.runs)
+    old_texts = [document.page_content for document in old["result"]]
+    new_texts = [chunk.text for table in new["result"] for chunk in table]
+    for label, stats, texts, payload in (
+        ("RecursiveCharacterTextSplitter(500, 50)", old, old_texts, pickle.dumps(old["result"])),
+        (f"ChunkTable({CHUNK_MAX_TOKENS} tokens, {CHUNK_OVERLAP_TOKENS} overlap)", new, new_texts, pickle.dumps(new["result"])),
+    ):
+        tokens = [count_tokens(text) for text in texts]
+        print(f"{label}:")
+        print(
+            f"  {stats['seconds'] * 1000:8.1f}ms  {args.pages / stats['seconds']:8,.0f} pages/s  "
+            f"{chars / stats['seconds'] / 2**20:6.1f} MiB/s  {len(texts) / stats['seconds']:9,.0f} chunks/s"
+        )
+        print(
+            f"  {len(texts)} chunks, {statistics.mean(len(t) for t in texts):.0f} chars and "
+            f"{statistics.mean(tokens):.0f} tokens on average, max {max(tokens)} tokens"
+        )
+        print(
+            f"  peak {stats['peak'] / 2**20:6.1f} MiB while splitting, {stats['retained'] / 2**20:6.1f} MiB retained, "
+            f"{len(payload) / 2**20:6.1f} MiB pickled"
+        )
+    print(f"speedup {old['seconds'] / new['seconds']:.1f}x, retained memory {old['retained'] / max(new['retained'], 1):.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
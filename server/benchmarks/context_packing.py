@@ -0,0 +1,117 @@
+"""Prompt tokens of the old first-5 context vs. token-budgeted packing.
+
+Candidate lists are built from a synthetic PDF the way they look in
+practice: most of the best matches sit on one page (so they overlap), the
+same passages also exist in a second revision of the document (near-duplicate
+embeddings), and the tail is unrelated chunks.
+
+    python -m benchmarks.context_packing --questions 200 --budget 800
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import fake_vector
+from benchmarks.synthetic_pdf import generate_corpus
+from modules.context_builder import TOKENIZER, Candidate, count_tokens, pack_context
+from modules.pdf_extract import extract_files
+
+
+def passage(candidate) -> tuple:
+    """The underlying passage, the same for both revisions of the manual"""
+    return candidate.metadata["page"], candidate.metadata["start_index"]
+
+
+def old_context(candidates) -> tuple:
+    """Previous /chat/ behaviour: first 5 distinct texts by score, no budget"""
+    docs, seen = [], set()
+    for candidate in sorted(candidates, key=lambda c: c.score, reverse=True):
+        if candidate.text in seen:
+            continue
+        seen.add(candidate.text)
+        docs.append(candidate)
+        if len(docs) >= 5:
+            break
+    return sum(count_tokens(c.text) + 2 for c in docs), len({passage(c) for c in docs})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--budget", type=int, default=800)
+    parser.add_argument("--candidates", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = generate_corpus(directory, 1, args.pages)[0]
+        chunks = [chunk for extracted in extract_files([path], workers=1) for chunk in extracted.chunks]
+
+    by_page = {}
+    for chunk in chunks:
+        by_page.setdefault(chunk.page, []).append(chunk)
+    rng = random.Random(0)
+
+    def candidate(chunk, score, source="manual.pdf", noise=0.0, suffix=""):
+        values = fake_vector(chunk.text)
+        if noise:
+            jitter = fake_vector(chunk.text + suffix)
+            values = [v + noise * j for v, j in zip(values, jitter)]
+        return Candidate(
+            id=f"{source}-{chunk.page}-{chunk.start}",
+            text=chunk.text + suffix,
+            score=score,
+            metadata={"source": source, "page": chunk.page, "start_index": chunk.start},
+            values=values,
+        )
+
+    old_tokens, new_tokens, pack_seconds = [], [], []
+    old_passages, new_passages = [], []
+    totals = {"duplicates": 0, "over_budget": 0, "merged": 0, "packed": 0}
+    for _ in range(args.questions):
+        page = rng.choice(list(by_page))
+        candidates = []
+        for i, chunk in enumerate(by_page[page][:6]):
+            score = 0.9 - 0.02 * i + rng.uniform(-0.005, 0.005)
+            candidates.append(candidate(chunk, score))
+            # Same passage in revision 2 of the manual, one trailing word changed
+            candidates.append(candidate(chunk, score - 0.001, source="manual-v2.pdf", noise=0.05, suffix=" (rev 2)"))
+        while len(candidates) < args.candidates:
+            candidates.append(candidate(rng.choice(chunks), rng.uniform(0.3, 0.6)))
+
+        tokens, passages = old_context(candidates)
+        old_tokens.append(tokens)
+        old_passages.append(passages)
+        by_id = {c.id: c for c in candidates}
+        start = time.perf_counter()
+        packed = pack_context(candidates, budget=args.budget)
+        pack_seconds.append(time.perf_counter() - start)
+        new_tokens.append(packed.tokens)
+        new_passages.append(len({passage(by_id[i]) for i in packed.doc_ids}))
+        totals["duplicates"] += packed.duplicates
+        totals["over_budget"] += packed.over_budget
+        totals["merged"] += packed.merged
+        totals["packed"] += len(packed.doc_ids)
+
+    print(f"tokenizer: {TOKENIZER}")
+    for label, tokens, passages in (
+        ("old first-5", old_tokens, old_passages),
+        (f"packed, budget {args.budget}", new_tokens, new_passages),
+    ):
+        print(
+            f"{label:>20}: mean {statistics.mean(tokens):6.1f} context tokens (max {max(tokens)}), "
+            f"{statistics.mean(passages):.1f} distinct passages, "
+            f"{100 * sum(passages) / sum(tokens):.2f} passages per 100 tokens"
+        )
+    n = args.questions
+    print(
+        f"per question: {totals['packed'] / n:.1f} chunks packed, {totals['duplicates'] / n:.1f} near-duplicates dropped, "
+        f"{totals['merged'] / n:.1f} merges, {totals['over_budget'] / n:.1f} over budget"
+    )
+    print(f"packing time: p50 {statistics.median(pack_seconds) * 1000:.2f}ms  max {max(pack_seconds) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Ingest the same synthetic corpus twice through the embedding cache.
+
+The second pass should hit the cache for every chunk and skip the provider.
+
+    python -m benchmarks.embed_cache_reingest --files 4 --pages 40
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+# Keep the default keyword index in the working directory out of the measurement
+os.environ.setdefault("BM25_ENABLED", "false")
+
+from benchmarks.stubs import FakeEmbeddings, FakeIndex
+from benchmarks.synthetic_pdf import generate_corpus
+from modules.embedding_cache import CachedEmbeddings, EmbeddingCache
+from modules.load_vectorstore import index_files
+from modules.manifest import DocumentManifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--embed-latency", type=float, default=0.2, help="seconds per 100-text provider call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_corpus(os.path.join(directory, "corpus"), args.files, args.pages)
+        cache = EmbeddingCache(os.path.join(directory, "cache.db"))
+        provider = FakeEmbeddings(latency=args.embed_latency)
+        embed_model = CachedEmbeddings(provider, cache, "stub-model")
+        for attempt in ("first", "second"):
+            calls_before = provider.calls
+            start = time.perf_counter()
+            # A fresh manifest per pass, otherwise the second one skips every file as unchanged
+            manifest = DocumentManifest(os.path.join(directory, f"manifest-{attempt}.db"))
+            chunks = index_files(paths, embed_model=embed_model, vector_index=FakeIndex(), manifest=manifest)
+            manifest.close()
+            elapsed = time.perf_counter() - start
+            print({
+                "pass": attempt,
+                "chunks": chunks,
+                "seconds": round(elapsed, 2),
+                "provider_calls": provider.calls - calls_before,
+                **cache.info(),
+            })
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
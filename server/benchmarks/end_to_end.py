@@ -0,0 +1,209 @@
+"""Ingestion throughput, chat latency and peak memory of the whole app on local stubs.
+
+For each corpus size (`--corpora`, FILESxPAGES) a fresh interpreter boots
+main.app with deterministic stand-ins for Google embeddings, Pinecone and
+Groq (benchmarks.stubs, latencies configurable), uploads a synthetic PDF
+corpus through /upload/ and waits for the ingestion jobs, then asks
+`--questions` questions through /chat/ with `--concurrency` clients.
+Everything goes through the ASGI app, middleware and background ingestion
+queue included; only the provider calls are stubbed.
+
+One JSON object per corpus is printed: pages/s and chunks/s from the first
+upload to the last finished job, chat p50/p95/p99, and the peak RSS of the
+server process and of its parse workers. `--output` also writes them, with
+the settings and git revision, to a file for tracking runs over time.
+
+    python -m benchmarks.end_to_end --corpora 10x10,40x25 --output e2e.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def child(corpus: str, args):
+    import asyncio
+    import httpx
+    import main
+    import modules.load_vectorstore
+    from benchmarks.stubs import FakeChatModel, FakeEmbeddings, RemoteIndex
+    from benchmarks.synthetic_pdf import WORDS, generate_corpus
+    from modules.llm import get_llm_chain
+    from modules.resources import ResourceRegistry
+
+    files, pages = (int(n) for n in corpus.lower().split("x"))
+    index = RemoteIndex("local_index")
+    index.latency = args.index_latency
+    embeddings = FakeEmbeddings(latency=args.embed_latency, text_latency=args.embed_text_latency)
+    llm = FakeChatModel(latency=args.llm_latency)
+    stubs = ResourceRegistry({
+        "index": lambda: index,
+        "embeddings": lambda: embeddings,
+        "chain": lambda: get_llm_chain(llm=llm),
+    })
+    # Routes get the registry from the lifespan, ingestion jobs use load_vectorstore's
+    main.registry = modules.load_vectorstore.registry = stubs
+    main.STARTUP_WARMUP = "blocking"
+    paths = generate_corpus("corpus", files, pages, seed=args.seed)
+    rng = random.Random(args.seed)
+    questions = [
+        f"What does the document say about {rng.choice(WORDS)} and {rng.choice(WORDS)}?" for _ in range(args.questions)
+    ]
+
+    async def ingest(client) -> dict:
+        start = time.perf_counter()
+        job_ids = []
+        for i in range(0, len(paths), args.files_per_upload):
+            batch = paths[i:i + args.files_per_upload]
+            handles = [open(path, "rb") for path in batch]
+            try:
+                response = await client.post(
+                    "/upload/", files=[("files", (os.path.basename(path), f, "application/pdf")) for path, f in zip(batch, handles)]
+                )
+            finally:
+                for f in handles:
+                    f.close()
+            response.raise_for_status()
+            job_ids.append(response.json()["job_id"])
+        jobs = []
+        for job_id in job_ids:
+            while True:
+                job = (await client.get(f"/upload/{job_id}")).json()
+                if job["status"] not in ("queued", "running"):
+                    break
+                await asyncio.sleep(0.05)
+            jobs.append(job)
+        seconds = time.perf_counter() - start
+        job_files = [f for job in jobs for f in job["files"]]
+        pages_done = sum(f.get("pages", 0) for f in job_files)
+        chunks_done = sum(f.get("chunks", 0) for f in job_files)
+        return {
+            "pages": pages_done,
+            "chunks": chunks_done,
+            "failed_files": sum(f.get("status") == "failed" for f in job_files),
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(pages_done / seconds, 1),
+            "chunks_per_second": round(chunks_done / seconds, 1),
+        }
+
+    async def chat(client) -> dict:
+        latencies = []
+        errors = 0
+        pending = iter(questions)
+
+        async def worker():
+            nonlocal errors
+            for question in pending:
+                start = time.perf_counter()
+                response = await client.post("/chat/", data={"question": question})
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        seconds = time.perf_counter() - start
+        return {
+            "questions": len(questions),
+            "errors": errors,
+            "concurrency": args.concurrency,
+            "questions_per_second": round(len(questions) / seconds, 1),
+            "p50_ms": round(1000 * percentile(latencies, 0.50), 1),
+            "p95_ms": round(1000 * percentile(latencies, 0.95), 1),
+            "p99_ms": round(1000 * percentile(latencies, 0.99), 1),
+        }
+
+    async def run() -> dict:
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+                return {"ingest": await ingest(client), "chat": await chat(client)}
+
+    result = {"corpus": corpus, "files": files, "pages_per_file": pages, **asyncio.run(run())}
+    # The parse pool shuts down without waiting, reap its workers so their peak is counted
+    while multiprocessing.active_children():
+        time.sleep(0.05)
+    result["peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF)
+    result["parse_workers_peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(json.dumps(result))
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpora", default="10x10,40x25,100x40", help="comma-separated FILESxPAGES corpus sizes")
+    parser.add_argument("--files-per-upload", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding call")
+    parser.add_argument("--embed-text-latency", type=float, default=0.0005, help="seconds per text embedded")
+    parser.add_argument("--index-latency", type=float, default=0.02, help="seconds per vector index call")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args)
+
+    results = []
+    for corpus in args.corpora.split(","):
+        with tempfile.TemporaryDirectory() as directory:
+            # Every store the app keeps (jobs, manifest, chunks, keyword index, uploads) lands in `directory`
+            env = dict(
+                os.environ, GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "stub"), LOG_LEVEL="WARNING",
+                ANSWER_CACHE_ENABLED="false", PYTHONPATH=os.pathsep.join(filter(None, [SERVER_DIR, os.environ.get("PYTHONPATH")])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.end_to_end", *sys.argv[1:], "--child", corpus],
+                cwd=directory, env=env, capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                sys.stderr.write(completed.stderr)
+                raise SystemExit(f"corpus {corpus} failed")
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(json.dumps(result))
+            results.append(result)
+
+    if args.output:
+        report = {
+            "benchmark": "end_to_end",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "revision": git_revision(),
+            "settings": {name: value for name, value in vars(args).items() if name not in ("child", "output")},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
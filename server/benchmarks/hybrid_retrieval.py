@@ -0,0 +1,165 @@
+"""Recall of dense-only, BM25-only and fused retrieval, plus BM25 latency at scale.
+
+The corpus is synthetic: chunks are drawn from topic vocabularies and a
+fraction of them mention an exact identifier (error code or part number).
+The stand-in embedding is a bag of word vectors that, like real embedding
+models, barely tells "E-1042" from "E-1043", so identifier questions are
+where keyword matching has to help. Topical questions check that fusion
+does not hurt what dense retrieval already gets right.
+
+    python -m benchmarks.hybrid_retrieval --chunks 200000 --queries 300
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from modules.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+DIMENSION = 128
+IDENTIFIER = re.compile(r"(?:E-|PN)\d+")
+
+
+class WordVectors:
+    """Bag-of-words embedding; identifiers contribute only a faint shared signal"""
+
+    def __init__(self, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.vectors = {}
+        self.identifier = self._vector()
+
+    def _vector(self):
+        vector = self.rng.standard_normal(DIMENSION).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def embed(self, text: str) -> np.ndarray:
+        total = np.zeros(DIMENSION, dtype=np.float32)
+        for word in text.split():
+            if IDENTIFIER.fullmatch(word):
+                total += 0.2 * self.identifier
+                continue
+            if word not in self.vectors:
+                self.vectors[word] = self._vector()
+            total += self.vectors[word]
+        norm = np.linalg.norm(total)
+        return total / norm if norm else total
+
+
+def build_corpus(rng: random.Random, chunks: int, topics: int, identifier_rate: float) -> tuple:
+    """Chunk texts plus {chunk number: identifier} for those mentioning one"""
+    general = [f"gen{i}" for i in range(2000)]
+    vocabularies = [[f"t{t}w{i}" for i in range(60)] for t in range(topics)]
+    texts, identifiers = [], {}
+    for n in range(chunks):
+        words = rng.choices(vocabularies[n % topics], k=28) + rng.choices(general, k=12)
+        if rng.random() < identifier_rate:
+            identifier = f"E-{n:06d}" if n % 2 else f"PN{n:07d}"
+            words.insert(rng.randrange(len(words)), identifier)
+            identifiers[n] = identifier
+        texts.append(" ".join(words))
+    return texts, identifiers
+
+
+def metrics(ranked: list, target: int, k: int) -> tuple:
+    """(hit within top k, reciprocal rank)"""
+    if target in ranked[:k]:
+        return 1, 1 / (ranked.index(target) + 1)
+    return 0, 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--relevance-chunks", type=int, default=20000, help="corpus size for the relevance part")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--identifier-rate", type=float, default=0.2)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        # Relevance: small enough to embed every chunk
+        texts, identifiers = build_corpus(rng, args.relevance_chunks, args.topics, args.identifier_rate)
+        embedder = WordVectors()
+        matrix = np.stack([embedder.embed(text) for text in texts])
+        index = BM25Index(os.path.join(directory, "relevance.db"))
+        index.add([str(n) for n in range(len(texts))], texts)
+        index.flush()
+
+        with_identifier = list(identifiers)
+        queries = []
+        for _ in range(args.queries):
+            n = rng.choice(with_identifier)
+            topic_words = [w for w in texts[n].split() if w.startswith("t")]
+            queries.append(("identifier", f"what does {identifiers[n]} mean for {' '.join(rng.sample(topic_words, 2))}", n))
+            n = rng.randrange(len(texts))
+            queries.append(("topical", " ".join(rng.sample(texts[n].split(), 12)), n))
+
+        results = {}
+        for kind, question, target in queries:
+            scores = matrix @ embedder.embed(question)
+            dense = [int(n) for n in np.argsort(-scores)[:args.candidates]]
+            keyword = [int(chunk_id) for chunk_id, _ in index.search(question, args.candidates)]
+            fused = [chunk_id for chunk_id, _ in reciprocal_rank_fusion(dense, keyword)]
+            for method, ranked in (("dense", dense), ("bm25", keyword), ("fused", fused)):
+                results.setdefault((kind, method), []).append(metrics(ranked, target, args.top_k))
+        index.close()
+
+        print(f"relevance over {len(texts)} chunks, {args.queries} questions of each kind")
+        for kind in ("identifier", "topical"):
+            for method in ("dense", "bm25", "fused"):
+                hits = results[(kind, method)]
+                print(
+                    f"  {kind:>10} {method:>5}: recall@{args.top_k} {statistics.mean(h for h, _ in hits):.3f}  "
+                    f"MRR {statistics.mean(r for _, r in hits):.3f}"
+                )
+
+        # Latency: index build and search at scale, no embeddings needed
+        texts, identifiers = build_corpus(random.Random(1), args.chunks, args.topics, args.identifier_rate)
+        path = os.path.join(directory, "scale.db")
+        index = BM25Index(path)
+        start = time.perf_counter()
+        for i in range(0, len(texts), 1000):
+            index.add([str(n) for n in range(i, min(i + 1000, len(texts)))], texts[i:i + 1000])
+        index.flush()
+        build = time.perf_counter() - start
+        size = os.path.getsize(path)
+        print(
+            f"indexed {len(texts)} chunks in {build:.1f}s ({len(texts) / build:,.0f} chunks/s), "
+            f"{size / 2**20:.1f} MiB on disk ({size / len(texts):.0f} bytes/chunk, "
+            f"{sum(len(tokenize(t)) for t in texts[:1000]) / 1000:.0f} terms/chunk)"
+        )
+
+        numbers = list(identifiers)
+        workloads = {
+            "identifier": [f"what does {identifiers[rng.choice(numbers)]} mean" for _ in range(args.queries)],
+            "topical": [" ".join(rng.sample(rng.choice(texts).split(), 6)) for _ in range(args.queries)],
+        }
+        for label, questions in workloads.items():
+            seconds = []
+            for question in questions:
+                start = time.perf_counter()
+                index.search(question, args.candidates)
+                seconds.append(time.perf_counter() - start)
+            seconds.sort()
+            print(
+                f"  {label:>10} search: p50 {statistics.median(seconds) * 1000:6.2f}ms  "
+                f"p95 {seconds[int(len(seconds) * 0.95)] * 1000:6.2f}ms"
+            )
+
+        start = time.perf_counter()
+        index.close()
+        reopened = BM25Index(path)
+        print(f"reopened in {time.perf_counter() - start:.2f}s with {len(reopened)} chunks")
+        reopened.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Re-ingest a large PDF after a one-page edit and count the work done.
+
+    python -m benchmarks.incremental_reindex --pages 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+# Keep the default keyword index in the working directory out of the measurement
+os.environ.setdefault("BM25_ENABLED", "false")
+
+from benchmarks.stubs import FakeEmbeddings, FakeIndex
+from benchmarks.synthetic_pdf import page_lines, write_pdf
+from modules.load_vectorstore import index_files
+from modules.manifest import DocumentManifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--edited-page", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [page_lines(rng) for _ in range(args.pages)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "manual.pdf")
+        manifest = DocumentManifest(os.path.join(directory, "manifest.db"))
+        index = FakeIndex()
+        embeddings = FakeEmbeddings()
+
+        def ingest(label: str):
+            texts_before, calls_before = embeddings.texts_embedded, embeddings.calls
+            start = time.perf_counter()
+            upserted = index_files([path], embed_model=embeddings, vector_index=index, manifest=manifest)
+            print({
+                "run": label,
+                "seconds": round(time.perf_counter() - start, 2),
+                "chunks_upserted": upserted,
+                "texts_embedded": embeddings.texts_embedded - texts_before,
+                "embedding_calls": embeddings.calls - calls_before,
+                "vectors_in_index": len(index.vectors),
+            })
+
+        write_pdf(path, pages)
+        ingest("initial")
+        ingest("unchanged")
+        pages[args.edited_page] = pages[args.edited_page][:20] + page_lines(rng, lines=5)
+        write_pdf(path, pages)
+        ingest("one page edited")
+        manifest.close()
+
+
+if __name__ == "__main__":
+    main()
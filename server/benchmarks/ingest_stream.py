@@ -0,0 +1,88 @@
+"""Peak memory and throughput of streaming ingestion vs. full materialization.
+
+Runs index_files against a stub embedder and stub index on single synthetic
+PDFs of growing size. The "materialized" baseline reproduces the previous
+approach: all pages, then all chunks, all embeddings and all vectors are held
+before the first upsert. Extraction runs in-process so tracemalloc sees it.
+
+    python -m benchmarks.ingest_stream --pages 50,200,800
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+# Keep the default keyword index in the working directory out of the measurement
+os.environ.setdefault("BM25_ENABLED", "false")
+os.environ["INGEST_PARSE_WORKERS"] = "1"
+
+from benchmarks.stubs import FakeEmbeddings, FakeIndex
+from benchmarks.synthetic_pdf import generate_corpus
+from modules.load_vectorstore import index_files
+from modules.manifest import DocumentManifest
+from modules.pdf_extract import extract_files
+
+
+def materialized(file_paths, embed_model, vector_index) -> int:
+    total = 0
+    for file_path in file_paths:
+        extracted = list(extract_files([file_path], workers=1))
+        chunks = [(table.document, chunk) for table in (e.chunks for e in extracted) for chunk in table]
+        texts = [chunk.text for _, chunk in chunks]
+        embeddings = embed_model.embed_documents(texts)
+        vectors = [
+            {"id": f"{Path(file_path).stem}-{i}", "values": values,
+             "metadata": {**document, **chunk.metadata, "text": text, "filename": Path(file_path).name}}
+            for i, (values, (document, chunk), text) in enumerate(zip(embeddings, chunks, texts))
+        ]
+        for i in range(0, len(vectors), 100):
+            vector_index.upsert(vectors[i:i + 100])
+        total += len(vectors)
+    return total
+
+
+def measure(fn, file_paths, args) -> dict:
+    # The stub index only counts vectors so its own storage does not dominate the measurement
+    vector_index = CountingIndex(latency=args.upsert_latency)
+    embed_model = FakeEmbeddings(latency=args.embed_latency, dimension=args.dimension)
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = fn(file_paths, embed_model=embed_model, vector_index=vector_index)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"chunks": chunks, "chunks_per_second": round(chunks / elapsed, 1), "peak_mb": round(peak / 2**20, 1)}
+
+
+class CountingIndex(FakeIndex):
+    def upsert(self, vectors, **kwargs):
+        time.sleep(self.latency)
+        return {"upserted_count": len(vectors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="50,200,800")
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--upsert-latency", type=float, default=0.01)
+    parser.add_argument("--dimension", type=int, default=768)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in (int(p) for p in args.pages.split(",")):
+            paths = generate_corpus(os.path.join(directory, str(pages)), files=1, pages_per_file=pages)
+            print({"pages": pages, "mode": "materialized", **measure(materialized, paths, args)})
+            # A fresh manifest, or chunks indexed by an earlier run would be skipped as unchanged
+            manifest = DocumentManifest(os.path.join(directory, f"manifest-{pages}.db"))
+
+            def streaming(file_paths, **kwargs):
+                return index_files(file_paths, manifest=manifest, **kwargs)
+
+            print({"pages": pages, "mode": "streaming", **measure(streaming, paths, args)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Query latency and recall of the local vector index, exact vs. IVF.
+
+Vectors are drawn around random cluster centres so IVF has structure to
+exploit, like real embeddings. Recall@k of the IVF mode is measured against
+the exact scan over the same data.
+
+    python -m benchmarks.local_index --vectors 100000 --queries 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from modules.local_index import LocalVectorIndex
+
+
+def clustered_vectors(rng, count: int, dimension: int, clusters: int = 500) -> np.ndarray:
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--probes", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = clustered_vectors(rng, args.vectors, args.dimension)
+    queries = data[rng.integers(0, args.vectors, args.queries)] + 0.1 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = LocalVectorIndex(
+            os.path.join(directory, "index"), dimension=args.dimension, mode="ivf",
+            ivf_lists=args.lists, ivf_probes=args.probes, ivf_min_rows=0,
+        )
+        start = time.perf_counter()
+        for i in range(0, args.vectors, 1000):
+            index.upsert([
+                {"id": f"v{j}", "values": data[j], "metadata": {"text": f"chunk {j}", "filename": f"doc{j % 20}.pdf"}}
+                for j in range(i, min(i + 1000, args.vectors))
+            ])
+        upsert_seconds = time.perf_counter() - start
+        print(f"upserted {args.vectors} vectors in {upsert_seconds:.2f}s ({args.vectors / upsert_seconds:,.0f}/s)")
+
+        start = time.perf_counter()
+        # Normally trained in the background as the index grows, here timed on its own
+        index.train_ivf()
+        print(f"ivf training ({args.lists} lists): {time.perf_counter() - start:.2f}s")
+
+        exact = LocalVectorIndex(os.path.join(directory, "index"), dimension=args.dimension, mode="exact")
+        results = {}
+        for label, target in (("exact", exact), ("ivf", index)):
+            latencies, ids = [], []
+            for query in queries:
+                start = time.perf_counter()
+                response = target.query(query, top_k=args.top_k, include_metadata=True)
+                latencies.append((time.perf_counter() - start) * 1000)
+                ids.append({match["id"] for match in response["matches"]})
+            results[label] = ids
+            print(
+                f"{label:>6}: p50 {statistics.median(latencies):.2f}ms  "
+                f"p95 {percentile(latencies, 0.95):.2f}ms  max {max(latencies):.2f}ms"
+            )
+
+        recall = statistics.mean(
+            len(approx & truth) / len(truth) for approx, truth in zip(results["ivf"], results["exact"]) if truth
+        )
+        print(f"ivf recall@{args.top_k}: {recall:.3f} ({args.probes}/{args.lists} lists probed)")
+
+        start = time.perf_counter()
+        batched = exact.query_many(queries, top_k=args.top_k)
+        elapsed = time.perf_counter() - start
+        print(f"exact query_many: {len(batched)} queries in {elapsed * 1000:.1f}ms ({elapsed * 1000 / len(batched):.2f}ms/query)")
+
+        start = time.perf_counter()
+        reopened = LocalVectorIndex(os.path.join(directory, "index"), dimension=args.dimension)
+        print(f"reopen: {time.perf_counter() - start:.2f}s, {reopened.describe_index_stats()['total_vector_count']} vectors")
+
+        # Deleting most of the index compacts it, later upserts reuse freed rows
+        start = time.perf_counter()
+        index.delete([f"v{j}" for j in range(args.vectors // 4, args.vectors)])
+        index.upsert([{"id": f"w{j}", "values": data[j], "metadata": {"text": f"chunk {j}"}} for j in range(1000)])
+        partition = index._partition("")
+        print(
+            f"delete 75% + upsert 1000: {time.perf_counter() - start:.2f}s, "
+            f"{len(partition)} vectors in {partition._count} rows ({partition._capacity} allocated)"
+        )
+        for target in (index, exact, reopened):
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
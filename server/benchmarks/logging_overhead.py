@@ -0,0 +1,146 @@
+"""Per-request logging cost of /chat/ before and after lazy, level-gated logging.
+
+Replays the log calls one /chat/ request makes: the old pattern (f-strings,
+10 match previews, doc previews and the whole chain result at DEBUG, written
+synchronously) against the current one (%-style arguments, previews only on
+traced requests, records handed to a QueueListener). Both write to the same
+file; --sink-latency makes every write block, as a slow console or log
+driver does, which is where the queue pays off.
+
+    python -m benchmarks.logging_overhead --requests 2000
+    python -m benchmarks.logging_overhead --requests 2000 --sink-latency 0.0002
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from logger import setup_logger, stop_log_listeners
+
+
+def fake_request(rng: random.Random) -> dict:
+    text = " ".join(f"word{rng.randrange(5000)}" for _ in range(90))
+    matches = [
+        {"id": f"chunk-{i}", "score": rng.random(), "metadata": {"text": text, "filename": "manual.pdf", "page": i}}
+        for i in range(10)
+    ]
+    docs = [Document(page_content=text, metadata={"source": "manual.pdf", "page": i}) for i in range(5)]
+    answer = "The answer. " * 40
+    return {
+        "question": "What does the manual say about error E-1042?",
+        "matches": matches,
+        "docs": docs,
+        "result": {"input": "question", "context": docs, "answer": answer},
+        "response": {"response": answer, "sources": ["manual.pdf"] * 5},
+    }
+
+
+def old_request(logger, request: dict):
+    """Log calls of /chat/ before this change"""
+    logger.info(f"user query: {request['question']}")
+    logger.info(f"Pinecone matches found: {len(request['matches'])}")
+    for i, match in enumerate(request["matches"]):
+        metadata = match["metadata"]
+        logger.info(f"Match {i}: score={match['score']:.3f}, text_length={len(metadata['text'])}")
+        logger.info(f"Match {i} text preview: {metadata['text'][:200]}...")
+    logger.info("Packed %d of %d candidates into %d context tokens", 5, 10, 700)
+    for i, doc in enumerate(request["docs"]):
+        logger.info(f"Doc {i} preview: {doc.page_content[:100]}...")
+    logger.debug(f"Running chain for input: {request['question']}")
+    logger.debug(f"Raw chain result keys: {list(request['result'].keys())}")
+    logger.debug(f"Raw chain result: {request['result']}")
+    logger.debug(f"Chain response: {request['response']}")
+    logger.info(f"Sending response with {len(request['response']['sources'])} sources")
+    logger.info("query successful")
+
+
+def new_request(logger, request: dict, trace_rate: float, rng: random.Random):
+    """Log calls of /chat/ now"""
+    logger.info("user query: %s", request["question"])
+    logger.info("Pinecone matches found: %d", len(request["matches"]))
+    trace = logger.isEnabledFor(logging.DEBUG) or (trace_rate > 0 and rng.random() < trace_rate)
+    if trace:
+        for i, match in enumerate(request["matches"]):
+            metadata = match["metadata"]
+            logger.info("Match %d: score=%.3f, text_length=%d", i, match["score"], len(metadata["text"]))
+            logger.info("Match %d text preview: %.200s...", i, metadata["text"])
+    logger.info("Packed %d of %d candidates into %d context tokens", 5, 10, 700)
+    if trace:
+        for i, doc in enumerate(request["docs"]):
+            logger.info("Doc %d preview: %.100s...", i, doc.page_content)
+    logger.debug("Running chain for input: %s", request["question"])
+    logger.debug("Raw chain result keys: %s", list(request["result"]))
+    logger.debug("Raw chain result: %s", request["result"])
+    logger.debug("Chain response: %s", request["response"])
+    logger.info("Sending response with %d sources", len(request["response"]["sources"]))
+    logger.info("query successful")
+
+
+class SlowSink:
+    """File whose flushes block like a busy pipe or a remote log driver"""
+
+    def __init__(self, file, latency: float):
+        self.file = file
+        self.latency = latency
+
+    def write(self, text: str):
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+        time.sleep(self.latency)
+
+
+def measure(name: str, level: str, use_queue: bool, run, requests: list, directory: str, sink_latency: float) -> dict:
+    path = os.path.join(directory, f"{name}.log")
+    with open(path, "w", encoding="utf-8") as file:
+        sink = SlowSink(file, sink_latency) if sink_latency else file
+        logger = setup_logger(f"bench.{name}", level=level, use_queue=use_queue, stream=sink)
+        logger.propagate = False
+        seconds = []
+        for request in requests:
+            start = time.perf_counter()
+            run(logger, request)
+            seconds.append(time.perf_counter() - start)
+        drain = time.perf_counter()
+        stop_log_listeners()
+        drain = time.perf_counter() - drain
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+    seconds.sort()
+    return {
+        "mean_us": round(statistics.mean(seconds) * 1e6, 1),
+        "p99_us": round(seconds[int(len(seconds) * 0.99)] * 1e6, 1),
+        "log_bytes_per_request": os.path.getsize(path) // len(requests),
+        "listener_drain_ms": round(drain * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--trace-rate", type=float, default=0.01)
+    parser.add_argument("--sink-latency", type=float, default=0.0, help="seconds each write to the log sink blocks")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    requests = [fake_request(rng) for _ in range(args.requests)]
+    runs = [
+        ("before: DEBUG, sync", "DEBUG", False, old_request),
+        ("after: INFO, sync", "INFO", False, lambda log, r: new_request(log, r, 0, rng)),
+        ("after: INFO, queue", "INFO", True, lambda log, r: new_request(log, r, 0, rng)),
+        (f"after: INFO, queue, {args.trace_rate:.0%} traced", "INFO", True, lambda log, r: new_request(log, r, args.trace_rate, rng)),
+        ("after: DEBUG, queue", "DEBUG", True, lambda log, r: new_request(log, r, 0, rng)),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for i, (label, level, use_queue, run) in enumerate(runs):
+            print(f"{label:>32}: {measure(f'run{i}', level, use_queue, run, requests, directory, args.sink_latency)}")
+
+
+if __name__ == "__main__":
+    main()
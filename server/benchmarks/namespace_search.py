@@ -0,0 +1,84 @@
+"""Query cost of one tenant's collection as other tenants' data grows.
+
+Before collections every tenant shared one namespace, so a query scored the
+whole index and a metadata filter threw away the other tenants' matches.
+Now each collection is its own namespace (a partition of the local index)
+and a query only scores its own vectors. Both layouts hold the same vectors
+and must return the same matches.
+
+    python -m benchmarks.namespace_search --per-tenant 5000 --tenants 1,10,40
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from modules.local_index import LocalVectorIndex
+
+
+def vectors(rng, count: int, dimension: int) -> np.ndarray:
+    values = rng.standard_normal((count, dimension)).astype(np.float32)
+    return values / np.linalg.norm(values, axis=1, keepdims=True)
+
+
+def timed_queries(query, queries) -> tuple:
+    seconds, results = [], []
+    for vector in queries:
+        start = time.perf_counter()
+        results.append([match["id"] for match in query(vector)["matches"]])
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--per-tenant", type=int, default=5000, help="vectors in each tenant's collection")
+    parser.add_argument("--tenants", default="1,10,40", help="comma-separated tenant counts")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = vectors(rng, args.queries, args.dimension)
+    for tenants in (int(t) for t in args.tenants.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            shared = LocalVectorIndex(os.path.join(directory, "shared"), dimension=args.dimension, mode="exact")
+            partitioned = LocalVectorIndex(os.path.join(directory, "partitioned"), dimension=args.dimension, mode="exact")
+            for tenant in range(tenants):
+                values = vectors(rng, args.per_tenant, args.dimension)
+                records = [
+                    {"id": f"t{tenant}-{i}", "values": row, "metadata": {"tenant": f"t{tenant}", "filename": f"doc{i % 10}.pdf"}}
+                    for i, row in enumerate(values)
+                ]
+                for i in range(0, len(records), 1000):
+                    shared.upsert(records[i:i + 1000])
+                    partitioned.upsert(records[i:i + 1000], namespace=f"t{tenant}")
+
+            def shared_query(vector):
+                return shared.query(vector, top_k=args.top_k, filter={"tenant": "t0"})
+
+            def partition_query(vector):
+                return partitioned.query(vector, top_k=args.top_k, namespace="t0")
+
+            def document_query(vector):
+                return partitioned.query(vector, top_k=args.top_k, namespace="t0", filter={"filename": {"$in": ["doc1.pdf", "doc2.pdf"]}})
+
+            shared_ms, shared_results = timed_queries(shared_query, queries)
+            partition_ms, partition_results = timed_queries(partition_query, queries)
+            document_ms, _ = timed_queries(document_query, queries)
+            assert shared_results == partition_results, "both layouts must return the same matches"
+            print(
+                f"{tenants:3d} tenants ({tenants * args.per_tenant:7d} vectors): "
+                f"shared namespace + filter {shared_ms:7.2f}ms  own namespace {partition_ms:6.2f}ms  "
+                f"own namespace + 2 documents {document_ms:6.2f}ms  (p50 per query)"
+            )
+            shared.close()
+            partitioned.close()
+
+
+if __name__ == "__main__":
+    main()
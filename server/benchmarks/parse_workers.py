@@ -0,0 +1,42 @@
+"""Pages/sec of the PDF extraction stage against the number of worker processes.
+
+    python -m benchmarks.parse_workers --files 8 --pages 50 --workers 1,2,4
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.synthetic_pdf import generate_corpus
+from modules.pdf_extract import extract_files, shutdown_pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_corpus(directory, args.files, args.pages)
+        for workers in (int(w) for w in args.workers.split(",")):
+            # Warm the pool so process startup is not counted
+            list(extract_files(paths[:1], workers=workers, pages_per_task=1))
+            start = time.perf_counter()
+            pages = chunks = 0
+            for extracted in extract_files(paths, workers=workers, pages_per_task=args.pages_per_task):
+                pages += extracted.pages
+                chunks += len(extracted.chunks)
+            elapsed = time.perf_counter() - start
+            print({
+                "workers": workers,
+                "pages": pages,
+                "chunks": chunks,
+                "pages_per_second": round(pages / elapsed, 1),
+            })
+            shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
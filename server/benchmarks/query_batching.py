@@ -0,0 +1,88 @@
+"""Throughput of per-request query embedding vs. the micro-batcher.
+
+The stub embedder charges a fixed overhead per provider call plus a small
+cost per text, which is what makes single-text requests expensive at peak
+load. Both runs go through the same embed stage (same concurrency limit).
+
+    python -m benchmarks.query_batching --queries 2000 --concurrency 256 --call-latency 0.05
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import FakeEmbeddings
+from modules.async_stages import Stage
+from modules.embed_batcher import BATCH_SIZE_BUCKETS, QUEUE_WAIT_BUCKETS_MS, QueryEmbeddingBatcher
+
+
+async def drive(embed, questions, concurrency: int) -> tuple:
+    """`concurrency` clients, each sending its next question when the last one is answered"""
+    latencies, vectors = [], [None] * len(questions)
+    queue = iter(enumerate(questions))
+
+    async def client():
+        for i, question in queue:
+            start = time.perf_counter()
+            vectors[i] = await embed(question)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=256, help="requests in flight")
+    parser.add_argument("--call-latency", type=float, default=0.05, help="fixed seconds per provider call")
+    parser.add_argument("--text-latency", type=float, default=0.0005, help="extra seconds per text in a call")
+    parser.add_argument("--stage-concurrency", type=int, default=32, help="CHAT_EMBED_CONCURRENCY")
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-size", type=int, default=32)
+    args = parser.parse_args()
+
+    questions = [f"What does section {i} say about part PN-{i:05d}?" for i in range(args.queries)]
+    executor = ThreadPoolExecutor(max_workers=args.stage_concurrency)
+
+    def stage():
+        return Stage("embed", concurrency=args.stage_concurrency, timeout=60, executor=executor)
+
+    single_model = FakeEmbeddings(latency=args.call_latency, text_latency=args.text_latency)
+    single_stage = stage()
+    start = time.perf_counter()
+    single, single_vectors = asyncio.run(
+        drive(lambda q: single_stage.run(single_model.embed_query, q), questions, args.concurrency)
+    )
+    single_wall = time.perf_counter() - start
+
+    batched_model = FakeEmbeddings(latency=args.call_latency, text_latency=args.text_latency)
+    batcher = QueryEmbeddingBatcher(stage(), window_ms=args.window_ms, max_size=args.max_size)
+    start = time.perf_counter()
+    batched, batched_vectors = asyncio.run(
+        drive(lambda q: batcher.embed(batched_model, q), questions, args.concurrency)
+    )
+    batched_wall = time.perf_counter() - start
+    assert batched_vectors == single_vectors, "every caller must get its own vector"
+
+    for label, latencies, wall, model in (
+        ("per request", single, single_wall, single_model),
+        (f"batched ({args.window_ms:g}ms/{args.max_size})", batched, batched_wall, batched_model),
+    ):
+        latencies = sorted(latencies)
+        print(
+            f"{label:>22}: {len(latencies) / wall:7.1f} queries/s  {model.calls:5d} provider calls  "
+            f"p50 {statistics.median(latencies) * 1000:6.1f}ms  p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f}ms"
+        )
+    print("batch sizes:", batcher.metrics.histogram("batch_size", BATCH_SIZE_BUCKETS))
+    print("queue wait (ms):", batcher.metrics.histogram("queue_wait", QUEUE_WAIT_BUCKETS_MS))
+
+    # At low load a lone query pays at most the window
+    lone = FakeEmbeddings(latency=args.call_latency, text_latency=args.text_latency)
+    low_load, _ = asyncio.run(drive(lambda q: batcher.embed(lone, q), questions[:50], 1))
+    print(f"one query at a time: p50 {statistics.median(low_load) * 1000:.1f}ms (call latency {args.call_latency * 1000:g}ms)")
+
+
+if __name__ == "__main__":
+    main()
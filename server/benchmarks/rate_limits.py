@@ -0,0 +1,137 @@
+"""Interactive /chat/ latency while a /chat/batch run competes for rate-limited providers.
+
+The embedding and LLM stubs enforce quotas (benchmarks.stubs.Quota): past
+`--llm-quota` / `--embed-quota` requests per second they answer 429 with a
+Retry-After. Interactive questions arrive open-loop at each of `--levels`
+per second for `--duration` seconds, while a batch of `--batch` questions
+runs alongside as bulk work. Each level runs twice, without the limiters
+(429s become failed answers, as before) and with them (bulk waits behind
+interactive calls, rate-limited calls are retried, interactive questions
+that can't be served within RATE_LIMIT_MAX_WAIT get a 503). Reported per
+run: interactive answers, 503s and failures, latency percentiles of
+answered questions, batch outcome and the 429s the providers returned.
+
+    python -m benchmarks.rate_limits --levels 4,12 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("BM25_ENABLED", "false")
+os.environ.setdefault("CHUNK_STORE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.stubs import FakeChatModel, FakeEmbeddings, FakeIndex, Quota, seed_index
+from modules.llm import get_llm_chain
+from modules.rate_limit import RateLimited, limiters
+from modules.resources import ResourceRegistry
+from routes.chat import router as chat_router
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def build_app(args) -> tuple:
+    quotas = {"google": Quota(args.embed_quota), "groq": Quota(args.llm_quota)}
+    embeddings = FakeEmbeddings(latency=args.embed_latency, quota=quotas["google"])
+    index = FakeIndex(latency=args.query_latency)
+    seed_index(index, embeddings, [f"Section {i} explains stub behaviour number {i} at length." for i in range(40)])
+    quotas["google"].tokens = quotas["google"].burst  # seeding doesn't count against the run
+    llm = FakeChatModel(latency=args.llm_latency, quota=quotas["groq"])
+    app = FastAPI()
+    app.state.resources = ResourceRegistry({
+        "index": lambda: index,
+        # Wrapped like resources.py wraps the real Google client
+        "embeddings": lambda: RateLimited(embeddings, "google", ("embed_query", "embed_documents")),
+        "chain": lambda: get_llm_chain(llm=llm),
+    })
+    app.include_router(chat_router)
+    return app, quotas
+
+
+async def run(args, rps: float, limited: bool) -> dict:
+    for limiter in limiters.values():
+        limiter.enabled = limited
+        limiter.reset()
+    app, quotas = build_app(args)
+    transport = httpx.ASGITransport(app=app)
+    results = {"ok": [], "shed": 0, "failed": 0}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+
+        async def batch() -> dict:
+            body = "".join(json.dumps(f"What does section {i % 40} explain, part {i}?") + "\n" for i in range(args.batch))
+            summary = {}
+            async with client.stream("POST", "/chat/batch", files={"questions": ("q.jsonl", body)}) as response:
+                async for line in response.aiter_lines():
+                    if line.startswith('{"summary"'):
+                        summary = json.loads(line)["summary"]
+            return summary
+
+        async def ask(i: int):
+            start = time.perf_counter()
+            response = await client.post("/chat/", data={"question": f"Which section covers behaviour {i % 40}?"})
+            if response.status_code == 503:
+                results["shed"] += 1
+            elif response.status_code != 200 or response.json().get("answer") in (None, "No answer provided"):
+                results["failed"] += 1
+            else:
+                results["ok"].append(time.perf_counter() - start)
+
+        batch_task = asyncio.create_task(batch())
+        start = time.perf_counter()
+        asks = []
+        for i in range(int(rps * args.duration)):
+            # Open loop: arrivals don't wait for earlier answers
+            await asyncio.sleep(max(0.0, start + i / rps - time.perf_counter()))
+            asks.append(asyncio.create_task(ask(i)))
+        await asyncio.gather(*asks)
+        interactive_seconds = time.perf_counter() - start
+        summary = await batch_task
+        batch_seconds = time.perf_counter() - start
+    ok = results["ok"]
+    return {
+        "limiter": limited,
+        "interactive_rps": rps,
+        "answered": len(ok),
+        "shed_503": results["shed"],
+        "failed": results["failed"],
+        "p50_ms": round(1000 * percentile(ok, 0.50), 1),
+        "p95_ms": round(1000 * percentile(ok, 0.95), 1),
+        "p99_ms": round(1000 * percentile(ok, 0.99), 1),
+        "interactive_seconds": round(interactive_seconds, 2),
+        "batch_answered": summary.get("answered", 0),
+        "batch_failed": summary.get("failed", 0),
+        "batch_seconds": round(batch_seconds, 2),
+        "provider_429s": {name: quota.rejected for name, quota in quotas.items()},
+        "learned_rps": {name: limiter.info()["rate"] for name, limiter in limiters.items() if limited},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="4,12")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch", type=int, default=60)
+    parser.add_argument("--llm-quota", type=float, default=8.0)
+    parser.add_argument("--embed-quota", type=float, default=50.0)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--query-latency", type=float, default=0.01)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for rps in (float(level) for level in args.levels.split(",")):
+        for limited in (False, True):
+            print(json.dumps(asyncio.run(run(args, rps, limited))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Answer quality, prompt tokens and latency of /chat/ with and without reranking.
+
+The corpus is synthetic: every chunk states one attribute of one device
+("the supply voltage of dev3x7 is ...") among topic filler, and each topic
+has a handful of devices and attributes, so most chunks near a question
+mention the right device or the right attribute but not both. The
+stand-in embedding is a bag of word vectors, which ranks those near misses
+about as high as the chunks that answer the question. Dense order packs
+CONTEXT_CANDIDATES chunks into the token budget; the reranker rescores
+RERANK_CANDIDATES and keeps RERANK_TOP_N.
+
+    python -m benchmarks.rerank --chunks 20000 --queries 300
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.hybrid_retrieval import WordVectors
+from modules.async_stages import Stage
+from modules.context_builder import CONTEXT_CANDIDATES, Candidate, pack_context
+from modules.reranker import RERANK_CANDIDATES, RERANK_SCORER, RERANK_TOP_N, Reranker, load_scorer
+
+ATTRIBUTES = [
+    "supply voltage", "operating temperature", "torque limit", "flow rate", "warranty period", "firmware version",
+    "rated current", "idle power", "service interval", "noise level", "input pressure", "cable length",
+]
+
+
+def build_corpus(rng: random.Random, chunks: int, topics: int, devices: int) -> tuple:
+    """Chunk texts plus the (device, attribute) fact each one states"""
+    general = [f"gen{i}" for i in range(2000)]
+    vocabularies = [[f"t{t}w{i}" for i in range(60)] for t in range(topics)]
+    texts, facts = [], []
+    for n in range(chunks):
+        topic = n % topics
+        device = f"dev{topic}x{rng.randrange(devices)}"
+        attribute = rng.choice(ATTRIBUTES)
+        words = rng.choices(vocabularies[topic], k=14) + rng.choices(general, k=4)
+        statement = f"the {attribute} of {device} is {rng.randrange(1, 999)}".split()
+        at = rng.randrange(len(words))
+        texts.append(" ".join(words[:at] + statement + words[at:]))
+        facts.append((device, attribute))
+    return texts, facts
+
+
+class SlowScorer:
+    def __init__(self, scorer, delay: float):
+        self.scorer = scorer
+        self.delay = delay
+
+    def score(self, query, texts):
+        time.sleep(self.delay)
+        return self.scorer.score(query, texts)
+
+
+def quality(ranked: list, relevant: set, k: int) -> tuple:
+    """(relevant share of the top k, reciprocal rank of the first relevant chunk)"""
+    top = ranked[:k]
+    precision = sum(n in relevant for n in top) / min(k, len(relevant))
+    first = next((i for i, n in enumerate(ranked) if n in relevant), None)
+    return precision, 0.0 if first is None else 1 / (first + 1)
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--devices", type=int, default=8, help="devices per topic")
+    parser.add_argument("--scorer", default=RERANK_SCORER, help="lexical, cross-encoder or package.module:factory")
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES, help="matches the reranker chooses from")
+    parser.add_argument("--top-n", type=int, default=RERANK_TOP_N)
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="rerank stage timeout")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts, facts = build_corpus(rng, args.chunks, args.topics, args.devices)
+    embedder = WordVectors()
+    matrix = np.stack([embedder.embed(text) for text in texts])
+    by_fact = {}
+    for n, fact in enumerate(facts):
+        by_fact.setdefault(fact, set()).add(n)
+
+    queries = []
+    for _ in range(args.queries):
+        n = rng.randrange(len(texts))
+        device, attribute = facts[n]
+        # Questions carry some context about the topic, like real ones do
+        context = " ".join(rng.sample([w for w in texts[n].split() if w.startswith("t")], 3))
+        queries.append((f"what is the {attribute} of {device} for {context}", by_fact[facts[n]]))
+
+    reranker = Reranker(load_scorer(args.scorer), top_n=args.top_n)
+    executor = ThreadPoolExecutor(max_workers=4)
+    stage = Stage("rerank", concurrency=4, timeout=args.budget_ms / 1000, executor=executor)
+    # A scorer slower than the budget, e.g. a cross-encoder on a busy CPU
+    slow = Reranker(SlowScorer(reranker.scorer, 2 * args.budget_ms / 1000), top_n=args.top_n)
+
+    def candidates_for(scores, top_k) -> list:
+        return [
+            Candidate(
+                id=str(n), text=texts[n], score=float(scores[n]),
+                metadata={"source": "corpus.pdf", "page": n, "start_index": 0}, values=matrix[n].tolist(),
+            )
+            for n in np.argsort(-scores)[:top_k]
+        ]
+
+    async def run():
+        results = {"dense": [], "reranked": []}
+        tokens = {"dense": [], "reranked": []}
+        answered = {"dense": 0, "reranked": 0}
+        in_pool = 0
+        seconds, fallbacks, slow_seconds, slow_fallbacks = [], 0, [], 0
+        for question, relevant in queries:
+            scores = matrix @ embedder.embed(question)
+            dense = candidates_for(scores, CONTEXT_CANDIDATES)
+            results["dense"].append(quality([int(c.id) for c in dense], relevant, args.top_n))
+            packed = pack_context(dense)
+            tokens["dense"].append(packed.tokens)
+            answered["dense"] += any(int(i) in relevant for i in packed.doc_ids)
+
+            pool = candidates_for(scores, args.candidates)
+            in_pool += any(int(c.id) in relevant for c in pool)
+            start = time.perf_counter()
+            reranked = await reranker.rerank(question, pool, stage=stage)
+            seconds.append(time.perf_counter() - start)
+            fallbacks += reranked is pool
+            results["reranked"].append(quality([int(c.id) for c in reranked], relevant, args.top_n))
+            packed = pack_context(reranked)
+            tokens["reranked"].append(packed.tokens)
+            answered["reranked"] += any(int(i) in relevant for i in packed.doc_ids)
+
+        for question, _ in queries[:20]:
+            pool = candidates_for(matrix @ embedder.embed(question), args.candidates)
+            start = time.perf_counter()
+            slow_fallbacks += await slow.rerank(question, pool, stage=stage) is pool
+            slow_seconds.append(time.perf_counter() - start)
+        return results, tokens, answered, in_pool, seconds, fallbacks, slow_seconds, slow_fallbacks
+
+    results, tokens, answered, in_pool, seconds, fallbacks, slow_seconds, slow_fallbacks = asyncio.run(run())
+    executor.shutdown()
+
+    print(f"{len(texts)} chunks, {args.queries} questions, scorer {args.scorer}")
+    for label, pool_size in (("dense", CONTEXT_CANDIDATES), ("reranked", args.candidates)):
+        hits = results[label]
+        print(
+            f"  {label:>8} ({pool_size} candidates): precision@{args.top_n} {statistics.mean(p for p, _ in hits):.3f}  "
+            f"MRR {statistics.mean(r for _, r in hits):.3f}  "
+            f"context {statistics.mean(tokens[label]):6.1f} tokens  "
+            f"answer in context {answered[label] / args.queries:.1%}"
+        )
+    print(f"  the answer was among the {args.candidates} reranker candidates for {in_pool / args.queries:.1%} of questions")
+    print(
+        f"rerank of {args.candidates} candidates: p50 {statistics.median(seconds) * 1000:.2f}ms  "
+        f"p95 {percentile(seconds, 0.95) * 1000:.2f}ms  p99 {percentile(seconds, 0.99) * 1000:.2f}ms, "
+        f"{fallbacks} fallbacks within {args.budget_ms:g}ms"
+    )
+    print(
+        f"scorer taking {2 * args.budget_ms:g}ms: {slow_fallbacks}/{len(slow_seconds)} questions kept vector order, "
+        f"p50 {statistics.median(slow_seconds) * 1000:.1f}ms spent"
+    )
+
+
+if __name__ == "__main__":
+    main()
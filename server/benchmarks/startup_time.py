@@ -0,0 +1,99 @@
+"""Server import and boot time against stubbed services.
+
+Each measurement runs in a fresh interpreter. "import" is `import main`,
+"eager import" additionally imports what main used to pull in up front
+(the PDF extractor with langchain's splitters, langchain Documents).
+Boot runs the app lifespan with stub clients whose construction sleeps like
+the real connects (Pinecone list/describe, Google and Groq clients) and
+reports when the server could take requests and when /readyz turned 200.
+
+    python -m benchmarks.startup_time --index-connect 1.5 --embed-connect 0.3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child(mode: str, args):
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter() - start
+    result = {"import_s": round(imported, 3)}
+    if mode == "eager":
+        import modules.pdf_extract  # noqa: F401
+        import langchain_core.documents  # noqa: F401
+        result["import_s"] = round(time.perf_counter() - start, 3)
+        print(json.dumps(result))
+        return
+
+    import asyncio
+    import httpx
+    from benchmarks.stubs import FakeChatModel, FakeEmbeddings, FakeIndex
+    from modules.llm import get_llm_chain
+    from modules.resources import ResourceRegistry
+
+    def connect_index():
+        time.sleep(args.index_connect)
+        return FakeIndex()
+
+    main.STARTUP_WARMUP = mode
+    main.registry = ResourceRegistry({
+        "index": connect_index,
+        "embeddings": lambda: FakeEmbeddings(setup_cost=args.embed_connect),
+        "chain": lambda: get_llm_chain(llm=FakeChatModel()),
+    })
+
+    async def boot():
+        lifespan_start = time.perf_counter()
+        async with main.app.router.lifespan_context(main.app):
+            result["serving_s"] = round(imported + time.perf_counter() - lifespan_start, 3)
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                while (await client.get("/readyz")).status_code != 200:
+                    await asyncio.sleep(0.01)
+            result["ready_s"] = round(imported + time.perf_counter() - lifespan_start, 3)
+
+    asyncio.run(boot())
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index-connect", type=float, default=1.5, help="seconds to connect to the vector index")
+    parser.add_argument("--embed-connect", type=float, default=0.3, help="seconds to build the embeddings client")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ, GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "stub"), LOG_LEVEL="WARNING",
+            INGEST_JOB_DB=os.path.join(directory, "jobs.db"),
+        )
+        for label, mode in (
+            ("eager import (before)", "eager"),
+            ("blocking warmup", "blocking"),
+            ("background warmup", "background"),
+        ):
+            runs = []
+            for _ in range(args.runs):
+                output = subprocess.run(
+                    [
+                        sys.executable, "-m", "benchmarks.startup_time", "--child", mode,
+                        "--index-connect", str(args.index_connect), "--embed-connect", str(args.embed_connect),
+                    ],
+                    env=env, check=True, capture_output=True, text=True,
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            best = {key: min(run[key] for run in runs) for key in runs[0]}
+            print(f"{label:>22}: {best}")
+
+
+if __name__ == "__main__":
+    main()
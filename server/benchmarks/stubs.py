@@ -0,0 +1,280 @@
+"""Deterministic local stand-ins for Pinecone, Google embeddings and Groq.
+
+Latencies and quotas are configurable so benchmarks can model remote round
+trips and rate limits without network access or API keys.
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from modules.local_index import LocalVectorIndex
+
+DIMENSION = 768
+
+
+def fake_vector(text: str, dimension: int = DIMENSION) -> List[float]:
+    """Stable pseudo-embedding derived from the text hash"""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    values = []
+    while len(values) < dimension:
+        seed = hashlib.sha256(seed).digest()
+        values.extend((b - 127.5) / 127.5 for b in seed)
+    return values[:dimension]
+
+
+class ProviderError(Exception):
+    """Error carrying an HTTP status, like the SDK exceptions"""
+
+    def __init__(self, status: int, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Quota:
+    """Server side of a provider rate limit, for injecting 429s into the stubs.
+
+    A token bucket of `rate` requests per second: a call that finds it empty
+    fails with a 429 whose Retry-After is the time until the next token.
+    `fault_rate` adds random 429s on top, like a provider shedding load.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, fault_rate: float = 0.0, seed: int = 0):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+
+    def check(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1 or self.random.random() < self.fault_rate:
+                self.rejected += 1
+                raise ProviderError(429, "quota exceeded", retry_after=round(max(0.0, 1 - self.tokens) / self.rate, 3))
+            self.tokens -= 1
+            self.accepted += 1
+
+
+class EmbeddingError(Exception):
+    """Like GoogleGenerativeAIError: no status of its own, the provider error is its __cause__"""
+
+
+class FakeEmbeddings:
+    def __init__(self, latency: float = 0.0, setup_cost: float = 0.0, dimension: int = DIMENSION, text_latency: float = 0.0, quota: Optional[Quota] = None):
+        time.sleep(setup_cost)
+        self.quota = quota
+        # Fixed overhead per remote call, plus `text_latency` per text in it
+        self.latency = latency
+        self.text_latency = text_latency
+        self.dimension = dimension
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _check_quota(self, calls: int = 1):
+        # langchain_google_genai re-raises every provider error wrapped in its own
+        try:
+            for _ in range(calls):
+                self.quota.check()
+        except ProviderError as e:
+            raise EmbeddingError(f"Error embedding content: {e}") from e
+
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        if self.quota is not None:
+            self._check_quota()
+        self.calls += 1
+        self.texts_embedded += 1
+        time.sleep(self.latency + self.text_latency)
+        return fake_vector(text, self.dimension)
+
+    def embed_documents(self, texts: List[str], batch_size: int = 100, **kwargs) -> List[List[float]]:
+        # Like the Google client, one remote call per `batch_size` texts
+        calls = max(1, -(-len(texts) // batch_size))
+        if self.quota is not None:
+            self._check_quota(calls)
+        self.calls += calls
+        self.texts_embedded += len(texts)
+        time.sleep(self.latency * calls + self.text_latency * len(texts))
+        return [fake_vector(text, self.dimension) for text in texts]
+
+
+class FakeIndex:
+    """In-memory dot-product index with the subset of the Pinecone API we use"""
+
+    def __init__(self, latency: float = 0.0, quota: Optional[Quota] = None):
+        self.latency = latency
+        self.quota = quota
+        self.vectors = {}
+        self.lock = threading.Lock()
+
+    def _request(self):
+        if self.quota is not None:
+            self.quota.check()
+        time.sleep(self.latency)
+
+    def upsert(self, vectors, **kwargs):
+        self._request()
+        with self.lock:
+            for vector in vectors:
+                self.vectors[vector["id"]] = (vector["values"], vector.get("metadata", {}))
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids, **kwargs):
+        self._request()
+        with self.lock:
+            for vector_id in ids:
+                self.vectors.pop(vector_id, None)
+        return {}
+
+    def query(self, vector, top_k: int, include_metadata: bool = False, include_values: bool = False, **kwargs):
+        self._request()
+        with self.lock:
+            items = list(self.vectors.items())
+        scored = [
+            (sum(a * b for a, b in zip(vector, values)), vector_id, values, metadata)
+            for vector_id, (values, metadata) in items
+        ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return {
+            "matches": [
+                {
+                    "id": vector_id, "score": score,
+                    "values": list(values) if include_values else [],
+                    "metadata": metadata if include_metadata else {},
+                }
+                for score, vector_id, values, metadata in scored[:top_k]
+            ]
+        }
+
+    def fetch(self, ids, **kwargs):
+        self._request()
+        with self.lock:
+            found = {vector_id: self.vectors[vector_id] for vector_id in ids if vector_id in self.vectors}
+        return {
+            "vectors": {
+                vector_id: {"id": vector_id, "values": list(values), "metadata": metadata}
+                for vector_id, (values, metadata) in found.items()
+            }
+        }
+
+    def describe_index_stats(self):
+        return {"total_vector_count": len(self.vectors), "dimension": DIMENSION}
+
+
+class FlakyIndex(FakeIndex):
+    """FakeIndex whose upserts fail with a retryable status some of the time"""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, status: int = 429, seed: int = 0):
+        super().__init__(latency=latency)
+        self.failure_rate = failure_rate
+        self.status = status
+        self.random = random.Random(seed)
+        self.attempts = 0
+
+    def upsert(self, vectors, **kwargs):
+        with self.lock:
+            self.attempts += 1
+            fail = self.random.random() < self.failure_rate
+        if fail:
+            time.sleep(self.latency)
+            raise ProviderError(self.status)
+        return super().upsert(vectors, **kwargs)
+
+
+class FakePinecone:
+    """Client whose construction pays a fixed setup cost, like a TLS handshake"""
+
+    def __init__(self, setup_cost: float = 0.0, index: Optional[FakeIndex] = None):
+        time.sleep(setup_cost)
+        self.index = index or FakeIndex()
+
+    def Index(self, name: str, **kwargs) -> FakeIndex:
+        return self.index
+
+
+class RemoteIndex(LocalVectorIndex):
+    """Local index with a fixed round trip per call, like Pinecone.
+
+    Unlike FakeIndex it scores with NumPy, so large corpora don't make the
+    benchmark CPU-bound on the stub.
+    """
+
+    latency = 0.0
+
+    def upsert(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().upsert(*args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().query(*args, **kwargs)
+
+    def fetch(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().fetch(*args, **kwargs)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps for `latency` seconds and returns a canned answer.
+
+    When streamed, the first token arrives after `latency` and each further
+    word after `token_latency`; `tokens_streamed` counts what was produced.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer: str = "This is a stub answer based on the provided context."
+    tokens_streamed: int = 0
+    quota: Optional[Quota] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.quota is not None:
+            self.quota.check()
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.quota is not None:
+            self.quota.check()
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        if self.quota is not None:
+            self.quota.check()
+        await asyncio.sleep(self.latency)
+        for i, word in enumerate(self.answer.split(" ")):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            self.tokens_streamed += 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+def seed_index(index: FakeIndex, embeddings: FakeEmbeddings, texts: List[str], filename: str = "stub.pdf"):
+    vectors = [
+        {
+            "id": f"stub-{i}",
+            "values": fake_vector(text, embeddings.dimension),
+            "metadata": {"text": text, "filename": filename, "page": i, "page_label": str(i + 1)},
+        }
+        for i, text in enumerate(texts)
+    ]
+    index.upsert(vectors)
+
@@ -0,0 +1,68 @@
+"""Tiny dependency-free writer for text-only PDFs used as benchmark corpora."""
+import os
+import random
+from typing import List
+
+WORDS = (
+    "pipeline vector index embedding retrieval context answer document chunk page "
+    "latency throughput batch query model token prompt source metadata upload "
+    "server worker memory network cache score rank filter tenant namespace"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def page_lines(rng: random.Random, lines: int = 40, words_per_line: int = 12) -> List[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_line)).capitalize() + "." for _ in range(lines)]
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """Write one page per entry of `pages`, each a list of text lines"""
+    objects = []
+    page_ids = []
+    font_id = 3
+    next_id = 4
+    for lines in pages:
+        content = "BT /F1 10 Tf 12 TL 50 780 Td\n" + "".join(f"({_escape(line)}) Tj T*\n" for line in lines) + "ET"
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects.append((content_id, f"<< /Length {len(content.encode('latin-1'))} >>\nstream\n{content}\nendstream"))
+        objects.append((page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        )))
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects = [
+        (1, "<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"),
+        (font_id, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + objects
+    objects.sort()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id, body in objects:
+        offsets[object_id] = len(out)
+        out += f"{object_id} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for object_id, _ in objects:
+        out += f"{offsets[object_id]:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_corpus(directory: str, files: int, pages_per_file: int, seed: int = 0) -> List[str]:
+    """Write `files` synthetic PDFs into `directory` and return their paths"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"synthetic-{i:03d}.pdf")
+        write_pdf(path, [page_lines(rng) for _ in range(pages_per_file)])
+        paths.append(path)
+    return paths
@@ -0,0 +1,75 @@
+"""Memory and time to save an upload: whole-file read() vs. the streaming store.
+
+The old path read the upload into memory with `file.file.read()`, wrote it
+out and later hashed the file again for the manifest. The upload store
+copies it in fixed-size chunks, hashing on the way, so peak memory does not
+depend on the file size. Both read from a spooled temp file, as Starlette
+hands them to the route. A second upload of the same bytes under another
+name shows the duplicate detection.
+
+    python -m benchmarks.upload_store --mb 300
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from modules.manifest import hash_file
+from modules.upload_store import UploadStore
+
+
+def spooled_upload(source: str):
+    """File object positioned at the start, like UploadFile.file"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            spooled.write(block)
+    spooled.seek(0)
+    return spooled
+
+
+def measure(fn) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 3), "peak_mb": round(peak / (1 << 20), 1), "result": result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=300, help="size of the uploaded file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.pdf")
+        with open(source, "wb") as f:
+            for _ in range(args.mb):
+                f.write(os.urandom(1 << 20))
+
+        def old_save():
+            upload = spooled_upload(source)
+            save_path = Path(directory) / "old" / "manual.pdf"
+            save_path.parent.mkdir()
+            with open(save_path, "wb") as f:
+                f.write(upload.read())
+            return hash_file(str(save_path))[:12]
+
+        store = UploadStore(os.path.join(directory, "store"), max_bytes=(args.mb + 1) << 20)
+
+        def new_save(name):
+            stored = store.save(name, spooled_upload(source))
+            return f"{stored.sha256[:12]} duplicate={stored.duplicate}"
+
+        print(f"{'read() + hash_file':>24}: {measure(old_save)}")
+        print(f"{'upload store':>24}: {measure(lambda: new_save('manual.pdf'))}")
+        print(f"{'same bytes, new name':>24}: {measure(lambda: new_save('manual-copy.pdf'))}")
+        print(f"{'store':>24}: {store.info()}")
+
+
+if __name__ == "__main__":
+    main()
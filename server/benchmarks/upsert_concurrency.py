@@ -0,0 +1,55 @@
+"""Upsert throughput against in-flight request count on a slow, flaky fake index.
+
+    python -m benchmarks.upsert_concurrency --vectors 2000 --in-flight 1,2,4,8
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.stubs import FlakyIndex, fake_vector
+from modules.upsert_engine import UpsertEngine
+
+
+def make_vectors(count: int, dimension: int) -> list:
+    text = "lorem ipsum " * 40
+    return [
+        {"id": f"doc-{i}", "values": fake_vector(str(i), dimension), "metadata": {"text": text, "filename": "doc.pdf"}}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--in-flight", default="1,2,4,8")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--batch-bytes", type=int, default=512 * 1024)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimension)
+    with tempfile.TemporaryDirectory() as dead_letters:
+        for in_flight in (int(n) for n in args.in_flight.split(",")):
+            index = FlakyIndex(latency=args.latency, failure_rate=args.failure_rate)
+            engine = UpsertEngine(
+                index,
+                max_in_flight=in_flight,
+                max_batch_bytes=args.batch_bytes,
+                base_delay=0.01,
+                dead_letter_dir=dead_letters,
+            )
+            start = time.perf_counter()
+            with engine:
+                engine.submit(vectors)
+            elapsed = time.perf_counter() - start
+            print({
+                "in_flight": in_flight,
+                "vectors_per_second": round(args.vectors / elapsed, 1),
+                "stored": len(index.vectors),
+                **engine.stats,
+            })
+
+
+if __name__ == "__main__":
+    main()
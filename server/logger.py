@@ -1,26 +1,69 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
+from dotenv import load_dotenv
 
+load_dotenv()
 
-def setup_logger(name ="RAG PDF READER") :
+# Level of the app logger: DEBUG, INFO, WARNING, ...
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Levels of other loggers, e.g. "httpx=WARNING,pinecone=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING")
+# Hand records to a background thread so writing never blocks a request
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+# Fraction of requests that log verbose traces (match previews etc.) below DEBUG level
+LOG_TRACE_SAMPLE_RATE = float(os.getenv("LOG_TRACE_SAMPLE_RATE", "0"))
+
+_listeners = []
+
+
+def setup_logger(name ="RAG PDF READER", level: str = LOG_LEVEL, use_queue: bool = LOG_ASYNC, stream=None) :
     logger =logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    ch= logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
-    
-    
+    logger.setLevel(level)
+    ch= logging.StreamHandler(stream)
+
+
     formatter = logging.Formatter('[%(asctime)s]  [%(levelname)s] --- [%(message)s]')
     ch.setFormatter(formatter)
-    
+
     if not logger.hasHandlers():
-        logger.addHandler(ch)
+        if use_queue:
+            # The request thread only renders the message and enqueues it, the listener thread does the I/O
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, ch, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+            logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        else:
+            logger.addHandler(ch)
+
+    for item in filter(None, (part.strip() for part in LOG_LEVELS.split(","))):
+        other, _, other_level = item.partition("=")
+        logging.getLogger(other.strip()).setLevel(other_level.strip().upper())
     return logger
 
 
+def should_trace() -> bool:
+    """Whether the current request logs verbose previews: every request at DEBUG, else a sample"""
+    return logger.isEnabledFor(logging.DEBUG) or (
+        LOG_TRACE_SAMPLE_RATE > 0 and random.random() < LOG_TRACE_SAMPLE_RATE
+    )
+
+
+@atexit.register
+def stop_log_listeners():
+    """Write out queued records and stop the background log threads"""
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
+
+
 logger = setup_logger()
 
 # logger.info("RAG App started")
 # logger.debug("Debugging RAG App")
-# logger.error("Error in RAG App")    
+# logger.error("Error in RAG App")
 # logger.critical("Critical issue in RAG App")
-
-        
\ No newline at end of file
@@ -1,13 +1,49 @@
+import asyncio
+import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware  
 from middlewares.exception_handlers import catch_exception_middleware
+from middlewares.timing import timing_middleware
 from routes.upload import router as upload_router
 from routes.chat import router as chat_router
+from routes.stats import router as stats_router
+from routes.metrics import router as metrics_router
+from routes.health import router as health_router
+from routes.collections import router as collections_router
+from modules.resources import STARTUP_WARMUP, registry
+from modules.ingest_jobs import IngestionQueue, JobStore
 from dotenv import load_dotenv
 import os
 import uvicorn
 load_dotenv()
-app = FastAPI(title= "RAG API", description= "RAG API for PDF Reader", version= "1.0.0") 
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared clients once, every request reuses them
+    app.state.resources = registry
+    warmup = None
+    if STARTUP_WARMUP == "blocking":
+        await run_in_threadpool(registry.warmup)
+    elif STARTUP_WARMUP == "background":
+        # Connecting to Pinecone/Google/Groq doesn't hold up startup, /readyz tells when it's done
+        warmup = asyncio.create_task(run_in_threadpool(registry.warmup))
+    # Background workers that run /upload/ ingestion jobs
+    app.state.ingestion = IngestionQueue(JobStore())
+    await app.state.ingestion.start()
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    await app.state.ingestion.stop()
+    # The parse pool only exists if ingestion ran, don't import langchain just to stop it
+    if "modules.pdf_extract" in sys.modules:
+        sys.modules["modules.pdf_extract"].shutdown_pool()
+    registry.close()
+
+
+app = FastAPI(title= "RAG API", description= "RAG API for PDF Reader", version= "1.0.0", lifespan=lifespan) 
 
 #CORS Setup
 
@@ -22,11 +58,21 @@ app.add_middleware(
 
 #Middleware exception handler
 app.middleware("http")(catch_exception_middleware)  
+#Stage timings and per-route latency, outermost so it also sees errors
+app.middleware("http")(timing_middleware)
 #routers
 #1 Upload PDF documents
 app.include_router(upload_router)
 #2 Asking 
 app.include_router(chat_router)
+#3 Shared client pool stats
+app.include_router(stats_router)
+#4 Prometheus metrics
+app.include_router(metrics_router)
+#5 Liveness and readiness probes
+app.include_router(health_router)
+#6 Per-collection stats and deletion
+app.include_router(collections_router)
 
 
 if __name__ == "__main__":
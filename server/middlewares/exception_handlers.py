@@ -1,10 +1,16 @@
+import math
 from fastapi import  Request
 from fastapi.responses import JSONResponse
 from logger import logger
+from modules.rate_limit import Overloaded
 
 async def catch_exception_middleware (request: Request , call_next) :
     try:
         return await call_next(request)
+    except Overloaded as e:
+        # Load shed by a provider rate limiter, wherever it surfaces
+        logger.warning("Shedding request: %s", e)
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
         logger.exception("An error occurred: %s", str(e))
         return JSONResponse(
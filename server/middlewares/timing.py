@@ -0,0 +1,28 @@
+import time
+from fastapi import Request
+from modules.metrics import TIMING_HEADER_ENABLED, http_seconds, request_timings, server_timing
+
+
+async def timing_middleware(request: Request, call_next):
+    """Per-route latency histogram, plus a Server-Timing header when enabled.
+
+    Stage spans opened while handling the request add to `request_timings`.
+    For streamed responses the header goes out with the first byte, so it
+    only covers the stages that finished before streaming started.
+    """
+    timings = {}
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        request_timings.reset(token)
+        elapsed = time.perf_counter() - start
+        # Route templates keep label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_seconds.observe(elapsed, method=request.method, route=route, status=status)
+    if TIMING_HEADER_ENABLED:
+        response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    return response
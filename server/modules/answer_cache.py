@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from modules.metrics import cache_lookups
+
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Minimum cosine similarity between two questions for one to reuse the other's answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    doc_ids: frozenset
+    files: frozenset
+    response: dict
+    created_at: float
+    # Time the answer took to produce, credited as saved on every hit
+    cost_seconds: float
+    namespace: str = ""
+
+
+class AnswerCache:
+    """Answers keyed by question embedding, reused for near-identical questions.
+
+    A lookup hits when a cached question is within `threshold` cosine
+    similarity of the new one and retrieval returned exactly the same
+    documents of the same namespace, so the LLM would see the same context
+    and answers never cross collections. Entries expire after
+    `ttl` seconds, the least recently used are evicted beyond `max_entries`,
+    and ingestion drops every entry built from a file it re-indexes.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # slot -> CachedAnswer, least recently used first
+        self._vectors = None  # normalized question embeddings, one row per slot
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.stats = {
+            "hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+            "expirations": 0, "invalidations": 0, "seconds_saved": 0.0,
+        }
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, slot: int):
+        del self._entries[slot]
+        self._vectors[slot] = 0.0
+        self._free.append(slot)
+
+    def lookup(self, embedding, doc_ids: Iterable[str], namespace: str = "") -> Optional[dict]:
+        doc_ids = frozenset(doc_ids)
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._entries and self._vectors.shape[1] == len(vector):
+                scores = self._vectors @ vector
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for slot in candidates[np.argsort(-scores[candidates])]:
+                    entry = self._entries.get(int(slot))
+                    if entry is None:
+                        continue
+                    if now - entry.created_at > self.ttl:
+                        self._drop(int(slot))
+                        self.stats["expirations"] += 1
+                        continue
+                    if entry.doc_ids != doc_ids or entry.namespace != namespace:
+                        continue
+                    self._entries.move_to_end(int(slot))
+                    self.stats["hits"] += 1
+                    self.stats["seconds_saved"] += entry.cost_seconds
+                    cache_lookups.inc(cache="answer", result="hit")
+                    return entry.response
+            self.stats["misses"] += 1
+        cache_lookups.inc(cache="answer", result="miss")
+        return None
+
+    def store(self, question: str, embedding, doc_ids: Iterable[str], files: Iterable[str], response: dict, cost_seconds: float, namespace: str = ""):
+        if self.max_entries <= 0:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                self._entries.clear()
+                self._free = list(range(self.max_entries - 1, -1, -1))
+            if not self._free:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = CachedAnswer(
+                question, frozenset(doc_ids), frozenset(files), response, time.time(), cost_seconds, namespace
+            )
+            self.stats["stores"] += 1
+
+    def invalidate_files(self, files: Iterable[str], namespace: str = "") -> int:
+        """Drop every answer that used a chunk of one of `files` in `namespace`"""
+        files = set(files)
+        with self._lock:
+            stale = [slot for slot, entry in self._entries.items() if entry.files & files and entry.namespace == namespace]
+            for slot in stale:
+                self._drop(slot)
+            self.stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def invalidate_namespace(self, namespace: str = "") -> int:
+        """Drop every answer built from `namespace`"""
+        with self._lock:
+            stale = [slot for slot, entry in self._entries.items() if entry.namespace == namespace]
+            for slot in stale:
+                self._drop(slot)
+            self.stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._entries):
+                self._drop(slot)
+
+    def info(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "seconds_saved": round(self.stats["seconds_saved"], 3),
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache, shared by /chat/ and ingestion"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+    return _cache
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from logger import logger
+
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage does not finish within its time budget"""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage '{stage}' timed out after {timeout:g}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class Stage:
+    """Concurrency-limited, time-boxed step of the request pipeline.
+
+    Blocking SDK calls are pushed onto a dedicated thread pool so they never
+    run on the event loop; coroutines are awaited directly. Either way at most
+    `concurrency` calls are in flight and each one is bounded by `timeout`.
+    """
+
+    def __init__(self, name: str, concurrency: int, timeout: float, executor: ThreadPoolExecutor):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._executor = executor
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop that first uses them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking callable on the stage's thread pool"""
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            # The call sees the caller's context, e.g. its rate limit priority
+            call = partial(contextvars.copy_context().run, fn, *args, **kwargs)
+            return await self._bounded(loop.run_in_executor(self._executor, call))
+
+    async def run_async(self, awaitable):
+        """Await a coroutine under the stage's concurrency limit and timeout"""
+        async with self._get_semaphore():
+            return await self._bounded(awaitable)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the stage's concurrency slots, e.g. for the length of a stream"""
+        async with self._get_semaphore():
+            yield self
+
+    async def _bounded(self, awaitable):
+        try:
+            return await asyncio.wait_for(awaitable, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stage '%s' timed out after %gs", self.name, self.timeout)
+            raise StageTimeout(self.name, self.timeout) from None
+
+
+def _stage_from_env(name: str, concurrency: int, timeout: float, executor: ThreadPoolExecutor) -> Stage:
+    prefix = f"CHAT_{name.upper()}"
+    return Stage(
+        name,
+        concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+        timeout=float(os.getenv(f"{prefix}_TIMEOUT", timeout)),
+        executor=executor,
+    )
+
+
+def build_chat_stages() -> dict:
+    """Stages used by /chat/, tunable via CHAT_<STAGE>_CONCURRENCY / CHAT_<STAGE>_TIMEOUT"""
+    # The rerank timeout is its time budget, past it /chat/ keeps the vector order
+    defaults = {"embed": (32, 10.0), "query": (32, 10.0), "rerank": (8, 0.15), "llm": (16, 60.0)}
+    # One pool sized for the blocking stages, separate from the default threadpool FastAPI uses
+    workers = int(os.getenv("CHAT_EXECUTOR_WORKERS", 64))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-stage")
+    return {name: _stage_from_env(name, c, t, executor) for name, (c, t) in defaults.items()}
+
+
+chat_stages = build_chat_stages()
@@ -0,0 +1,208 @@
+"""Building blocks of /chat/batch: question files, shared chunk lookups and bounded generation.
+
+A batch is a JSONL file with one question per line, either a JSON string or
+an object with `question` and optionally `id` and `files`. Identical
+questions are answered once, questions are embedded BATCH_EMBED_SIZE at a
+time, retrieval runs BATCH_QUERY_CONCURRENCY questions at once and chunks
+retrieved by several questions are read from the chunk store once. All
+provider calls of a batch are bulk work for the rate limiters, so /chat/
+keeps priority, and the generation scheduler leaves most of the llm stage
+to it.
+
+The same pipeline answers a question file from the command line:
+
+    python -m modules.batch_questions questions.jsonl --collection docs --output answers.ndjson
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from typing import Callable, Iterable, List
+from dotenv import load_dotenv
+from modules.namespaces import DEFAULT_COLLECTION, collection_namespace
+
+load_dotenv()
+
+# Questions accepted per request
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "10000"))
+# Questions per embedding call
+BATCH_EMBED_SIZE = int(os.getenv("BATCH_EMBED_SIZE", "100"))
+# Questions retrieving at once
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))
+# Bulk generations in flight, Groq's rate limiter paces them
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+
+class InvalidBatch(ValueError):
+    """The question file can't be read, reported to the client as a 400"""
+
+
+def parse_questions(lines: Iterable[str], max_questions: int = BATCH_MAX_QUESTIONS) -> List[dict]:
+    """Questions of a JSONL file as {"id", "question", "files"}, ids default to the line number"""
+    items = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise InvalidBatch(f"Line {number}: invalid JSON ({e.msg})") from None
+        if isinstance(entry, str):
+            entry = {"question": entry}
+        question = entry.get("question") if isinstance(entry, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise InvalidBatch(f"Line {number}: expected a question string or an object with a 'question'")
+        files = entry.get("files")
+        if files is not None and not (isinstance(files, list) and all(isinstance(f, str) for f in files)):
+            raise InvalidBatch(f"Line {number}: 'files' must be a list of filenames")
+        items.append({"id": entry.get("id", number), "question": question.strip(), "files": files or None})
+        if len(items) > max_questions:
+            raise InvalidBatch(f"More than {max_questions} questions, split the file")
+    return items
+
+
+def group_duplicates(items: List[dict]) -> List[List[dict]]:
+    """Questions asked more than once over the same documents, answered once"""
+    groups = {}
+    for item in items:
+        key = (" ".join(item["question"].lower().split()), tuple(sorted(item["files"] or ())))
+        groups.setdefault(key, []).append(item)
+    return list(groups.values())
+
+
+class ChunkCache:
+    """Chunk store lookups shared by the questions of one batch.
+
+    Questions about the same topic retrieve many of the same chunks; each
+    is read from the store once and reused by later questions. Questions
+    retrieving at the same time wait for a chunk another one is already
+    reading instead of reading it too.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # Chunk id -> metadata, None for ids the store doesn't have
+        self.chunks = {}
+        self.fetched = 0
+        self.reused = 0
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, ids: List[str], namespace: str = "") -> dict:
+        ids = list(ids)
+        read = 0
+        while True:
+            with self._lock:
+                missing = [chunk_id for chunk_id in ids if chunk_id not in self.chunks]
+                waiting = {self._loading[chunk_id] for chunk_id in missing if chunk_id in self._loading}
+                fetch = [chunk_id for chunk_id in missing if chunk_id not in self._loading]
+                if fetch:
+                    done = threading.Event()
+                    self._loading.update(dict.fromkeys(fetch, done))
+            if fetch:
+                try:
+                    found = self.store.get_many(fetch, namespace)
+                    read += len(fetch)
+                    with self._lock:
+                        self.fetched += len(found)
+                        self.chunks.update({chunk_id: found.get(chunk_id) for chunk_id in fetch})
+                finally:
+                    with self._lock:
+                        for chunk_id in fetch:
+                            del self._loading[chunk_id]
+                    done.set()
+            if not waiting:
+                break
+            # Chunks whose reader failed are still missing and read on the next pass
+            for event in waiting:
+                event.wait()
+        with self._lock:
+            self.reused += len(ids) - read
+            return {chunk_id: self.chunks[chunk_id] for chunk_id in ids if self.chunks.get(chunk_id) is not None}
+
+
+class GenerationScheduler:
+    """Bounds how many bulk generations are in flight.
+
+    Batch answers take at most `concurrency` of the llm stage's slots, the
+    rest stay free for /chat/. Pacing and retries on rate limits come from
+    the Groq limiter, where bulk calls wait behind interactive ones.
+    """
+
+    def __init__(self, concurrency: int = BATCH_LLM_CONCURRENCY):
+        self.concurrency = concurrency
+        self.stats = {"calls": 0, "failed": 0, "in_flight": 0}
+        self._loop = None
+        self._semaphore = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop that first uses them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._semaphore = loop, asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def run(self, make_call: Callable):
+        """Await `make_call()` once a bulk generation slot is free"""
+        async with self._get_semaphore():
+            self.stats["calls"] += 1
+            self.stats["in_flight"] += 1
+            try:
+                return await make_call()
+            except Exception:
+                self.stats["failed"] += 1
+                raise
+            finally:
+                self.stats["in_flight"] -= 1
+
+    def info(self) -> dict:
+        return {"concurrency": self.concurrency, **self.stats}
+
+
+generation_scheduler = GenerationScheduler()
+
+
+def answer_file(questions_path, collection=DEFAULT_COLLECTION, output_path=None, use_cache=True):
+    """Answer a JSONL file of questions like /chat/batch, NDJSON to `output_path` or stdout"""
+    # routes.chat imports this module, and only the command line needs the providers
+    from modules.resources import registry
+    from routes.chat import answer_batch
+
+    with open(questions_path, encoding="utf-8-sig") as f:
+        items = parse_questions(f)
+    print(f"\n🧪 ANSWERING {len(items)} QUESTIONS FROM '{questions_path}'", file=sys.stderr)
+
+    async def run():
+        summary = None
+        out = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+        try:
+            async for line in answer_batch(registry, items, collection_namespace(collection), use_cache):
+                if "summary" in line:
+                    summary = line["summary"]
+                else:
+                    out.write(json.dumps(line) + "\n")
+        finally:
+            if output_path:
+                out.close()
+        return summary
+
+    summary = asyncio.run(run())
+    print(
+        f"✅ {summary['answered']} answered, {summary['failed']} failed, {summary['cached']} cached in {summary['seconds']}s "
+        f"({summary['questions_per_min']} questions/min)",
+        file=sys.stderr,
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions against an indexed collection")
+    parser.add_argument("questions", help="JSONL file, one question string or {\"question\", \"id\", \"files\"} per line")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--output", help="NDJSON answers, stdout if not given")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the answer cache")
+    args = parser.parse_args()
+    answer_file(args.questions, args.collection, args.output, not args.no_cache)
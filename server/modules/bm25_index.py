@@ -0,0 +1,348 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter, defaultdict
+from typing import Iterable, List
+
+import numpy as np
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+BM25_ENABLED = os.getenv("BM25_ENABLED", "true").lower() in ("1", "true", "yes")
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "./bm25.db")
+# Documents buffered in memory before their postings are written as a new block
+BM25_FLUSH_DOCS = int(os.getenv("BM25_FLUSH_DOCS", "5000"))
+# A term's blocks are merged into one once it has more than this many
+BM25_MAX_BLOCKS = int(os.getenv("BM25_MAX_BLOCKS", "8"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Keeps identifiers such as "E-1042", "v2.3" or "part_no" together
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or that the their this to was "
+    "were what when where which who why will with does do did can".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers are indexed whole and by part"""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in re.split(r"[-_./]", token) if part and part not in _STOPWORDS)
+    return terms
+
+
+# Blocks shorter than this are stored raw, zlib only pays off on longer postings
+_COMPRESS_MIN_BYTES = 64
+
+
+def _pack_block(count: int, deltas: bytes, freqs: bytes) -> bytes:
+    raw = np.uint32(count).tobytes() + deltas + freqs
+    if len(raw) < _COMPRESS_MIN_BYTES:
+        return b"r" + raw
+    return b"z" + zlib.compress(raw, 1)
+
+
+def encode_postings(docs: np.ndarray, freqs: np.ndarray) -> bytes:
+    """Sorted doc numbers as deltas plus term frequencies, zlib-compressed when long enough"""
+    deltas = np.diff(docs, prepend=np.uint32(0)).astype(np.uint32)
+    return _pack_block(len(docs), deltas.tobytes(), freqs.astype(np.uint16).tobytes())
+
+
+def decode_postings(blob: bytes) -> tuple:
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    count = int(np.frombuffer(raw[:4], dtype=np.uint32)[0])
+    docs = np.cumsum(np.frombuffer(raw[4:4 + 4 * count], dtype=np.uint32), dtype=np.uint32)
+    freqs = np.frombuffer(raw[4 + 4 * count:], dtype=np.uint16)
+    return docs, freqs
+
+
+class BM25Index:
+    """Incremental on-disk BM25 index over chunk texts, keyed by vector id.
+
+    Chunk ids map to dense internal doc numbers. Postings of each term are
+    stored as compressed blocks of delta-encoded doc numbers and term
+    frequencies; every flush appends one block per term and terms with too
+    many blocks are merged, so writes stay cheap and reads stay short.
+    Deleted chunks are dropped from the document table at once and from the
+    postings at the next merge. Doc lengths are kept in memory (2 bytes per
+    chunk) so scoring never touches the document table.
+    """
+
+    def __init__(self, path: str = BM25_INDEX_PATH, flush_docs: int = BM25_FLUSH_DOCS, max_blocks: int = BM25_MAX_BLOCKS):
+        self.path = path
+        self.flush_docs = flush_docs
+        self.max_blocks = max_blocks
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS docs (doc INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, length INTEGER NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, block INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (term, block))"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        rows = self._conn.execute("SELECT doc, length FROM docs").fetchall()
+        # Doc numbers are never reused: postings of deleted docs linger until their term is merged
+        self._next_doc = self._load_next_doc(rows)
+        self._lengths = np.zeros(max(self._next_doc, 1024), dtype=np.uint16)
+        for doc, length in rows:
+            self._lengths[doc] = min(length, 65535)
+        self._doc_count = len(rows)
+        self._total_length = int(sum(length for _, length in rows))
+        self._buffer = defaultdict(list)  # term -> [(doc, freq)] not yet written
+        self._buffer_docs = []
+        self._block_counts = dict(self._conn.execute("SELECT term, COUNT(*) FROM postings GROUP BY term"))
+        self._next_block = dict(self._conn.execute("SELECT term, MAX(block) + 1 FROM postings GROUP BY term"))
+
+    def _load_next_doc(self, rows) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'next_doc'").fetchone()
+        if row is not None:
+            return row[0]
+        # Index written before the counter was stored: start past every doc number still in the postings
+        highest = max((doc for doc, _ in rows), default=-1)
+        for (blob,) in self._conn.execute("SELECT data FROM postings"):
+            docs, _ = decode_postings(blob)
+            if len(docs):
+                highest = max(highest, int(docs[-1]))
+        with self._conn:
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('next_doc', ?)", (highest + 1,))
+        return highest + 1
+
+    def __len__(self) -> int:
+        return self._doc_count
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """Index chunks; ids already present are skipped since ids are content-derived"""
+        with self._lock:
+            ids, texts = list(ids), list(texts)
+            known = self._existing(ids)
+            for chunk_id, text in zip(ids, texts):
+                if chunk_id in known:
+                    continue
+                known.add(chunk_id)
+                terms = Counter(tokenize(text))
+                doc = self._next_doc
+                self._next_doc += 1
+                if doc >= len(self._lengths):
+                    self._lengths = np.concatenate([self._lengths, np.zeros(len(self._lengths), dtype=np.uint16)])
+                length = sum(terms.values())
+                self._lengths[doc] = min(max(length, 1), 65535)
+                self._doc_count += 1
+                self._total_length += length
+                self._buffer_docs.append((doc, chunk_id, length))
+                for term, freq in terms.items():
+                    self._buffer[term].append((doc, freq))
+            if len(self._buffer_docs) >= self.flush_docs:
+                self.flush()
+
+    def _existing(self, ids: List[str]) -> set:
+        wanted = set(ids)
+        found = {chunk_id for _, chunk_id, _ in self._buffer_docs if chunk_id in wanted}
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            found.update(row[0] for row in self._conn.execute(f"SELECT id FROM docs WHERE id IN ({placeholders})", part))
+        return found
+
+    def flush(self):
+        """Write buffered postings as one new block per term"""
+        with self._lock:
+            if not self._buffer_docs:
+                return
+            # Encode every term's block from flat arrays instead of one numpy pass per term
+            terms = list(self._buffer)
+            counts = np.fromiter((len(self._buffer[term]) for term in terms), dtype=np.int64, count=len(terms))
+            total = int(counts.sum())
+            docs = np.fromiter((doc for term in terms for doc, _ in self._buffer[term]), dtype=np.uint32, count=total)
+            freqs = np.fromiter((freq for term in terms for _, freq in self._buffer[term]), dtype=np.int64, count=total)
+            freqs = np.minimum(freqs, 65535).astype(np.uint16)
+            ends = np.cumsum(counts)
+            starts = ends - counts
+            deltas = np.diff(docs, prepend=np.uint32(0)).astype(np.uint32)
+            deltas[starts] = docs[starts]
+            delta_bytes, freq_bytes = deltas.tobytes(), freqs.tobytes()
+            rows = []
+            for term, start, end in zip(terms, starts.tolist(), ends.tolist()):
+                block = self._next_block.get(term, 0)
+                self._next_block[term] = block + 1
+                self._block_counts[term] = self._block_counts.get(term, 0) + 1
+                rows.append((term, block, _pack_block(end - start, delta_bytes[4 * start:4 * end], freq_bytes[2 * start:2 * end])))
+            with self._conn:
+                self._conn.executemany("INSERT INTO docs (doc, id, length) VALUES (?, ?, ?)", self._buffer_docs)
+                self._conn.executemany("INSERT INTO postings (term, block, data) VALUES (?, ?, ?)", rows)
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_doc', ?)", (self._next_doc,))
+                for term in [term for term in terms if self._block_counts[term] > self.max_blocks]:
+                    self._merge_term(term)
+            self._buffer.clear()
+            self._buffer_docs = []
+
+    def _merge_term(self, term: str):
+        docs, freqs = self._read_term(term, include_buffer=False)
+        alive = self._lengths[docs] > 0
+        self._conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+        if alive.any():
+            self._conn.execute(
+                "INSERT INTO postings (term, block, data) VALUES (?, 0, ?)", (term, encode_postings(docs[alive], freqs[alive]))
+            )
+            self._block_counts[term], self._next_block[term] = 1, 1
+        else:
+            self._block_counts.pop(term, None)
+            self._next_block.pop(term, None)
+
+    def _read_term(self, term: str, include_buffer: bool = True) -> tuple:
+        parts = [
+            decode_postings(blob)
+            for (blob,) in self._conn.execute("SELECT data FROM postings WHERE term = ? ORDER BY block", (term,))
+        ]
+        if include_buffer and term in self._buffer:
+            entries = self._buffer[term]
+            parts.append((
+                np.fromiter((doc for doc, _ in entries), dtype=np.uint32, count=len(entries)),
+                np.minimum(np.fromiter((freq for _, freq in entries), dtype=np.int64, count=len(entries)), 65535).astype(np.uint16),
+            ))
+        if not parts:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16)
+        # Blocks are written in doc order, so concatenating keeps postings sorted
+        return np.concatenate([docs for docs, _ in parts]), np.concatenate([freqs for _, freqs in parts])
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            ids = list(ids)
+            pending = {chunk_id for _, chunk_id, _ in self._buffer_docs} & set(ids)
+            if pending:
+                self.flush()
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(f"SELECT doc, length FROM docs WHERE id IN ({placeholders})", part).fetchall()
+                with self._conn:
+                    self._conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", part)
+                for doc, length in rows:
+                    self._lengths[doc] = 0
+                    self._doc_count -= 1
+                    self._total_length -= length
+
+    def search(self, query: str, top_k: int = 10) -> List[tuple]:
+        """Best (chunk id, score) pairs for `query`.
+
+        Postings are intersected first, rarest term first, so documents
+        containing every query term are found without scoring the long
+        postings of common terms; only if fewer than `top_k` documents match
+        all terms are the postings unioned instead.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not terms or not self._doc_count:
+                return []
+            postings = []
+            for term in terms:
+                docs, freqs = self._read_term(term)
+                alive = self._lengths[docs] > 0
+                if alive.any():
+                    postings.append((docs[alive], freqs[alive]))
+            if not postings:
+                return []
+            lengths = self._lengths
+            doc_count = self._doc_count
+            average_length = max(self._total_length / doc_count, 1.0)
+
+        postings.sort(key=lambda p: len(p[0]))
+        candidates = postings[0][0]
+        for docs, _ in postings[1:]:
+            if len(candidates) < top_k:
+                break
+            candidates = np.intersect1d(candidates, docs, assume_unique=True)
+        if len(candidates) < top_k:
+            candidates = np.unique(np.concatenate([docs for docs, _ in postings]))
+
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths[candidates].astype(np.float32) / average_length)
+        for docs, freqs in postings:
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            positions = np.searchsorted(docs, candidates)
+            positions[positions >= len(docs)] = 0
+            present = docs[positions] == candidates
+            tf = np.where(present, freqs[positions], 0).astype(np.float32)
+            scores += idf * tf * (BM25_K1 + 1) / (tf + norms)
+
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        docs = [int(doc) for doc in candidates[top]]
+        with self._lock:
+            placeholders = ",".join("?" * len(docs))
+            ids = dict(self._conn.execute(f"SELECT doc, id FROM docs WHERE doc IN ({placeholders})", docs))
+            buffered = {doc: chunk_id for doc, chunk_id, _ in self._buffer_docs}
+        return [
+            (ids.get(doc) or buffered[doc], float(score))
+            for doc, score in zip(docs, scores[top])
+            if doc in ids or doc in buffered
+        ]
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "documents": self._doc_count,
+                "terms": len(self._block_counts),
+                "buffered": len(self._buffer_docs),
+                "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            }
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = 60) -> List[tuple]:
+    """Merge ranked id lists into (id, score), each list adds 1 / (k + rank) per id"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def bm25_path(namespace: str = "") -> str:
+    """File of a namespace's keyword index: BM25_INDEX_PATH, or bm25.<namespace>.db next to it"""
+    if not namespace:
+        return BM25_INDEX_PATH
+    root, ext = os.path.splitext(BM25_INDEX_PATH)
+    return f"{root}.{namespace}{ext or '.db'}"
+
+
+def get_bm25_index(namespace: str = "") -> BM25Index:
+    """Process-wide keyword index of one namespace, written by ingestion and read by /chat/"""
+    with _index_lock:
+        index = _indexes.get(namespace)
+        if index is None:
+            index = _indexes[namespace] = BM25Index(bm25_path(namespace))
+            logger.info("BM25 index opened at %s with %d chunks", index.path, len(index))
+    return index
+
+
+def drop_bm25_index(namespace: str = ""):
+    """Close and delete a namespace's keyword index"""
+    with _index_lock:
+        index = _indexes.pop(namespace, None)
+        if index is not None:
+            index.close()
+        path = bm25_path(namespace)
+        for name in (path, f"{path}-wal", f"{path}-shm"):
+            if os.path.exists(name):
+                os.remove(name)
@@ -0,0 +1,157 @@
+"""Chunk texts and metadata kept next to the vector index instead of in it.
+
+Vectors used to carry their chunk text and every PDF metadata field, which
+made upsert payloads and query responses large and counts against
+Pinecone's per-vector metadata limit. With the chunk store the index keeps
+only the fields queries filter on (INDEX_METADATA_FIELDS) and the rest lives
+here: chunk text and page fields compressed per row (zstd when the
+zstandard package is installed, zlib otherwise), document metadata once per
+file, keyed by namespace and vector id. /chat/ hydrates all its candidates
+with one batched lookup.
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Iterable, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHUNK_STORE_ENABLED = os.getenv("CHUNK_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "./chunk_store.db")
+# Metadata every vector keeps in the index, what /chat/ filters on
+INDEX_METADATA_FIELDS = ("filename",)
+
+try:
+    import zstandard
+
+    _compressor = zstandard.ZstdCompressor(level=3)
+    _decompressor = zstandard.ZstdDecompressor()
+except ImportError:  # zstandard is optional, zlib is always there
+    _compressor = _decompressor = None
+
+COMPRESSION = "zstd" if _compressor is not None else "zlib"
+
+
+def _pack(value) -> bytes:
+    raw = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+    if _compressor is not None:
+        return b"s" + _compressor.compress(raw)
+    return b"z" + zlib.compress(raw, 6)
+
+
+def _unpack(blob: bytes):
+    if blob[:1] == b"s":
+        if _decompressor is None:
+            raise RuntimeError("Chunk store rows are zstd-compressed, install the zstandard package to read them")
+        raw = _decompressor.decompress(blob[1:])
+    else:
+        raw = zlib.decompress(blob[1:])
+    return json.loads(raw)
+
+
+def index_metadata(metadata: dict) -> dict:
+    """The part of a chunk's metadata that stays in the vector index"""
+    return {key: metadata[key] for key in INDEX_METADATA_FIELDS if key in metadata}
+
+
+class ChunkStore:
+    """SQLite store of chunk texts and metadata, keyed by namespace and vector id"""
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    namespace TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    metadata BLOB NOT NULL,
+                    PRIMARY KEY (namespace, filename)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS chunks (
+                    namespace TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (namespace, id)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_file ON chunks (namespace, filename)")
+
+    def put(self, filename: str, document: dict, ids: List[str], texts: List[str], metadatas: List[dict], namespace: str = ""):
+        """Store chunks of one file; `document` holds the fields shared by all of them"""
+        rows = [
+            (namespace, vector_id, filename, _pack({**metadata, "text": text}))
+            for vector_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (namespace, filename, metadata) VALUES (?, ?, ?)",
+                (namespace, filename, _pack({**document, "filename": filename})),
+            )
+            self._conn.executemany("INSERT OR REPLACE INTO chunks (namespace, id, filename, data) VALUES (?, ?, ?, ?)", rows)
+
+    def get_many(self, ids: Iterable[str], namespace: str = "") -> dict:
+        """Full metadata, text included, of the stored chunks among `ids`"""
+        unique = list(dict.fromkeys(ids))
+        found, documents = {}, {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"""SELECT c.id, c.data, d.filename, d.metadata FROM chunks c
+                        JOIN documents d ON d.namespace = c.namespace AND d.filename = c.filename
+                        WHERE c.namespace = ? AND c.id IN ({placeholders})""",
+                    [namespace, *part],
+                ).fetchall()
+                for vector_id, data, filename, document in rows:
+                    if filename not in documents:
+                        documents[filename] = _unpack(document)
+                    found[vector_id] = {**documents[filename], **_unpack(data)}
+        return found
+
+    def delete(self, ids: Iterable[str], namespace: str = ""):
+        ids = list(ids)
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE namespace = ? AND id = ?", [(namespace, i) for i in ids])
+
+    def remove_file(self, filename: str, namespace: str = ""):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE namespace = ? AND filename = ?", (namespace, filename))
+            self._conn.execute("DELETE FROM documents WHERE namespace = ? AND filename = ?", (namespace, filename))
+
+    def remove_namespace(self, namespace: str = ""):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
+            self._conn.execute("DELETE FROM documents WHERE namespace = ?", (namespace,))
+
+    def info(self) -> dict:
+        with self._lock:
+            chunks, stored = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM chunks").fetchone()
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {"chunks": chunks, "documents": documents, "stored_bytes": stored, "compression": COMPRESSION}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_chunk_store = None
+_chunk_store_lock = threading.Lock()
+
+
+def get_chunk_store() -> ChunkStore:
+    global _chunk_store
+    with _chunk_store_lock:
+        if _chunk_store is None:
+            _chunk_store = ChunkStore()
+    return _chunk_store
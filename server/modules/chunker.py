@@ -0,0 +1,201 @@
+"""Token-budgeted chunking on precomputed boundary offsets.
+
+The pages of a range are joined and classified character by character in
+one numpy pass, which yields the token pieces count_tokens estimates with,
+their cumulative token counts and how strong a boundary (paragraph, line,
+sentence, word) precedes each one. A chunk then ends at the strongest
+boundary that keeps it within CHUNK_MAX_TOKENS, never past the end of its
+page, and the next one starts CHUNK_OVERLAP_TOKENS earlier on a word
+boundary.
+
+Chunks are rows of a ChunkTable: page, start and end offsets in typed
+arrays, with the page texts and the document metadata stored once.
+"""
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# Upper bound on a chunk's size in estimated tokens, about the 500 characters chunks used to have
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "144"))
+# Tokens repeated at the start of the next chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "12"))
+
+# How good a place the gap before a piece is to end a chunk
+NO_BREAK, WORD, SENTENCE, LINE, PARAGRAPH = range(5)
+
+# Pieces are what context_builder.count_tokens estimates with: runs of word
+# characters and single punctuation marks. Words are cut into 64-character
+# runs (same estimate) so they can be split when nothing else fits.
+MAX_WORD = 64
+SPACE, WORD_CHAR, PUNCTUATION = range(3)
+_ASCII_CLASSES = np.array(
+    [SPACE if chr(c).isspace() else WORD_CHAR if chr(c).isalnum() or c == 95 else PUNCTUATION for c in range(128)],
+    dtype=np.int8,
+)
+_SENTENCE_END_CODES = np.array([ord(c) for c in ".!?"], dtype=np.uint32)
+
+
+def _classes(codes: np.ndarray) -> np.ndarray:
+    """Space / word character / punctuation per code point, the way re's \\s and \\w see them"""
+    ascii_chars = codes < 128
+    classes = np.empty(len(codes), dtype=np.int8)
+    classes[ascii_chars] = _ASCII_CLASSES[codes[ascii_chars]]
+    if not ascii_chars.all():
+        # Only the distinct non-ASCII characters of the text are looked at one by one
+        distinct, inverse = np.unique(codes[~ascii_chars], return_inverse=True)
+        looked_up = np.array(
+            [SPACE if chr(c).isspace() else WORD_CHAR if chr(c).isalnum() else PUNCTUATION for c in distinct.tolist()],
+            dtype=np.int8,
+        )
+        classes[~ascii_chars] = looked_up[inverse]
+    return classes
+
+
+def _pieces(text: str) -> tuple:
+    """Piece offsets, cumulative token counts and the break level before each piece"""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    classes = _classes(codes)
+    word = classes == WORD_CHAR
+    run_starts = word & ~np.concatenate(([False], word[:-1]))
+    piece_starts = run_starts | (classes == PUNCTUATION)
+    run_lengths = np.flatnonzero(word & ~np.concatenate((word[1:], [False]))) + 1 - np.flatnonzero(run_starts)
+    if len(run_lengths) and run_lengths.max() > MAX_WORD:
+        # Rare enough to cut one run at a time
+        long_runs = run_lengths > MAX_WORD
+        for start, length in zip(np.flatnonzero(run_starts)[long_runs].tolist(), run_lengths[long_runs].tolist()):
+            piece_starts[start + MAX_WORD:start + length:MAX_WORD] = True
+    following = np.concatenate((piece_starts[1:] | (classes[1:] == SPACE), [True]))
+    starts = np.flatnonzero(piece_starts)
+    ends = np.flatnonzero((classes != SPACE) & following) + 1
+
+    cumulative = np.zeros(len(starts) + 1, dtype=np.int64)
+    # Long words cost a token per 4 characters, like count_tokens' estimate
+    np.cumsum((ends - starts + 3) // 4, out=cumulative[1:])
+
+    levels = np.full(len(starts) + 1, PARAGRAPH, dtype=np.int8)
+    if len(starts) > 1:
+        gap_starts, gap_ends = ends[:-1], starts[1:]
+        newlines = np.flatnonzero(codes == 10)
+        breaks = np.searchsorted(newlines, gap_ends) - np.searchsorted(newlines, gap_starts)
+        spaced = gap_ends > gap_starts
+        sentence_ends = spaced & np.isin(codes[gap_starts - 1], _SENTENCE_END_CODES)
+        inner = np.where(spaced, WORD, NO_BREAK)
+        inner = np.where(sentence_ends, SENTENCE, inner)
+        inner = np.where(breaks == 1, LINE, inner)
+        levels[1:-1] = np.where(breaks > 1, PARAGRAPH, inner)
+    return starts, ends, cumulative, levels
+
+
+def _chunk_spans(pieces: tuple, stops: list, max_tokens: int, overlap_tokens: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Character (starts, ends) of the chunks of a text's pieces; no chunk crosses a piece index in `stops`"""
+    starts, ends, cumulative, levels = pieces
+    # One bisect or slice per chunk, cheaper on plain lists than as numpy calls
+    cumulative, levels = cumulative.tolist(), levels.tolist()
+    count = len(starts)
+    stops = [stop for stop in stops if stop < count] + [count]
+    first_pieces, last_pieces = [], []
+    begin, stop = 0, 0
+    while begin < count:
+        while stops[stop] <= begin:
+            stop += 1
+        # Last piece that still fits, at least one piece per chunk
+        limit = max(bisect_right(cumulative, cumulative[begin] + max_tokens) - 1, begin + 1)
+        if limit >= stops[stop]:
+            end = stops[stop]
+        else:
+            # Strongest break in the second half of the budget, the latest one on ties
+            low = min(max(bisect_left(cumulative, cumulative[begin] + max_tokens // 2), begin + 1), limit)
+            window = levels[low:limit + 1]
+            strongest = max(window)
+            # Without any break (one long run of characters) the chunk is cut where the budget ends
+            end = limit - window[::-1].index(strongest) if strongest > NO_BREAK else limit
+        first_pieces.append(begin)
+        last_pieces.append(end - 1)
+        if end == stops[stop]:
+            begin = end
+            continue
+        # Start the next chunk a little earlier, on a word boundary
+        back = max(bisect_left(cumulative, cumulative[end] - overlap_tokens), begin + 1)
+        begin = next((i for i in range(back, end) if levels[i] > NO_BREAK), end)
+    return starts[first_pieces], ends[last_pieces]
+
+
+def split_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Tuple[list, list]:
+    """Character (starts, ends) of the chunks of one text"""
+    starts, ends = _chunk_spans(_pieces(text), [], max_tokens, overlap_tokens)
+    return starts.tolist(), ends.tolist()
+
+
+class Chunk:
+    """One row of a ChunkTable"""
+
+    __slots__ = ("text", "page", "page_label", "start")
+
+    def __init__(self, text: str, page: int, page_label: str, start: int):
+        self.text = text
+        self.page = page
+        self.page_label = page_label
+        self.start = start
+
+    @property
+    def metadata(self) -> dict:
+        """Chunk-level metadata, document fields are on the table"""
+        return {"page": self.page, "page_label": self.page_label, "start_index": self.start}
+
+
+class ChunkTable:
+    """Chunks of consecutive pages of one document.
+
+    Document metadata and page texts are stored once; each chunk is a row of
+    (page, start, end) in typed arrays and its text a slice of its page.
+    """
+
+    __slots__ = ("document", "page_numbers", "page_labels", "page_texts", "pages", "starts", "ends")
+
+    def __init__(self, document: dict = None):
+        self.document = document or {}
+        self.page_numbers = []
+        self.page_labels = []
+        self.page_texts = []
+        self.pages = array("I")
+        self.starts = array("I")
+        self.ends = array("I")
+
+    def add_pages(self, pages: List[tuple], max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        """Split (page number, page label, text) pages in one pass over their joined text"""
+        if not pages:
+            return
+        texts = [text for _, _, text in pages]
+        # Pages are joined by a paragraph break, and chunks are cut at every page end
+        offsets = np.zeros(len(texts), dtype=np.int64)
+        np.cumsum([len(text) + 2 for text in texts[:-1]], out=offsets[1:])
+        joined = "\n\n".join(texts)
+        pieces = _pieces(joined)
+        stops = np.searchsorted(pieces[0], offsets[1:]).tolist()
+        chunk_starts, chunk_ends = _chunk_spans(pieces, stops, max_tokens, overlap_tokens)
+        page_index = np.searchsorted(offsets, chunk_starts, side="right") - 1
+        base = len(self.page_texts)
+        for number, label, text in pages:
+            self.page_numbers.append(number)
+            self.page_labels.append(label)
+            self.page_texts.append(text)
+        self.pages.frombytes((page_index + base).astype(np.uintc).tobytes())
+        self.starts.frombytes((chunk_starts - offsets[page_index]).astype(np.uintc).tobytes())
+        self.ends.frombytes((chunk_ends - offsets[page_index]).astype(np.uintc).tobytes())
+
+    def add_page(self, number: int, label: str, text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self.add_pages([(number, label, text)], max_tokens, overlap_tokens)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> Chunk:
+        page = self.pages[i]
+        start = self.starts[i]
+        return Chunk(self.page_texts[page][start:self.ends[i]], self.page_numbers[page], self.page_labels[page], start)
+
+    def __iter__(self) -> Iterator[Chunk]:
+        return (self[i] for i in range(len(self)))
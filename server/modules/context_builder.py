@@ -0,0 +1,188 @@
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+load_dotenv()
+
+# Tokens of retrieved context allowed into the prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+# Matches fetched from the index before packing
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+# Chunks whose embeddings are at least this similar to an already packed one are dropped
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.95"))
+# The stuff-documents chain joins documents with a blank line
+DOCUMENT_SEPARATOR_TOKENS = 2
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, or its vocabulary may not be downloadable
+    _encoding = None
+
+TOKENIZER = "tiktoken" if _encoding is not None else "regex"
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise a close regex estimate"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # BPE vocabularies keep common short words whole and split long ones every ~4 chars
+    return sum(math.ceil(len(piece) / 4) for piece in _WORDS.findall(text))
+
+
+@dataclass
+class Candidate:
+    """One retrieved chunk, ready to be packed"""
+
+    id: str
+    text: str
+    score: float
+    metadata: dict
+    values: list = None
+    tokens: int = 0
+
+
+@dataclass
+class PackedContext:
+    docs: List["Document"] = field(default_factory=list)
+    doc_ids: List[str] = field(default_factory=list)
+    tokens: int = 0
+    candidates: int = 0
+    duplicates: int = 0
+    over_budget: int = 0
+    merged: int = 0
+
+
+# Without offsets, chunks only count as continuing each other when this much text repeats
+MIN_TEXT_OVERLAP = 20
+
+
+def _is_boundary(text: str, position: int) -> bool:
+    """Whether `position` falls between tokens of `text` rather than inside a word"""
+    if position <= 0 or position >= len(text):
+        return True
+    return not (text[position - 1].isalnum() and text[position].isalnum())
+
+
+def _overlap(left: str, right: str, max_overlap: int = 200, min_overlap: int = MIN_TEXT_OVERLAP) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`, starting and ending on token boundaries"""
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]) and _is_boundary(left, len(left) - size) and _is_boundary(right, size):
+            return size
+    return 0
+
+
+def _end(candidate: Candidate):
+    start = candidate.metadata.get("start_index")
+    return None if start is None else start + len(candidate.text)
+
+
+def _merge_adjacent(selected: List[Candidate]) -> tuple:
+    """Join chunks that continue each other on the same page, returns (groups, merged count).
+
+    With start_index on both chunks their offsets decide; otherwise only a
+    long enough repeated passage shows that one continues the other.
+    """
+    groups = []
+    merged = 0
+    by_page = {}
+    for candidate in selected:
+        key = (candidate.metadata.get("source"), candidate.metadata.get("page"))
+        by_page.setdefault(key, []).append(candidate)
+    for page_candidates in by_page.values():
+        page_candidates.sort(key=lambda c: (c.metadata.get("start_index") is None, c.metadata.get("start_index") or 0))
+        first = page_candidates[0]
+        current, text = [first], first.text
+        end = _end(first)
+        for candidate in page_candidates[1:]:
+            start = candidate.metadata.get("start_index")
+            if start is not None and end is not None:
+                # Offsets on the page: overlapping or at most a separator apart
+                contiguous = start <= end + 2
+                overlap = max(0, min(end - start, len(candidate.text)))
+                if overlap and not text.endswith(candidate.text[:overlap]):
+                    overlap = _overlap(text, candidate.text)
+            else:
+                overlap = _overlap(text, candidate.text)
+                contiguous = overlap > 0
+            if contiguous:
+                text = text + (candidate.text[overlap:] if overlap else " " + candidate.text)
+                current.append(candidate)
+                merged += 1
+                candidate_end = _end(candidate)
+                end = None if end is None or candidate_end is None else max(end, candidate_end)
+            else:
+                groups.append((current, text))
+                current, text, end = [candidate], candidate.text, _end(candidate)
+        groups.append((current, text))
+    return groups, merged
+
+
+def pack_context(candidates: List[Candidate], budget: int = CONTEXT_TOKEN_BUDGET, dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> PackedContext:
+    """Greedily pack the best non-redundant chunks into `budget` tokens.
+
+    Candidates are taken by score; a chunk is skipped when its text was
+    already packed or its embedding is a near-duplicate of a packed one, and
+    when it does not fit in what is left of the budget (smaller, lower
+    scoring chunks may still fit). Packed chunks that continue each other on
+    the same page are merged into one document so their overlap is sent once.
+    """
+    packed = PackedContext(candidates=len(candidates))
+    selected, seen_text, vectors = [], set(), []
+    used = 0
+    for candidate in sorted(candidates, key=lambda c: c.score, reverse=True):
+        if candidate.text in seen_text:
+            packed.duplicates += 1
+            continue
+        if candidate.values is not None and vectors:
+            vector = np.asarray(candidate.values, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm and float(np.max(np.stack(vectors) @ (vector / norm))) >= dedup_threshold:
+                packed.duplicates += 1
+                continue
+        candidate.tokens = count_tokens(candidate.text)
+        cost = candidate.tokens + DOCUMENT_SEPARATOR_TOKENS
+        if used + cost > budget:
+            if selected or candidate.tokens == 0:
+                packed.over_budget += 1
+                continue
+            # Always answer from something: trim the best chunk to the budget
+            keep = int(len(candidate.text) * budget / cost)
+            candidate.text = candidate.text[:keep]
+            candidate.tokens = count_tokens(candidate.text)
+            cost = candidate.tokens + DOCUMENT_SEPARATOR_TOKENS
+        used += cost
+        seen_text.add(candidate.text)
+        selected.append(candidate)
+        if candidate.values is not None:
+            vector = np.asarray(candidate.values, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vectors.append(vector / norm)
+
+    if not selected:
+        return packed
+
+    # Deferred so importing the /chat/ route doesn't pull in langchain at startup
+    from langchain_core.documents import Document
+
+    groups, packed.merged = _merge_adjacent(selected)
+    groups.sort(key=lambda group: max(c.score for c in group[0]), reverse=True)
+    for group, text in groups:
+        best = max(group, key=lambda c: c.score)
+        packed.docs.append(Document(page_content=text, metadata={**best.metadata, "score": best.score}))
+        packed.doc_ids.extend(c.id for c in group)
+        packed.tokens += count_tokens(text) + DOCUMENT_SEPARATOR_TOKENS
+    return packed
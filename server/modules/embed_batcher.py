@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+from logger import logger
+from modules.async_stages import Stage, chat_stages
+from modules.embedding_cache import embed_query_batch
+from modules.latency import LatencyRecorder
+
+load_dotenv()
+
+EMBED_BATCH_ENABLED = os.getenv("EMBED_BATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+# How long the first query of a batch waits for others to join
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+# A batch is sent as soon as it has this many queries
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 100)
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50)
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batch provider calls.
+
+    The first query to arrive opens a window; every query that arrives
+    before it closes (or until the batch is full) is embedded in the same
+    call on the embed stage, and each caller gets its own vector back. A
+    failed batch fails every caller in it.
+    """
+
+    def __init__(self, stage: Stage, window_ms: float = EMBED_BATCH_WINDOW_MS, max_size: int = EMBED_BATCH_MAX_SIZE):
+        self.stage = stage
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.metrics = LatencyRecorder()
+        self._loop = None
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def embed(self, embeddings, text: str):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pending state belongs to the loop that created it
+            self._loop, self._pending, self._timer = loop, [], None
+        future = loop.create_future()
+        self._pending.append((embeddings, text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list):
+        # Callers normally share one embeddings client; keep them apart if not
+        groups = {}
+        for item in batch:
+            groups.setdefault(id(item[0]), []).append(item)
+        await asyncio.gather(*(self._send_group(items) for items in groups.values()))
+
+    async def _send_group(self, items: list):
+        sent = time.perf_counter()
+        for _, _, _, queued in items:
+            self.metrics.record("queue_wait", sent - queued)
+        self.metrics.observe("batch_size", len(items))
+        try:
+            vectors = await self.stage.run(embed_query_batch, items[0][0], [text for _, text, _, _ in items])
+        except Exception as exc:
+            logger.warning("Query embedding batch of %d failed: %s", len(items), exc)
+            for _, _, future, _ in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.metrics.record("batch_call", time.perf_counter() - sent)
+        for (_, _, future, _), vector in zip(items, vectors):
+            # The caller may have gone away (e.g. client disconnect)
+            if not future.done():
+                future.set_result(vector)
+
+    def info(self) -> dict:
+        summary = self.metrics.summary()
+        return {
+            "enabled": EMBED_BATCH_ENABLED,
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            **summary,
+            "batch_size_histogram": self.metrics.histogram("batch_size", BATCH_SIZE_BUCKETS),
+            "queue_wait_histogram_ms": self.metrics.histogram("queue_wait", QUEUE_WAIT_BUCKETS_MS),
+        }
+
+
+# Shared by /chat/ and /chat/stream, exposed on /stats/embed-batcher
+query_batcher = QueryEmbeddingBatcher(chat_stages["embed"])
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import List
+from dotenv import load_dotenv
+from logger import logger
+from modules.metrics import cache_lookups
+
+load_dotenv()
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embedding_cache.db")
+# Least recently used entries are evicted beyond this many vectors (~3KB each at 768 dims)
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "100000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model: str, kind: str, text: str) -> str:
+    """Content address of one embedding: model, query/document kind and normalized text"""
+    return hashlib.sha256(f"{model}\0{kind}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Disk-backed embedding store with size-bounded LRU eviction.
+
+    Vectors are kept as float32 blobs in SQLite. Hits only bump a timestamp,
+    so lookups stay cheap even when the cache is shared across threads.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get_many(self, keys: List[str]) -> dict:
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ):
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            hits = sum(1 for key in keys if key in found)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(keys) - hits
+        cache_lookups.inc(hits, cache="embedding", result="hit")
+        cache_lookups.inc(len(keys) - hits, cache="embedding", result="miss")
+        return found
+
+    def put_many(self, items: dict):
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+
+    def _evict(self, count: int):
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (count,)
+        )
+        self._size -= count
+        self.stats["evictions"] += count
+
+    def info(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def embed_query_batch(embeddings, texts: List[str], **kwargs) -> List[List[float]]:
+    """Embed several queries with one provider call"""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts, **kwargs)
+    # The batch endpoint gives the same vectors as embed_query when told the task type
+    return embeddings.embed_documents(texts, **{"task_type": "RETRIEVAL_QUERY", **kwargs})
+
+
+class CachedEmbeddings:
+    """Wraps an embeddings client so only cache misses reach the provider"""
+
+    def __init__(self, embeddings, cache: EmbeddingCache, model: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def _embed(self, texts: List[str], kind: str, embed_misses) -> List[List[float]]:
+        keys = [cache_key(self.model, kind, text) for text in texts]
+        found = self.cache.get_many(keys)
+        # One provider call for all distinct misses
+        misses = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in misses:
+                misses[key] = text
+        if misses:
+            vectors = embed_misses(list(misses.values()))
+            # Round through float32 so a miss returns exactly what a later hit will
+            computed = {key: array("f", vector).tolist() for key, vector in zip(misses, vectors)}
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        kind = f"document:{kwargs.get('task_type') or ''}"
+        return self._embed(texts, kind, lambda misses: self.embeddings.embed_documents(misses, **kwargs))
+
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        kind = f"query:{kwargs.get('task_type') or ''}"
+        return self._embed([text], kind, lambda misses: [self.embeddings.embed_query(misses[0], **kwargs)])[0]
+
+    def embed_queries(self, texts: List[str], **kwargs) -> List[List[float]]:
+        """Query embeddings for many texts in one batch call, cached like embed_query"""
+        kind = f"query:{kwargs.get('task_type') or ''}"
+        return self._embed(texts, kind, lambda misses: embed_query_batch(self.embeddings, misses, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.embeddings, name)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache shared by ingestion and /chat/"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+            logger.info("Embedding cache opened at %s with %d entries", EMBED_CACHE_PATH, _cache.info()["entries"])
+    return _cache
@@ -0,0 +1,306 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+INGEST_JOB_DB = os.getenv("INGEST_JOB_DB", "./ingest_jobs.db")
+# Ingestion runs on its own small pool so bulk uploads can't take threads from /chat/
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "100"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised when too many ingestion jobs are already waiting"""
+
+
+class IngestionCancelled(Exception):
+    """Raised inside index_files when the caller asks to stop between batches"""
+
+
+class JobStore:
+    """SQLite-backed ingestion job state, so job status survives restarts"""
+
+    def __init__(self, path: str = INGEST_JOB_DB):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    files TEXT NOT NULL,
+                    chunks_upserted INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "collection" not in columns:
+                # Jobs created before collections existed went to the default one
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN collection TEXT NOT NULL DEFAULT 'default'")
+
+    def create(self, file_paths: list, file_hashes: dict = None, collection: str = "default", sources: dict = None) -> dict:
+        now = time.time()
+        file_hashes = file_hashes or {}
+        sources = sources or {}
+        files = {
+            path: {
+                "filename": Path(path).name, "sha256": file_hashes.get(path), "source": sources.get(path),
+                "status": QUEUED, "pages": 0, "chunks": 0, "upserted": 0,
+            }
+            for path in file_paths
+        }
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, files, collection, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(files), collection, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["files"] = list(json.loads(job["files"]).values())
+        return job
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def update_file(self, job_id: str, file_path: str, **fields):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT files FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            files = json.loads(row["files"])
+            files.setdefault(file_path, {"filename": Path(file_path).name}).update(fields)
+            self._conn.execute(
+                "UPDATE jobs SET files = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(files), time.time(), job_id),
+            )
+
+    def file_paths(self, job_id: str) -> list:
+        with self._lock:
+            row = self._conn.execute("SELECT files FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return list(json.loads(row["files"])) if row else []
+
+    def file_hashes(self, job_id: str) -> dict:
+        """Content hashes computed while the files were uploaded, by path"""
+        with self._lock:
+            row = self._conn.execute("SELECT files FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        files = json.loads(row["files"]) if row else {}
+        return {path: file["sha256"] for path, file in files.items() if file.get("sha256")}
+
+    def sources(self, job_id: str) -> dict:
+        """Stored objects holding the uploaded bytes, by path"""
+        with self._lock:
+            row = self._conn.execute("SELECT files FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        files = json.loads(row["files"]) if row else {}
+        return {path: file["source"] for path, file in files.items() if file.get("source")}
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class IngestionQueue:
+    """Runs ingestion jobs in the background with a fixed number of workers.
+
+    Jobs that touch the same file run one after the other in submission
+    order, so the last upload of a name is the one left in the index; a job
+    whose file is still queued or running in an earlier job waits aside
+    until that one finishes.
+    """
+
+    def __init__(self, store: JobStore, workers: int = INGEST_WORKERS, max_pending: int = INGEST_MAX_PENDING, index_fn=None, upload_store=None):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self._index_fn = index_fn
+        self._upload_store = upload_store
+        self._queue = None
+        self._tasks = []
+        self._cancelled = set()
+        # File path -> ids of the jobs that hold or wait for it, oldest first
+        self._file_jobs = {}
+        self._deferred = set()
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        # Jobs interrupted by a restart are picked up again, upserts are idempotent
+        for job_id in self.store.unfinished():
+            self.store.update(job_id, status=QUEUED)
+            self._enqueue(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Ingestion queue started with %d workers", self.workers)
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._deferred)
+
+    async def stop(self):
+        # Running jobs stop at their next checkpoint and stay queued, the next start resumes them
+        self._stopping = True
+        # Their threads still write progress, so the store is only closed once they have returned
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.store.close()
+
+    def submit(self, file_paths: list, file_hashes: dict = None, collection: str = "default", sources: dict = None) -> dict:
+        if self.pending >= self.max_pending:
+            raise QueueFull(f"{self.pending} ingestion jobs are already pending")
+        job = self.store.create(file_paths, file_hashes, collection, sources)
+        self._enqueue(job["id"])
+        logger.info("Queued ingestion job %s for %d files", job["id"], len(file_paths))
+        return job
+
+    def cancel(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATES:
+            return job
+        self._cancelled.add(job_id)
+        if job["status"] == QUEUED:
+            self.store.update(job_id, status=CANCELLED)
+            if job_id in self._deferred:
+                # Never reaches a worker, let the jobs behind it go
+                self._deferred.discard(job_id)
+                self._cancelled.discard(job_id)
+                self._finish(job_id)
+        return self.store.get(job_id)
+
+    def _enqueue(self, job_id: str):
+        for path in self.store.file_paths(job_id):
+            self._file_jobs.setdefault(path, deque()).append(job_id)
+        self._queue.put_nowait(job_id)
+
+    def _is_next(self, job_id: str) -> bool:
+        """No earlier job for any of this job's files is still queued or running"""
+        return all(self._file_jobs[path][0] == job_id for path in self.store.file_paths(job_id))
+
+    def _finish(self, job_id: str):
+        """Release the job's files and queue the jobs that were waiting for them"""
+        if self.store.get(job_id)["status"] in FINISHED_STATES:
+            self._release_sources(job_id)
+        for path in self.store.file_paths(job_id):
+            jobs = self._file_jobs.get(path)
+            if jobs is None:
+                continue
+            jobs.remove(job_id)
+            if not jobs:
+                del self._file_jobs[path]
+            elif jobs[0] in self._deferred and self._is_next(jobs[0]):
+                self._deferred.discard(jobs[0])
+                self._queue.put_nowait(jobs[0])
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if self._stopping:
+                    return
+                if job_id not in self._cancelled and not self._is_next(job_id):
+                    self._deferred.add(job_id)
+                    continue
+                if job_id not in self._cancelled:
+                    self.store.update(job_id, status=RUNNING)
+                    await loop.run_in_executor(self._executor, self._run_job, job_id)
+                else:
+                    self.store.update(job_id, status=CANCELLED)
+            except Exception as e:
+                logger.exception("Ingestion job %s crashed", job_id)
+                self.store.update(job_id, status=FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+            # Not on CancelledError: the job's thread may still be checking it
+            self._cancelled.discard(job_id)
+            self._finish(job_id)
+
+    def _release_sources(self, job_id: str):
+        """Let the upload store drop objects this job held and no name uses any more"""
+        sources = self.store.sources(job_id)
+        if not sources:
+            return
+        store = self._upload_store
+        if store is None:
+            from modules.upload_store import get_upload_store
+            store = get_upload_store()
+        for source in sources.values():
+            store.release(source)
+
+    def _run_job(self, job_id: str):
+        from modules.namespaces import collection_namespace
+
+        index_fn = self._index_fn
+        if index_fn is None:
+            from modules.load_vectorstore import index_files as index_fn
+        upserted = {}
+
+        def progress(file_path, **fields):
+            self.store.update_file(job_id, file_path, **fields)
+            if "upserted" in fields:
+                upserted[file_path] = fields["upserted"]
+                self.store.update(job_id, chunks_upserted=sum(upserted.values()))
+
+        try:
+            total = index_fn(
+                self.store.file_paths(job_id),
+                file_hashes=self.store.file_hashes(job_id),
+                sources=self.store.sources(job_id),
+                namespace=collection_namespace(self.store.get(job_id)["collection"]),
+                progress=progress,
+                should_cancel=lambda: self._stopping or job_id in self._cancelled,
+            )
+        except IngestionCancelled:
+            if job_id not in self._cancelled:
+                logger.info("Ingestion job %s interrupted by shutdown, it resumes on the next start", job_id)
+                self.store.update(job_id, status=QUEUED)
+                return
+            logger.info("Ingestion job %s cancelled", job_id)
+            self.store.update(job_id, status=CANCELLED)
+            return
+        # Unchanged and duplicate files upsert nothing but still count as success
+        files = self.store.get(job_id)["files"]
+        status = FAILED if files and all(f.get("status") == FAILED for f in files) else COMPLETED
+        self.store.update(job_id, status=status, chunks_upserted=total)
+        logger.info("Ingestion job %s %s with %d chunks", job_id, status, total)
@@ -0,0 +1,125 @@
+import contextvars
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, List
+
+# Items allowed to wait between two ingestion stages before the upstream one blocks
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+# Chunks sent to the embedding provider per call
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "100"))
+
+_END = object()
+
+
+@dataclass
+class ChunkBatch:
+    """Consecutive chunks of one file on their way to the embedder"""
+
+    file_path: str
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[dict]  # Per chunk: page, page_label and start_index
+    document: dict = field(default_factory=dict)  # Shared by every chunk of the file
+    pages: int = 0
+    chunks: int = 0
+    vectors: List[dict] = field(default_factory=list)
+
+
+@dataclass
+class FileDone:
+    """Marks the end of a file in the stream"""
+
+    file_path: str
+    pages: int = 0
+    chars: int = 0
+    chunks: int = 0
+    error: str = None
+    # Incremental indexing: every chunk id of this version and the ids indexed before
+    chunk_hashes: dict = field(default_factory=dict)
+    previous_ids: set = field(default_factory=set)
+    unchanged: int = 0
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def pipeline(source: Iterable, stages: List[Callable[[Any], Iterable]], queue_size: int = INGEST_QUEUE_SIZE) -> Iterator:
+    """Run `source` and each stage on its own thread, connected by bounded queues.
+
+    Every stage maps one input item to an iterable of output items. The
+    caller iterates the output of the last stage. Because the queues are
+    bounded a slow stage applies backpressure upstream, so memory stays
+    proportional to `queue_size`, not to the size of the input. An exception
+    in any stage is re-raised in the caller; closing the iterator early (or
+    raising while consuming it) stops all stages.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def put(q, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            put(queues[0], _Failure(e))
+            return
+        put(queues[0], _END)
+
+    def work(stage, inbox, outbox):
+        while True:
+            item = get(inbox)
+            if item is _END or isinstance(item, _Failure):
+                put(outbox, item)
+                return
+            try:
+                for output in stage(item):
+                    if not put(outbox, output):
+                        return
+            except BaseException as e:
+                put(outbox, _Failure(e))
+                return
+
+    # Stages run in the caller's context, e.g. its rate limit priority
+    context = contextvars.copy_context()
+    threads = [threading.Thread(target=context.copy().run, args=(feed,), name="ingest-source", daemon=True)]
+    for i, stage in enumerate(stages):
+        threads.append(threading.Thread(
+            target=context.copy().run, args=(work, stage, queues[i], queues[i + 1]), name=f"ingest-stage-{i}", daemon=True
+        ))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,76 @@
+import bisect
+import threading
+from collections import defaultdict, deque
+
+
+class LatencyRecorder:
+    """Rolling window of samples per metric, summarized as percentiles.
+
+    Durations go through `record` (seconds, reported in ms); plain quantities
+    such as prompt token counts go through `observe`.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+        self._units = {}
+
+    def record(self, name: str, seconds: float):
+        self._add(name, seconds, "ms")
+
+    def observe(self, name: str, value: float):
+        self._add(name, value, "")
+
+    def _add(self, name: str, value: float, unit: str):
+        with self._lock:
+            self._samples[name].append(value)
+            self._counts[name] += 1
+            self._units[name] = unit
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def histogram(self, name: str, bounds) -> dict:
+        """Samples in the window per bucket, keyed by upper bound in reporting units"""
+        with self._lock:
+            values = sorted(self._samples.get(name, ()))
+            scale = 1000 if self._units.get(name) == "ms" else 1
+        buckets, previous = {}, 0
+        for bound in bounds:
+            count = bisect.bisect_right(values, bound / scale)
+            buckets[f"<={bound:g}"] = count - previous
+            previous = count
+        buckets[f">{bounds[-1]:g}"] = len(values) - previous
+        return buckets
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            counts = dict(self._counts)
+            units = dict(self._units)
+        summary = {}
+        for name, count in counts.items():
+            values = samples.get(name)
+            if not values:
+                summary[name] = {"count": count}
+                continue
+            unit = units[name]
+            scale = 1000 if unit == "ms" else 1
+            suffix = f"_{unit}" if unit else ""
+            summary[name] = {
+                "count": count,
+                f"mean{suffix}": round(sum(values) / len(values) * scale, 2),
+                **{
+                    f"p{q}{suffix}": round(values[min(len(values) - 1, int(q / 100 * len(values)))] * scale, 2)
+                    for q in (50, 95, 99)
+                },
+                f"max{suffix}": round(values[-1] * scale, 2),
+            }
+        return summary
+
+
+# Shared by the /chat/ routes, exposed on /stats/chat
+chat_latency = LatencyRecorder()
@@ -1,178 +1,349 @@
 import os
-import time
+import threading
+from concurrent.futures import wait
 from pathlib import Path
 from dotenv import load_dotenv
-from tqdm.auto import tqdm
-from pinecone import Pinecone, ServerlessSpec
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from modules.answer_cache import get_answer_cache
+from modules.bm25_index import BM25_ENABLED, get_bm25_index
+from modules.chunk_store import CHUNK_STORE_ENABLED, get_chunk_store, index_metadata
+from modules.ingest_jobs import IngestionCancelled
+from modules.ingest_pipeline import ChunkBatch, FileDone, INGEST_EMBED_BATCH, pipeline
+from modules.manifest import chunk_id, get_manifest, hash_chunk, hash_file
+from modules.metrics import ingest_chunks, ingest_pages, record_stage, span
+from modules.pdf_extract import extract_files
+from modules.rate_limit import bulk
+from modules.resources import registry
+from modules.upload_store import get_upload_store
+from modules.upsert_engine import UpsertEngine
+from modules.vectorstore import delete_vectors
+from logger import logger
 
 load_dotenv()
 
 GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY")
-PINECONE_API_KEY=os.getenv("PINECONE_API_KEY")
-PINECONE_ENV="us-east-1"
-PINECONE_INDEX_NAME="ragindex"
 
-os.environ["GOOGLE_API_KEY"]=GOOGLE_API_KEY
+if GOOGLE_API_KEY:
+    os.environ["GOOGLE_API_KEY"]=GOOGLE_API_KEY
 
-UPLOAD_DIR="./uploaded_docs"
-os.makedirs(UPLOAD_DIR,exist_ok=True)
-
-
-# initialize pinecone instance
-pc=Pinecone(api_key=PINECONE_API_KEY)
-spec=ServerlessSpec(cloud="aws",region=PINECONE_ENV)
-existing_indexes=[i["name"] for i in pc.list_indexes()]
-
-
-if PINECONE_INDEX_NAME not in existing_indexes:
-    pc.create_index(
-        name=PINECONE_INDEX_NAME,
-        dimension=768,
-        metric="dotproduct",
-        spec=spec
-    )
-    while not pc.describe_index(PINECONE_INDEX_NAME).status["ready"]:
-        time.sleep(1)
-
-
-index=pc.Index(PINECONE_INDEX_NAME)
+# The vector index (Pinecone or local, see modules/vectorstore.py) is created
+# lazily by the shared resource registry on first use.
 
 # load,split,embed and upsert pdf docs content
 
 
-def load_vectorstore(uploaded_files):
+def load_vectorstore(uploaded_files, namespace=""):
     """Improved version with comprehensive error handling and debugging"""
-    print("🚀 Starting vectorstore loading...")
-    
-    try:
-        embed_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        print("✅ Embedding model initialized")
-    except Exception as e:
-        print(f"❌ Failed to initialize embedding model: {e}")
-        return False
+    logger.info("🚀 Starting vectorstore loading...")
     
     file_paths = []
+    file_hashes = {}
+    uploads = []
+    store = get_upload_store()
     
     # Save uploaded files
     for file in uploaded_files:
         try:
-            save_path = Path(UPLOAD_DIR) / file.filename
-            with open(save_path, "wb") as f:
-                f.write(file.file.read())
-            file_paths.append(str(save_path))
-            print(f"✅ Saved file: {save_path}")
+            upload = store.save(file.filename, file.file, namespace, hold=True)
+            uploads.append(upload)
+            file_paths.append(upload.path)
+            file_hashes[upload.path] = upload.sha256
+            logger.info("✅ Saved file: %s", upload.path)
         except Exception as e:
-            print(f"❌ Failed to save file {file.filename}: {e}")
+            logger.error("❌ Failed to save file %s: %s", file.filename, e)
             continue
     
     if not file_paths:
-        print("❌ No files were successfully saved")
+        logger.error("❌ No files were successfully saved")
         return False
     
-    total_chunks_processed = 0
-    
-    for file_path in file_paths:
-        print(f"\n📄 Processing: {file_path}")
-        
+    try:
+        sources = {upload.path: upload.object for upload in uploads}
+        return index_files(file_paths, file_hashes=file_hashes, namespace=namespace, sources=sources) > 0
+    finally:
+        for upload in uploads:
+            store.release(upload.object)
+
+
+# Ingestion waits behind /chat/ for provider rate limits
+@bulk()
+def index_files(file_paths, file_hashes=None, progress=None, should_cancel=None, embed_model=None, vector_index=None, manifest=None, keyword_index=None, namespace="", chunk_store=None, sources=None):
+    """Parse, split, embed and upsert PDFs that are already on disk.
+
+    Work is streamed: page ranges are parsed on a process pool, grouped into
+    embedding batches, embedded on one thread and upserted on the calling
+    thread, all at the same time with bounded queues in between. Memory use
+    therefore does not grow with the size of a PDF.
+
+    Indexing is incremental against the document manifest: files whose
+    content hash is unchanged are skipped, only chunks whose content-derived
+    id is new get embedded and upserted, and ids that disappeared from a file
+    are deleted from the index. New files with the same content as one that
+    is already indexed (or earlier in `file_paths`) are skipped as duplicates.
+    `file_hashes` maps paths to the sha256 the upload store computed while
+    saving them; files without one are hashed here. `sources` maps paths to
+    the upload store objects holding those bytes, which are read instead of
+    the path: the name may already point at a newer upload. Manifest keys,
+    vector ids and metadata keep the path.
+
+    `progress(file_path, **fields)` is called as each file moves through the
+    stages with its page/chunk/upsert counters. `should_cancel()` is polled
+    between upsert batches; when it returns True the run stops with
+    IngestionCancelled. `embed_model` and `vector_index` default to the shared
+    (cached) embeddings client and the configured vector index. Returns the number of
+    chunks upserted.
+
+    The same chunk ids and texts are added to the BM25 keyword index
+    (`keyword_index`, by default the shared one unless BM25_ENABLED is off)
+    so /chat/ can fuse keyword and vector matches.
+
+    Chunk texts and metadata are written to the chunk store (`chunk_store`,
+    by default the shared one unless CHUNK_STORE_ENABLED is off) and vectors
+    only keep the metadata queries filter on.
+
+    Everything (vectors, keyword index, manifest) is written to `namespace`,
+    the collection the files were uploaded to.
+    """
+    def report(file_path, **fields):
+        if progress is not None:
+            progress(file_path, **fields)
+
+    def check_cancelled():
+        if should_cancel is not None and should_cancel():
+            raise IngestionCancelled()
+
+    if vector_index is None:
         try:
-            # Load PDF
-            loader = PyPDFLoader(file_path)
-            documents = loader.load()
-            print(f"✅ Loaded PDF: {len(documents)} pages")
-            
-            if not documents:
-                print("❌ No documents found in PDF")
-                continue
-            
-            # Check if PDF has content
-            total_chars = sum(len(doc.page_content) for doc in documents)
-            print(f"📊 Total characters: {total_chars}")
-            
-            if total_chars == 0:
-                print("❌ PDF appears to be empty")
+            vector_index = registry.get("index")
+        except Exception as e:
+            logger.error("❌ Failed to connect to the vector index: %s", e)
+            for file_path in file_paths:
+                report(file_path, status="failed", error=str(e))
+            return 0
+    if manifest is None:
+        manifest = get_manifest()
+    if keyword_index is None and BM25_ENABLED:
+        keyword_index = get_bm25_index(namespace)
+    if chunk_store is None and CHUNK_STORE_ENABLED:
+        chunk_store = get_chunk_store()
+
+    # Files identical to what is already indexed are skipped before parsing
+    file_hashes = dict(file_hashes or {})
+    sources = sources or {}
+    changed_paths = []
+    new_hashes = {}
+    for file_path in file_paths:
+        if not file_hashes.get(file_path):
+            try:
+                file_hashes[file_path] = hash_file(sources.get(file_path, file_path))
+            except OSError:
+                file_hashes[file_path] = None  # extraction reports the error
+        content_hash = file_hashes[file_path]
+        indexed_hash = manifest.content_hash(file_path, namespace)
+        if content_hash and content_hash == indexed_hash:
+            logger.info("⏭️ Skipping unchanged file: %s", file_path)
+            report(file_path, status="unchanged", chunks=manifest.chunk_count(file_path, namespace))
+            continue
+        if content_hash and indexed_hash is None:
+            # A new name for content that is already indexed would only add duplicate chunks
+            same = new_hashes.get(content_hash) or next(iter(manifest.files_with_hash(content_hash, namespace)), None)
+            if same is not None:
+                logger.info("⏭️ Skipping duplicate file: %s (same content as %s)", file_path, same)
+                report(file_path, status="duplicate", duplicate_of=same)
                 continue
-            
-            # Split documents
-            splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-            chunks = splitter.split_documents(documents)
-            print(f"✅ Created {len(chunks)} chunks")
-            
-            if not chunks:
-                print("❌ No chunks created")
+            new_hashes[content_hash] = Path(file_path).name
+        changed_paths.append(file_path)
+
+    if embed_model is None:
+        try:
+            embed_model = registry.get("embeddings")
+            logger.info("✅ Embedding model initialized")
+        except Exception as e:
+            logger.error("❌ Failed to initialize embedding model: %s", e)
+            for file_path in file_paths:
+                report(file_path, status="failed", error=str(e))
+            return 0
+
+    def chunk_batches(extracted_ranges):
+        """Group the ordered page ranges into per-file embedding batches"""
+        done = None
+        batch = None
+        for extracted_range in extracted_ranges:
+            if done is None or done.file_path != extracted_range.file_path:
+                if batch is not None:
+                    yield batch
+                if done is not None:
+                    yield done
+                done, batch = FileDone(extracted_range.file_path), None
+                done.previous_ids = manifest.chunk_ids(done.file_path, namespace)
+                occurrences = {}
+            if done.error:
                 continue
-            
-            # Extract data
-            texts = [chunk.page_content for chunk in chunks]
-            metadatas = [chunk.metadata for chunk in chunks]
-            ids = [f"{Path(file_path).stem}-{i}" for i in range(len(chunks))]
-            
-            # Debug: Show sample chunk
-            print(f"📝 Sample chunk: {texts[0][:100]}...")
-            
-            # Generate embeddings
-            print(f"🔍 Embedding {len(texts)} chunks...")
-            try:
-                embeddings = embed_model.embed_documents(texts)
-                print(f"✅ Generated {len(embeddings)} embeddings")
-                print(f"📏 Embedding dimension: {len(embeddings[0]) if embeddings else 'N/A'}")
-            except Exception as e:
-                print(f"❌ Failed to generate embeddings: {e}")
+            if extracted_range.error:
+                done.error = extracted_range.error
                 continue
-            
-            # Prepare vectors for Pinecone
-            print("📤 Preparing vectors for Pinecone...")
-            vectors = []
-            for i in range(len(embeddings)):
-                metadata = metadatas[i].copy()
-                metadata['text'] = texts[i]  # Store the actual text
-                metadata['filename'] = Path(file_path).name  # Add filename for reference
-                
-                vectors.append({
-                    'id': ids[i],
-                    'values': embeddings[i],
-                    'metadata': metadata
-                })
-            
-            print(f"✅ Prepared {len(vectors)} vectors")
-            
-            # Upsert to Pinecone in batches
-            batch_size = 100
-            successful_upserts = 0
-            
-            print("📤 Uploading to Pinecone...")
-            with tqdm(total=len(vectors), desc="Upserting to Pinecone") as progress:
-                for i in range(0, len(vectors), batch_size):
-                    batch = vectors[i:i + batch_size]
-                    try:
-                        upsert_response = index.upsert(vectors=batch)
-                        successful_upserts += len(batch)
-                        progress.update(len(batch))
-                        print(f"✅ Batch upserted: {len(batch)} vectors")
-                    except Exception as e:
-                        print(f"❌ Failed to upsert batch: {e}")
-                        progress.update(len(batch))
-            
-            total_chunks_processed += successful_upserts
-            print(f"✅ Successfully processed {successful_upserts} chunks from {file_path}")
-            
+            done.pages += extracted_range.pages
+            done.chars += extracted_range.chars
+            record_stage("parse", extracted_range.parse_seconds)
+            record_stage("split", extracted_range.split_seconds)
+            ingest_pages.inc(extracted_range.pages)
+            ingest_chunks.inc(len(extracted_range.chunks), stage="split")
+            for chunk in extracted_range.chunks:
+                done.chunks += 1
+                metadata = chunk.metadata
+                chunk_hash = hash_chunk(chunk.text, metadata)
+                occurrence = occurrences.get(chunk_hash, 0)
+                occurrences[chunk_hash] = occurrence + 1
+                vector_id = chunk_id(done.file_path, chunk_hash, occurrence)
+                done.chunk_hashes[vector_id] = chunk_hash
+                if vector_id in done.previous_ids:
+                    # Already indexed with identical content
+                    done.unchanged += 1
+                    continue
+                if batch is None:
+                    batch = ChunkBatch(done.file_path, [], [], [], document=extracted_range.chunks.document)
+                batch.ids.append(vector_id)
+                batch.texts.append(chunk.text)
+                batch.metadatas.append(metadata)
+                batch.pages, batch.chunks = done.pages, done.chunks
+                if len(batch.ids) >= INGEST_EMBED_BATCH:
+                    yield batch
+                    batch = None
+        if batch is not None:
+            yield batch
+        if done is not None:
+            yield done
+
+    embed_failures = {}
+
+    def embed(item):
+        """Embedding stage: turn a chunk batch into Pinecone vectors"""
+        if isinstance(item, FileDone):
+            item.error = item.error or embed_failures.pop(item.file_path, None)
+            yield item
+            return
+        if item.file_path in embed_failures:
+            return
+        try:
+            with span("embed_documents"):
+                embeddings = embed_model.embed_documents(item.texts)
         except Exception as e:
-            print(f"❌ Error processing {file_path}: {e}")
-            continue
+            logger.error("❌ Failed to generate embeddings: %s", e)
+            embed_failures[item.file_path] = f"Failed to generate embeddings: {e}"
+            return
+        ingest_chunks.inc(len(item.texts), stage="embedded")
+        filename = Path(item.file_path).name  # Add filename for reference
+        item.vectors = []
+        for vector_id, values, metadata, text in zip(item.ids, embeddings, item.metadatas, item.texts):
+            metadata = {**item.document, **metadata, 'text': text, 'filename': filename}
+            if chunk_store is not None:
+                # Text and the rest of the metadata go to the chunk store
+                metadata = index_metadata(metadata)
+            item.vectors.append({'id': vector_id, 'values': values, 'metadata': metadata})
+        yield item
+
+    total_chunks_processed = 0
+    upserted = {}
+    failed_upserts = {}
+    pending_upserts = {}
+    counts_lock = threading.Lock()
+    current_file = None
+
+    def upsert_done(item):
+        def done(ok, failed):
+            with counts_lock:
+                upserted[item.file_path] += ok
+                failed_upserts[item.file_path] += failed
+                count = upserted[item.file_path]
+            report(item.file_path, status="upserting", pages=item.pages, chunks=item.chunks, upserted=count)
+        return done
+
+    # Parsing and splitting run on a process pool, page ranges come back in order
+    stream = pipeline(chunk_batches(extract_files(changed_paths, sources=sources)), [embed])
+    try:
+        with UpsertEngine(vector_index) as engine:
+            for item in stream:
+                check_cancelled()
+                current_file = item.file_path
+
+                if isinstance(item, FileDone):
+                    # Let the file's in-flight upserts land before reporting it
+                    wait(pending_upserts.pop(item.file_path, []))
+                    successful_upserts = upserted.get(item.file_path, 0)
+                    dead_lettered = failed_upserts.get(item.file_path, 0)
+                    error = item.error
+                    if not error and not item.pages:
+                        error = "No documents found in PDF"
+                    elif not error and item.chars == 0:
+                        error = "PDF appears to be empty"
+                    elif not error and not item.chunks:
+                        error = "No chunks created"
+                    elif not error and not successful_upserts and dead_lettered:
+                        error = f"All {dead_lettered} vectors failed to upsert, see {engine.dead_letter_path}"
+                    if error:
+                        logger.error("❌ Error processing %s: %s", item.file_path, error)
+                        report(item.file_path, status="failed", error=error, pages=item.pages, chunks=item.chunks)
+                        continue
+                    total_chunks_processed += successful_upserts
+                    stale = item.previous_ids.difference(item.chunk_hashes)
+                    if dead_lettered:
+                        # Keep the old manifest so the next upload retries the missing chunks
+                        logger.error("❌ %d vectors failed to upsert, see %s", dead_lettered, engine.dead_letter_path)
+                    elif delete_vectors(vector_index, stale, namespace=namespace):
+                        manifest.replace(item.file_path, file_hashes.get(item.file_path), item.chunk_hashes, namespace)
+                        if keyword_index is not None:
+                            keyword_index.delete(stale)
+                        if chunk_store is not None:
+                            chunk_store.delete(stale, namespace)
+                    if keyword_index is not None:
+                        keyword_index.flush()
+                    if successful_upserts or stale:
+                        # Answers built from the previous version of this file are stale now
+                        get_answer_cache().invalidate_files([Path(item.file_path).name], namespace)
+                    report(
+                        item.file_path, status="done", pages=item.pages, chunks=item.chunks,
+                        unchanged=item.unchanged, deleted=len(stale), failed=dead_lettered,
+                    )
+                    logger.info(
+                        "✅ Successfully processed %d chunks from %s (%d pages, %d unchanged, %d removed)",
+                        successful_upserts, item.file_path, item.pages, item.unchanged, len(stale),
+                    )
+                    continue
+
+                if item.file_path not in upserted:
+                    logger.info("📄 Processing: %s", item.file_path)
+                    upserted[item.file_path] = 0
+                    failed_upserts[item.file_path] = 0
+
+                if chunk_store is not None:
+                    # Stored before the upsert so every vector /chat/ can match has its text
+                    with span("chunk_store"):
+                        chunk_store.put(Path(item.file_path).name, item.document, item.ids, item.texts, item.metadatas, namespace)
+                # Batches are sized by payload bytes and upserted concurrently with retries
+                pending_upserts.setdefault(item.file_path, []).extend(
+                    engine.submit(item.vectors, on_done=upsert_done(item), namespace=namespace)
+                )
+                if keyword_index is not None:
+                    with span("keyword_index"):
+                        keyword_index.add(item.ids, item.texts)
+                item.texts = item.metadatas = None
+    except IngestionCancelled:
+        if current_file is not None:
+            report(current_file, status="cancelled")
+        raise
+    finally:
+        stream.close()
     
-    print(f"\n🎉 VECTORSTORE LOADING COMPLETE")
-    print(f"📊 Total chunks processed: {total_chunks_processed}")
+    logger.info("🎉 VECTORSTORE LOADING COMPLETE")
+    logger.info("📊 Total chunks processed: %d", total_chunks_processed)
     
     # Verify the upload
     try:
-        stats = index.describe_index_stats()
-        print(f"📈 Index now contains {stats.get('total_vector_count', 0)} total vectors")
+        stats = vector_index.describe_index_stats()
+        logger.info("📈 Index now contains %d total vectors", stats.get('total_vector_count', 0))
     except Exception as e:
-        print(f"❌ Could not verify index stats: {e}")
+        logger.warning("❌ Could not verify index stats: %s", e)
     
-    return total_chunks_processed > 0
+    return total_chunks_processed
 
 def test_rag_chain(query):
     """Test function to verify RAG chain is working"""
@@ -180,14 +351,14 @@ def test_rag_chain(query):
     print("=" * 50)
     
     try:
-        embed_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+        embed_model = registry.get("embeddings")
         
         # 1. Generate query embedding
         query_embedding = embed_model.embed_query(query)
         print(f"✅ Query embedding generated")
         
-        # 2. Search Pinecone
-        results = index.query(
+        # 2. Search the vector index
+        results = registry.get("index").query(
             vector=query_embedding,
             top_k=5,
             include_metadata=True
@@ -199,12 +370,14 @@ def test_rag_chain(query):
             print("❌ No matches found - this is why your RAG is failing!")
             return None
         
-        # 3. Extract context
+        # 3. Extract context, texts are in the chunk store unless the vectors carry them
+        stored = get_chunk_store().get_many([match['id'] for match in results['matches']]) if CHUNK_STORE_ENABLED else {}
         contexts = []
         for match in results['matches']:
-            if 'text' in match['metadata']:
-                contexts.append(match['metadata']['text'])
-                print(f"✅ Retrieved text (score: {match['score']:.4f}): {match['metadata']['text'][:100]}...")
+            metadata = stored.get(match['id'], match['metadata'])
+            if 'text' in metadata:
+                contexts.append(metadata['text'])
+                print(f"✅ Retrieved text (score: {match['score']:.4f}): {metadata['text'][:100]}...")
         
         if not contexts:
             print("❌ No text content found in matches!")
@@ -0,0 +1,509 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from logger import logger
+from modules.vectorstore import VECTOR_DIMENSION, VectorIndex
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "./local_index")
+# "exact" scans every vector, "ivf" probes the closest clusters once the index is large
+LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "exact")
+LOCAL_INDEX_IVF_LISTS = int(os.getenv("LOCAL_INDEX_IVF_LISTS", "256"))
+LOCAL_INDEX_IVF_PROBES = int(os.getenv("LOCAL_INDEX_IVF_PROBES", "16"))
+LOCAL_INDEX_IVF_MIN_ROWS = int(os.getenv("LOCAL_INDEX_IVF_MIN_ROWS", "20000"))
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def filter_to_sql(flt: dict):
+    """Translate the Pinecone metadata filter subset we use into a SQL condition"""
+    clauses, params = [], []
+    for key, condition in flt.items():
+        if key in ("$and", "$or"):
+            parts = [filter_to_sql(sub) for sub in condition]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            for _, sub_params in parts:
+                params.extend(sub_params)
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        field = f"json_extract(metadata, '$.\"{key}\"')"
+        for op, value in condition.items():
+            if op in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(value))
+                clauses.append(f"{field} {'NOT IN' if op == '$nin' else 'IN'} ({placeholders})")
+                params.extend(value)
+            elif op in _OPERATORS:
+                clauses.append(f"{field} {_OPERATORS[op]} ?")
+                params.append(value)
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class _IVF:
+    """Inverted-file coarse quantizer: spherical k-means centroids plus a list id per row"""
+
+    def __init__(self, lists: int, probes: int):
+        self.lists = lists
+        self.probes = probes
+        self.centroids = None
+        self.assignments = None
+        self.trained_rows = 0
+
+    def fit(self, sample: np.ndarray, iterations: int = 8) -> np.ndarray:
+        """Centroids for `sample`; touches no state so it can run without the partition lock"""
+        rng = np.random.default_rng(0)
+        centroids = sample[rng.choice(len(sample), size=min(self.lists, len(sample)), replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[nearest == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+        return centroids
+
+    @staticmethod
+    def nearest(centroids: np.ndarray, matrix: np.ndarray, rows: np.ndarray, assignments: np.ndarray):
+        for i in range(0, len(rows), 65536):
+            part = rows[i:i + 65536]
+            assignments[part] = np.argmax(matrix[part] @ centroids.T, axis=1)
+
+    def install(self, centroids: np.ndarray, assignments: np.ndarray, trained_rows: int):
+        self.centroids, self.assignments, self.trained_rows = centroids, assignments, trained_rows
+
+    def assign(self, matrix: np.ndarray, rows: np.ndarray):
+        if self.centroids is None or len(rows) == 0:
+            return
+        if len(self.assignments) < matrix.shape[0]:
+            grown = np.full(matrix.shape[0], -1, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+        self.nearest(self.centroids, matrix, rows, self.assignments)
+
+    def candidates(self, query: np.ndarray, count: int) -> np.ndarray:
+        probes = min(self.probes, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        return np.flatnonzero(np.isin(self.assignments[:count], probed))
+
+
+class _Partition:
+    """The vectors of one namespace.
+
+    Embeddings live in a float32 memory-mapped matrix on disk, metadata in a
+    SQLite side table keyed by row. Queries are dot-product top-k over the
+    matrix using argpartition; with mode="ivf" large partitions only scan the
+    rows of the closest clusters. Rows of deleted vectors are reused by later
+    upserts, and the matrix is compacted once most of it is free. IVF
+    centroids are trained on a background thread as the partition grows;
+    until the first training finishes queries scan every row.
+    """
+
+    def __init__(
+        self,
+        directory: str = LOCAL_INDEX_DIR,
+        dimension: int = VECTOR_DIMENSION,
+        mode: str = LOCAL_INDEX_MODE,
+        ivf_lists: int = LOCAL_INDEX_IVF_LISTS,
+        ivf_probes: int = LOCAL_INDEX_IVF_PROBES,
+        ivf_min_rows: int = LOCAL_INDEX_IVF_MIN_ROWS,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.mode = mode
+        self.ivf_min_rows = ivf_min_rows
+        self._ivf = _IVF(ivf_lists, ivf_probes) if mode == "ivf" else None
+        self._lock = threading.RLock()
+        self._train_lock = threading.Lock()
+        self._training = False
+        self._reassign = None  # rows written while centroids are being trained
+        self._matrix_path = self.directory / "vectors.f32"
+        self._db = sqlite3.connect(self.directory / "metadata.db", check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT NOT NULL)"
+            )
+        self._ids = dict(self._db.execute("SELECT id, row FROM rows"))
+        self._count = max(self._ids.values(), default=-1) + 1
+        # Row -> vector id, None for free rows; queries resolve matches without inverting _ids
+        self._row_ids = [None] * self._count
+        for vector_id, row in self._ids.items():
+            self._row_ids[row] = vector_id
+        self._free = [row for row in range(self._count - 1, -1, -1) if self._row_ids[row] is None]
+        self._capacity = 0
+        self._matrix = None
+        self._ensure_capacity(max(self._count, 1024))
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._alive[list(self._ids.values())] = True
+        logger.info("Local vector partition at %s loaded with %d vectors", self.directory, len(self._ids))
+        self._maybe_train()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _map(self, capacity: int):
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        if hasattr(self, "_alive"):
+            alive = np.zeros(capacity, dtype=bool)
+            keep = min(capacity, len(self._alive))
+            alive[:keep] = self._alive[:keep]
+            self._alive = alive
+        self._capacity = capacity
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        self._map(max(needed, 2 * self._capacity, 1024))
+
+    def upsert(self, vectors: List[dict], **kwargs):
+        with self._lock:
+            rows, values, records = [], [], []
+            for vector in vectors:
+                row = self._ids.get(vector["id"])
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row = self._count
+                        self._count += 1
+                        self._row_ids.append(None)
+                    self._ids[vector["id"]] = row
+                    self._row_ids[row] = vector["id"]
+                rows.append(row)
+                values.append(vector["values"])
+                records.append((row, vector["id"], json.dumps(vector.get("metadata", {}))))
+            self._ensure_capacity(self._count)
+            rows = np.asarray(rows, dtype=np.int64)
+            self._matrix[rows] = np.asarray(values, dtype=np.float32)
+            self._alive[rows] = True
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO rows (row, id, metadata) VALUES (?, ?, ?)", records)
+            if self._ivf is not None:
+                self._ivf.assign(self._matrix, rows)
+                if self._reassign is not None:
+                    self._reassign.update(rows.tolist())
+        self._maybe_train()
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            rows = [self._ids.pop(vector_id) for vector_id in ids or [] if vector_id in self._ids]
+            self._alive[rows] = False
+            for row in rows:
+                self._row_ids[row] = None
+            self._free.extend(rows)
+            with self._db:
+                self._db.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in rows])
+            if self._compaction_due():
+                self.compact()
+        return {}
+
+    def _compaction_due(self) -> bool:
+        # Training reads the matrix without the lock, it compacts once it is done
+        return len(self._free) > max(1024, self._count // 2) and not self._training
+
+    def compact(self):
+        """Move the last live rows into free ones and shrink the matrix to the live vectors"""
+        with self._lock:
+            if self._training:
+                return
+            live = len(self._ids)
+            holes = sorted(row for row in self._free if row < live)
+            movers = [row for row in range(live, self._count) if self._row_ids[row] is not None]
+            if movers:
+                self._matrix[holes] = self._matrix[movers]
+                self._alive[holes] = True
+                with self._db:
+                    self._db.executemany("UPDATE rows SET row = ? WHERE row = ?", list(zip(holes, movers)))
+                for hole, mover in zip(holes, movers):
+                    vector_id = self._row_ids[mover]
+                    self._ids[vector_id] = hole
+                    self._row_ids[hole] = vector_id
+                if self._ivf is not None and self._ivf.assignments is not None:
+                    self._ivf.assignments[holes] = self._ivf.assignments[movers]
+                if self._reassign is not None:
+                    self._reassign.update(holes)
+            self._alive[live:] = False
+            del self._row_ids[live:]
+            self._count = live
+            self._free = []
+            self._map(max(live, 1024))
+            logger.info("Compacted local vector partition at %s to %d rows", self.directory, live)
+
+    def _maybe_train(self):
+        """Start (re)training the IVF centroids in the background once the partition has outgrown them"""
+        if self._ivf is None:
+            return
+        with self._lock:
+            size = len(self._ids)
+            due = size >= max(self.ivf_min_rows, 1) and (self._ivf.centroids is None or size >= 2 * self._ivf.trained_rows)
+            if not due or self._training:
+                return
+            self._training = True
+        threading.Thread(target=self.train_ivf, name="local-index-ivf", daemon=True).start()
+
+    def train_ivf(self):
+        """Train IVF centroids on the current rows; only the snapshot and the swap hold the partition lock"""
+        if self._ivf is None:
+            return
+        with self._train_lock:
+            try:
+                with self._lock:
+                    self._training = True
+                    rows = np.flatnonzero(self._alive[:self._count])
+                    if not len(rows):
+                        return
+                    rng = np.random.default_rng(0)
+                    sample = np.array(self._matrix[rng.choice(rows, size=min(len(rows), 64 * self._ivf.lists), replace=False)])
+                    self._reassign = set()
+                    matrix, capacity = self._matrix, self._capacity
+                centroids = self._ivf.fit(sample)
+                assignments = np.full(capacity, -1, dtype=np.int32)
+                _IVF.nearest(centroids, matrix, rows, assignments)
+                with self._lock:
+                    if len(assignments) < self._capacity:
+                        assignments = np.concatenate([assignments, np.full(self._capacity - len(assignments), -1, dtype=np.int32)])
+                    self._ivf.install(centroids, assignments, len(rows))
+                    # Rows written during training were assigned with the old centroids
+                    changed = np.asarray(sorted(self._reassign), dtype=np.int64)
+                    self._ivf.assign(self._matrix, changed[changed < self._count])
+            finally:
+                with self._lock:
+                    self._reassign = None
+                    self._training = False
+                    if self._compaction_due():
+                        self.compact()
+
+    def fetch(self, ids: List[str]) -> dict:
+        with self._lock:
+            rows = {self._ids[vector_id]: vector_id for vector_id in ids if vector_id in self._ids}
+            metadata = self._metadata(list(rows))
+            return {
+                "vectors": {
+                    vector_id: {"id": vector_id, "values": self._matrix[row].tolist(), "metadata": metadata.get(row, {})}
+                    for row, vector_id in rows.items()
+                }
+            }
+
+    def _metadata(self, rows: List[int]) -> dict:
+        found = {}
+        for i in range(0, len(rows), 500):
+            part = [int(row) for row in rows[i:i + 500]]
+            placeholders = ",".join("?" * len(part))
+            for row, metadata in self._db.execute(f"SELECT row, metadata FROM rows WHERE row IN ({placeholders})", part):
+                found[row] = json.loads(metadata)
+        return found
+
+    def _filter_mask(self, flt: dict) -> np.ndarray:
+        sql, params = filter_to_sql(flt)
+        mask = np.zeros(self._count, dtype=bool)
+        rows = [row for (row,) in self._db.execute(f"SELECT row FROM rows WHERE {sql}", params)]
+        mask[rows] = True
+        return mask
+
+    def _candidate_rows(self, query: np.ndarray):
+        """Rows worth scoring for this query, None means all of them"""
+        if self._ivf is None or self._ivf.centroids is None or len(self._ids) < self.ivf_min_rows:
+            return None
+        return self._ivf.candidates(query, self._count)
+
+    def query_many(self, vectors, top_k: int, include_metadata: bool = False, include_values: bool = False, filter: dict = None) -> List[dict]:
+        """Batched top-k: one matrix product scores every query at once"""
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        with self._lock:
+            count = self._count
+            alive = self._alive[:count].copy()
+            if filter:
+                alive &= self._filter_mask(filter)
+            if self._ivf is not None and len(queries) == 1:
+                candidates = self._candidate_rows(queries[0])
+            else:
+                candidates = None
+            if candidates is not None:
+                candidates = candidates[alive[candidates]]
+                scores = (self._matrix[candidates] @ queries.T).T
+            else:
+                scores = queries @ self._matrix[:count].T
+                scores[:, ~alive] = -np.inf
+                candidates = None
+
+            results = []
+            for row_scores in scores:
+                k = min(top_k, int(np.isfinite(row_scores).sum()))
+                if k <= 0:
+                    results.append([])
+                    continue
+                top = np.argpartition(-row_scores, k - 1)[:k]
+                top = top[np.argsort(-row_scores[top])]
+                rows = candidates[top] if candidates is not None else top
+                results.append(list(zip(rows.tolist(), row_scores[top].tolist())))
+
+            all_rows = sorted({row for result in results for row, _ in result})
+            metadata = self._metadata(all_rows) if include_metadata else {}
+            row_ids = self._row_ids
+            responses = []
+            for result in results:
+                matches = []
+                for row, score in result:
+                    match = {"id": row_ids[row], "score": score}
+                    if include_metadata:
+                        match["metadata"] = metadata.get(row, {})
+                    if include_values:
+                        match["values"] = self._matrix[row].tolist()
+                    matches.append(match)
+                responses.append({"matches": matches})
+            return responses
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._db.close()
+
+
+# Namespace names become directory names
+_NAMESPACE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*")
+
+
+class LocalVectorIndex(VectorIndex):
+    """In-process vector index for single-node deployments and offline use.
+
+    Every namespace is a separate partition with its own matrix and metadata
+    table, so a query only scores the vectors of its namespace however many
+    others the index holds. The default namespace lives in `directory`
+    itself, others in `directory/namespaces/<name>`; partitions are opened
+    on first use.
+    """
+
+    def __init__(
+        self,
+        directory: str = LOCAL_INDEX_DIR,
+        dimension: int = VECTOR_DIMENSION,
+        mode: str = LOCAL_INDEX_MODE,
+        ivf_lists: int = LOCAL_INDEX_IVF_LISTS,
+        ivf_probes: int = LOCAL_INDEX_IVF_PROBES,
+        ivf_min_rows: int = LOCAL_INDEX_IVF_MIN_ROWS,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.mode = mode
+        self._options = {
+            "dimension": dimension, "mode": mode,
+            "ivf_lists": ivf_lists, "ivf_probes": ivf_probes, "ivf_min_rows": ivf_min_rows,
+        }
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self._partition("")
+
+    def _path(self, namespace: str) -> Path:
+        if not namespace:
+            return self.directory
+        if not _NAMESPACE.fullmatch(namespace):
+            raise ValueError(f"Invalid namespace {namespace!r}")
+        return self.directory / "namespaces" / namespace
+
+    def _partition(self, namespace: str, create: bool = True):
+        """The partition of `namespace`, None if it doesn't exist and `create` is False"""
+        with self._lock:
+            partition = self._partitions.get(namespace)
+            if partition is None:
+                path = self._path(namespace)
+                if not create and not (path / "metadata.db").exists():
+                    return None
+                partition = self._partitions[namespace] = _Partition(path, **self._options)
+            return partition
+
+    def namespaces(self) -> List[str]:
+        names = [""]
+        namespaces_dir = self.directory / "namespaces"
+        if namespaces_dir.is_dir():
+            names += sorted(entry.name for entry in namespaces_dir.iterdir() if (entry / "metadata.db").exists())
+        return names
+
+    def upsert(self, vectors: List[dict], namespace: str = "", **kwargs):
+        return self._partition(namespace).upsert(vectors)
+
+    def delete(self, ids: List[str] = None, delete_all: bool = False, namespace: str = "", **kwargs):
+        if delete_all:
+            self._drop(namespace)
+            return {}
+        partition = self._partition(namespace, create=False)
+        if partition is not None:
+            partition.delete(ids)
+        return {}
+
+    def _drop(self, namespace: str):
+        """Remove a namespace's vectors and files, like Pinecone's delete_all"""
+        with self._lock:
+            partition = self._partitions.pop(namespace, None)
+            if partition is not None:
+                partition.close()
+            path = self._path(namespace)
+            if namespace:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                # The default partition shares its directory with the other namespaces
+                for name in ("vectors.f32", "metadata.db", "metadata.db-wal", "metadata.db-shm"):
+                    (path / name).unlink(missing_ok=True)
+        if not namespace:
+            self._partition("")
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> dict:
+        partition = self._partition(namespace, create=False)
+        return partition.fetch(ids) if partition is not None else {"vectors": {}}
+
+    def query_many(self, vectors, top_k: int, include_metadata: bool = False, include_values: bool = False, filter: dict = None, namespace: str = "", **kwargs) -> List[dict]:
+        """Batched top-k: one matrix product scores every query at once"""
+        partition = self._partition(namespace, create=False)
+        if partition is None:
+            count = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension).shape[0]
+            return [{"matches": [], "namespace": namespace} for _ in range(count)]
+        responses = partition.query_many(vectors, top_k, include_metadata, include_values, filter)
+        for response in responses:
+            response["namespace"] = namespace
+        return responses
+
+    def query(self, vector, top_k: int, include_metadata: bool = False, include_values: bool = False, filter: dict = None, namespace: str = "", **kwargs) -> dict:
+        return self.query_many([vector], top_k, include_metadata, include_values, filter, namespace)[0]
+
+    def train_ivf(self):
+        """Train the IVF centroids of every open partition now instead of waiting for the background thread"""
+        with self._lock:
+            partitions = list(self._partitions.values())
+        for partition in partitions:
+            partition.train_ivf()
+
+    def describe_index_stats(self, **kwargs) -> dict:
+        counts = {}
+        for namespace in self.namespaces():
+            partition = self._partition(namespace, create=False)
+            if partition is not None and len(partition):
+                counts[namespace] = len(partition)
+        return {
+            "dimension": self.dimension,
+            "total_vector_count": sum(counts.values()),
+            "index_fullness": 0.0,
+            "namespaces": {namespace: {"vector_count": count} for namespace, count in counts.items()},
+        }
+
+    def close(self):
+        with self._lock:
+            partitions, self._partitions = self._partitions, {}
+        for partition in partitions.values():
+            partition.close()
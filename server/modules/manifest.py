@@ -0,0 +1,161 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "./manifest.db")
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_chunk(text: str, metadata: dict) -> str:
+    """Hash of everything we store for a chunk that can change between versions"""
+    key = f"{metadata.get('page')}\0{metadata.get('page_label')}\0{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def chunk_id(file_path: str, chunk_hash: str, occurrence: int = 0) -> str:
+    """Stable vector id: unchanged chunks keep their id across re-uploads"""
+    base = f"{Path(file_path).stem}-{chunk_hash[:16]}"
+    return base if occurrence == 0 else f"{base}-{occurrence}"
+
+
+class DocumentManifest:
+    """What is currently indexed for each file: its content hash and chunk ids.
+
+    Lets ingestion skip files that did not change, embed and upsert only new
+    chunks of files that did, and delete vectors of chunks that disappeared.
+    Files are tracked per index namespace, the same file name can be indexed
+    in several of them.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS files (
+                    file_key TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    chunk_count INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS chunks (
+                    file_key TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    PRIMARY KEY (file_key, chunk_id)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash)")
+
+    @staticmethod
+    def file_key(file_path: str, namespace: str = "") -> str:
+        name = Path(file_path).name
+        return f"{namespace}/{name}" if namespace else name
+
+    @staticmethod
+    def _namespace_clause(namespace: str) -> tuple:
+        """SQL condition selecting the file keys of one namespace"""
+        if not namespace:
+            return "instr(file_key, '/') = 0", ()
+        prefix = f"{namespace}/"
+        return "substr(file_key, 1, ?) = ?", (len(prefix), prefix)
+
+    def content_hash(self, file_path: str, namespace: str = ""):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM files WHERE file_key = ?", (self.file_key(file_path, namespace),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def files_with_hash(self, content_hash: str, namespace: str = "") -> list:
+        """Names of files indexed in `namespace` with exactly this content"""
+        clause, params = self._namespace_clause(namespace)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file_key FROM files WHERE content_hash = ? AND {clause} ORDER BY updated_at", (content_hash, *params)
+            ).fetchall()
+        return [Path(row[0]).name for row in rows]
+
+    def files(self, namespace: str = "") -> list:
+        """Every file indexed in `namespace` with its chunk count"""
+        clause, params = self._namespace_clause(namespace)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file_key, content_hash, chunk_count, updated_at FROM files WHERE {clause} ORDER BY file_key", params
+            ).fetchall()
+        return [
+            {"filename": Path(key).name, "sha256": content_hash, "chunks": chunks, "updated_at": updated_at}
+            for key, content_hash, chunks, updated_at in rows
+        ]
+
+    def chunk_ids(self, file_path: str, namespace: str = "") -> set:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE file_key = ?", (self.file_key(file_path, namespace),)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def chunk_count(self, file_path: str, namespace: str = "") -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk_count FROM files WHERE file_key = ?", (self.file_key(file_path, namespace),)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def replace(self, file_path: str, content_hash: str, chunks: dict, namespace: str = ""):
+        """Record the new state of a file, `chunks` maps chunk id to chunk hash"""
+        key = self.file_key(file_path, namespace)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE file_key = ?", (key,))
+            self._conn.executemany(
+                "INSERT INTO chunks (file_key, chunk_id, chunk_hash) VALUES (?, ?, ?)",
+                [(key, cid, chash) for cid, chash in chunks.items()],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_key, content_hash, chunk_count, updated_at) VALUES (?, ?, ?, ?)",
+                (key, content_hash, len(chunks), time.time()),
+            )
+
+    def remove(self, file_path: str, namespace: str = ""):
+        key = self.file_key(file_path, namespace)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE file_key = ?", (key,))
+            self._conn.execute("DELETE FROM files WHERE file_key = ?", (key,))
+
+    def remove_namespace(self, namespace: str = ""):
+        clause, params = self._namespace_clause(namespace)
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM chunks WHERE {clause}", params)
+            self._conn.execute(f"DELETE FROM files WHERE {clause}", params)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest() -> DocumentManifest:
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = DocumentManifest()
+    return _manifest
@@ -0,0 +1,79 @@
+"""Collections: one index namespace per tenant or document set.
+
+A collection maps to a Pinecone namespace (a partition of the local index),
+its own BM25 index, its own manifest entries and upload directory, so a
+/chat/ query only searches the collection it names. The default collection
+is the unnamed namespace that existed before collections were introduced.
+"""
+import re
+from typing import Iterable, Optional
+from logger import logger
+from modules.answer_cache import get_answer_cache
+from modules.bm25_index import BM25_ENABLED, drop_bm25_index, get_bm25_index
+from modules.chunk_store import get_chunk_store
+from modules.manifest import get_manifest
+from modules.upload_store import get_upload_store
+from modules.vectorstore import delete_vectors
+
+DEFAULT_COLLECTION = "default"
+_COLLECTION = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,62}")
+
+
+class InvalidCollection(ValueError):
+    """Raised for collection names that can't be used as a namespace"""
+
+
+def collection_namespace(collection: Optional[str]) -> str:
+    """Index namespace of a collection, "" for the default one"""
+    collection = (collection or DEFAULT_COLLECTION).strip()
+    if not _COLLECTION.fullmatch(collection):
+        raise InvalidCollection(
+            f"Invalid collection {collection!r}: use up to 63 letters, digits, '-' or '_', starting with a letter or digit"
+        )
+    return "" if collection == DEFAULT_COLLECTION else collection
+
+
+def collection_name(namespace: str) -> str:
+    return namespace or DEFAULT_COLLECTION
+
+
+def document_filter(files: Optional[Iterable[str]]) -> Optional[dict]:
+    """Metadata filter restricting a query to some documents of the collection"""
+    files = sorted({name.strip() for name in files or [] if name and name.strip()})
+    return {"filename": {"$in": files}} if files else None
+
+
+def delete_document(vector_index, filename: str, namespace: str = "") -> dict:
+    """Remove one document from a collection: vectors, keyword entries, manifest, chunk texts and stored file"""
+    manifest = get_manifest()
+    ids = manifest.chunk_ids(filename, namespace)
+    if not delete_vectors(vector_index, ids, namespace=namespace):
+        raise RuntimeError(f"Failed to delete the vectors of {filename}")
+    if BM25_ENABLED:
+        keyword_index = get_bm25_index(namespace)
+        keyword_index.delete(ids)
+        keyword_index.flush()
+    manifest.remove(filename, namespace)
+    get_chunk_store().remove_file(filename, namespace)
+    get_answer_cache().invalidate_files([filename], namespace)
+    stored = get_upload_store().remove(filename, namespace)
+    logger.info("Deleted %s from collection %s (%d vectors)", filename, collection_name(namespace), len(ids))
+    return {"filename": filename, "vectors_deleted": len(ids), "file_deleted": stored}
+
+
+def delete_collection(vector_index, namespace: str = "") -> dict:
+    """Remove everything indexed in a collection"""
+    manifest = get_manifest()
+    files = manifest.files(namespace)
+    vector_index.delete(delete_all=True, namespace=namespace)
+    drop_bm25_index(namespace)
+    manifest.remove_namespace(namespace)
+    get_chunk_store().remove_namespace(namespace)
+    get_answer_cache().invalidate_namespace(namespace)
+    store = get_upload_store()
+    if namespace:
+        stored = store.remove_namespace(namespace)
+    else:
+        stored = sum(store.remove(file["filename"]) for file in files)
+    logger.info("Deleted collection %s (%d files)", collection_name(namespace), len(files))
+    return {"collection": collection_name(namespace), "files_deleted": len(files), "stored_files_deleted": stored}
@@ -0,0 +1,154 @@
+"""Parallel PDF text extraction and chunking.
+
+Kept free of heavy imports on purpose: worker processes import this module
+and should not pay for loading all of langchain.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+from pypdf import PdfReader
+from modules.chunker import ChunkTable
+
+# Number of processes used to parse and split PDFs, 1 disables the pool
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", os.cpu_count() or 1))
+# Large files are cut into page ranges of this size so one file can use several cores
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+
+_pool = None
+# Concurrent ingestion jobs share one pool, the first caller sizes it
+_pool_lock = threading.Lock()
+
+
+@dataclass
+class ExtractedRange:
+    """Chunks produced from pages [page_start, page_end) of one file"""
+
+    file_path: str
+    page_start: int
+    page_end: int
+    total_pages: int
+    chunks: ChunkTable = field(default_factory=ChunkTable)
+    chars: int = 0
+    error: str = None
+    # Measured in the worker process, accounted by the parent
+    parse_seconds: float = 0.0
+    split_seconds: float = 0.0
+
+    @property
+    def pages(self) -> int:
+        return self.page_end - self.page_start
+
+
+def _document_metadata(reader: PdfReader, file_path: str) -> dict:
+    """Same document-level fields PyPDFLoader attaches to every page"""
+    metadata = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    for key, value in (reader.metadata or {}).items():
+        key = key.lstrip("/").lower()
+        value = str(value)
+        if key in ("creationdate", "moddate"):
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat()
+            except ValueError:
+                pass
+        metadata[key] = value
+    metadata["source"] = file_path
+    metadata["total_pages"] = len(reader.pages)
+    return metadata
+
+
+def extract_range(file_path: str, page_start: int, page_end: int, source: str = None) -> ExtractedRange:
+    """Parse and split one page range, read from `source` if given. Runs inside a worker process."""
+    result = ExtractedRange(file_path, page_start, page_end, total_pages=0)
+    start = time.perf_counter()
+    try:
+        reader = PdfReader(source or file_path)
+        result.total_pages = len(reader.pages)
+        labels = reader.page_labels
+        pages = []
+        for page_number in range(page_start, min(page_end, len(reader.pages))):
+            text = reader.pages[page_number].extract_text().strip()
+            result.chars += len(text)
+            pages.append((page_number, labels[page_number], text))
+        parsed = time.perf_counter()
+        result.parse_seconds = parsed - start
+        # Document metadata once per range, chunks as (page, start, end) rows
+        result.chunks = ChunkTable(_document_metadata(reader, file_path))
+        result.chunks.add_pages(pages)
+        result.split_seconds = time.perf_counter() - parsed
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def plan_ranges(file_path: str, pages_per_task: int = INGEST_PAGES_PER_TASK, source: str = None) -> List[tuple]:
+    """Split a file into (file_path, start, end, source) page ranges"""
+    try:
+        total_pages = len(PdfReader(source or file_path).pages)
+    except Exception:
+        # Let the worker hit the same error and report it for this file
+        return [(file_path, 0, 1, source)]
+    if total_pages == 0:
+        return [(file_path, 0, 0, source)]
+    return [
+        (file_path, start, min(start + pages_per_task, total_pages), source)
+        for start in range(0, total_pages, pages_per_task)
+    ]
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # One long-lived pool per process, spawn avoids forking a threaded server.
+    # Another job may be using it, so a different `workers` doesn't rebuild it.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def extract_files(
+    file_paths: Iterable[str],
+    workers: int = INGEST_PARSE_WORKERS,
+    pages_per_task: int = INGEST_PAGES_PER_TASK,
+    sources: dict = None,
+) -> Iterator[ExtractedRange]:
+    """Yield parsed and split page ranges of all files, in file and page order.
+
+    `sources` maps a path to the file its bytes are read from when that is
+    not the path itself; ranges and chunk metadata keep the path.
+
+    Ranges are processed on a process pool but handed back strictly in order,
+    with at most `2 * workers` ranges in flight, so consumers can stream
+    chunks into embedding while later pages are still being parsed.
+    """
+    sources = sources or {}
+    ranges = (
+        task for file_path in file_paths for task in plan_ranges(file_path, pages_per_task, sources.get(file_path))
+    )
+    if workers <= 1:
+        for task in ranges:
+            yield extract_range(*task)
+        return
+
+    pool = _get_pool(workers)
+    pending = deque()
+    for task in ranges:
+        pending.append(pool.submit(extract_range, *task))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
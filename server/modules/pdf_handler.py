@@ -1,16 +1,19 @@
-import os
-import shutil
 from fastapi import UploadFile
-import tempfile
+from modules.upload_store import StoredUpload, get_upload_store
 
-UPLOAD_DIR="./uploaded_docs"
+def save_uploaded_files(files:list[UploadFile],namespace:str="")-> list[StoredUpload]:
+    # Held until the ingestion job is done with them, see release_uploads
+    store=get_upload_store()
+    uploads=[]
+    try:
+        for file in files:
+            uploads.append(store.save(file.filename,file.file,namespace,hold=True))
+    except Exception:
+        release_uploads(uploads)
+        raise
+    return uploads
 
-def save_uploaded_files(files:list[UploadFile])-> list[str]:
-    os.makedirs(UPLOAD_DIR,exist_ok=True)
-    file_path=[]
-    for file in files:
-        temp_path=os.path.join(UPLOAD_DIR,file.filename)
-        with open(temp_path,"wb") as f:
-            shutil.copyfileobj(file.file,f)
-        file_path.append(temp_path)
-    return file_path
\ No newline at end of file
+def release_uploads(uploads:list[StoredUpload]):
+    store=get_upload_store()
+    for upload in uploads:
+        store.release(upload.object)
@@ -1,22 +1,55 @@
 from logger import logger
+from modules.rate_limit import Overloaded, get_limiter
 
-def query_chain(chain, user_input: str) -> dict:
-    try:
-        logger.debug(f"Running chain for input: {user_input}")
-        
-        result = chain.invoke({"input": user_input})
+def _chain_inputs(user_input: str, documents: list = None) -> dict:
+    inputs = {"input": user_input}
+    if documents is not None:
+        inputs["documents"] = documents
+    return inputs
 
-        response = {
-            "response": result.get("answer", ""),
-            "sources": [
-                doc.metadata.get("source", "") 
-                for doc in result.get("source_documents", [])
-            ]
-        }
+def _chain_response(result: dict) -> dict:
+    response = {
+        "response": result.get("answer", ""),
+        "sources": [
+            doc.metadata.get("source", "")
+            for doc in result.get("source_documents", [])
+        ]
+    }
+    logger.debug("Chain response: %s", response)
+    return response
 
-        logger.debug(f"Chain response: {response}")
-        return response
+def query_chain(chain, user_input: str, documents: list = None) -> dict:
+    try:
+        logger.debug("Running chain for input: %s", user_input)
+        result = get_limiter("groq").call(chain.invoke, _chain_inputs(user_input, documents))
+        return _chain_response(result)
 
     except Exception as e:
         logger.exception("Error in query_chain")
-        return {"error": "Failed to process the query."}
\ No newline at end of file
+        return {"error": "Failed to process the query."}
+
+async def aquery_chain(chain, user_input: str, documents: list = None, raise_errors: bool = False) -> dict:
+    """Async variant of query_chain, awaits the LLM instead of blocking the event loop.
+
+    Calls go through Groq's rate limiter; when it gives up the Overloaded
+    error propagates so the route can answer 503. With `raise_errors` every
+    other provider error propagates too instead of becoming an error response.
+    """
+    try:
+        logger.debug("Running chain for input: %s", user_input)
+        result = await get_limiter("groq").acall(lambda: chain.ainvoke(_chain_inputs(user_input, documents)))
+        return _chain_response(result)
+
+    except Exception as e:
+        if raise_errors or isinstance(e, Overloaded):
+            raise
+        logger.exception("Error in aquery_chain")
+        return {"error": "Failed to process the query."}
+
+async def astream_chain(chain, user_input: str, documents: list = None):
+    """Yield answer tokens as the LLM produces them, within Groq's rate limit"""
+    logger.debug("Streaming chain for input: %s", user_input)
+    async for chunk in get_limiter("groq").astream(lambda: chain.astream(_chain_inputs(user_input, documents))):
+        token = chunk.get("answer") if isinstance(chunk, dict) else None
+        if token:
+            yield token
@@ -0,0 +1,417 @@
+"""Per-provider rate limiting shared by ingestion and /chat/.
+
+Google embeddings, Pinecone and Groq each get one limiter: a token bucket
+whose rate adapts to the provider (AIMD). Every rate-limited response
+(429) halves the rate, at most once a second, and pauses the bucket for
+the provider's Retry-After. Every success adds back a little, so a
+provider that stops complaining is back at its configured rate within
+seconds. Without a configured rate (RATE_LIMIT_<PROVIDER>_RPS) calls are
+not paced until the first 429, from then on the bucket starts at half the
+rate the provider was getting.
+
+Callers wait in priority order: interactive requests (the default) are
+served before bulk work (ingestion and /chat/batch, marked with `bulk()`),
+so a large upload slows down instead of starving /chat/. Interactive
+callers don't queue forever. Past RATE_LIMIT_MAX_QUEUE waiters, or an
+expected wait over RATE_LIMIT_MAX_WAIT, they get Overloaded, which the
+routes turn into a 503 with Retry-After. Bulk callers always wait. Calls
+that still come back 429 are retried with backoff, honouring Retry-After.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Iterable, Optional
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Requests per second each provider starts at and never exceeds, unset = learn it from 429s
+RATE_LIMIT_RPS = {
+    provider: float(os.getenv(f"RATE_LIMIT_{provider.upper()}_RPS") or 0) or None
+    for provider in ("google", "pinecone", "groq")
+}
+# Interactive callers waiting per provider, and the longest wait they accept, before a 503
+RATE_LIMIT_MAX_QUEUE = int(os.getenv("RATE_LIMIT_MAX_QUEUE", "64"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5"))
+# Retries of a rate-limited call, bulk work is more patient
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "2"))
+RATE_LIMIT_BULK_RETRIES = int(os.getenv("RATE_LIMIT_BULK_RETRIES", "8"))
+
+INTERACTIVE = 0
+BULK = 1
+
+_priority = contextvars.ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk():
+    """Mark provider calls made in this block (and threads/tasks it starts with its context) as bulk work"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class Overloaded(Exception):
+    """A provider's budget is used up; the HTTP layer answers it with a 503 and Retry-After.
+
+    Deliberately carries no status: retry loops must not retry shed load.
+    """
+
+    def __init__(self, provider: str, retry_after: float, reason: str = "too many requests waiting"):
+        super().__init__(f"{provider} is over its rate limit ({reason}), retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def _causes(error: BaseException):
+    """`error` and the exceptions it wraps; SDKs like langchain_google_genai re-raise 429s as their own errors"""
+    seen = set()
+    while error is not None and id(error) not in seen and not isinstance(error, Overloaded):
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or (None if error.__suppress_context__ else error.__context__)
+
+
+def _is_429(error: BaseException) -> bool:
+    for attribute in ("status", "status_code", "code"):
+        value = getattr(error, attribute, None)
+        if value is None:
+            continue
+        try:
+            return int(value) == 429
+        except (TypeError, ValueError):
+            continue
+    return type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """429 from any of the SDKs (status, status_code or Google's code attribute), also when wrapped"""
+    return any(_is_429(e) for e in _causes(error))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from the error, its HTTP response or a wrapped error"""
+    for e in _causes(error):
+        value = getattr(e, "retry_after", None)
+        if value is None:
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            value = headers.get("retry-after")
+        try:
+            if value is not None:
+                return max(0.0, float(value))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class _Waiter:
+    __slots__ = ("priority", "wake", "granted")
+
+    def __init__(self, priority: int, wake: Callable):
+        self.priority = priority
+        self.wake = wake
+        self.granted = False
+
+
+class RateLimiter:
+    """AIMD token bucket for one provider, handing out tokens in priority order.
+
+    Works from threads (`acquire`, `call`) and coroutines (`acquire_async`,
+    `acall`) alike. Waiters sit in a heap ordered by (priority, arrival);
+    whoever checks the bucket hands free tokens to the head of the heap, and
+    each waiter re-checks when the next token is due.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_queue: int = RATE_LIMIT_MAX_QUEUE,
+        max_wait: float = RATE_LIMIT_MAX_WAIT,
+        retries: int = RATE_LIMIT_RETRIES,
+        bulk_retries: int = RATE_LIMIT_BULK_RETRIES,
+        enabled: bool = RATE_LIMIT_ENABLED,
+    ):
+        self.name = name
+        self.max_rate = rate
+        self.max_burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retries = {INTERACTIVE: retries, BULK: bulk_retries}
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._set_base(self.max_rate)
+            self._tokens = self.burst
+            self._updated = time.monotonic()
+            self._paused_until = 0.0
+            self._last_decrease = 0.0
+            self._second, self._count, self._last_count = 0, 0, 0
+            self._waiters = []
+            self.stats = {"granted": 0, "rate_limited": 0, "retries": 0, "shed": 0, "waited_seconds": 0.0}
+
+    # Bucket state, called with the lock held
+
+    def _set_base(self, rate: Optional[float]):
+        """Rate the bucket recovers towards; None leaves calls unpaced"""
+        self.rate = self.base_rate = rate
+        self.burst = self.max_burst or max(1.0, rate or 1.0)
+        # Never throttle below 2% of it
+        self.min_rate = rate / 50 if rate else None
+
+    def _observe(self, now: float):
+        """Count grants per second, the starting point when a 429 comes before any configured rate"""
+        second = int(now)
+        if second != self._second:
+            self._last_count = self._count if second == self._second + 1 else 0
+            self._second, self._count = second, 0
+        self._count += 1
+
+    def _refill(self, now: float):
+        start = max(self._updated, self._paused_until)
+        if self.rate is not None and now > start:
+            self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+        self._updated = max(self._updated, now)
+
+    def _grant(self, now: float) -> float:
+        """Hand free tokens to the head of the queue, seconds until the next one is due"""
+        self._refill(now)
+        while self._waiters:
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.rate is not None:
+                if self._tokens < 1:
+                    return (1 - self._tokens) / self.rate
+                self._tokens -= 1
+            _, _, waiter = heapq.heappop(self._waiters)
+            self._observe(now)
+            waiter.granted = True
+            self.stats["granted"] += 1
+            waiter.wake()
+        return 0.0
+
+    def _enqueue(self, priority: int, wake: Callable) -> _Waiter:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if priority == INTERACTIVE:
+                ahead = sum(1 for entry in self._waiters if entry[0] <= priority)
+                expected = max(0.0, self._paused_until - now)
+                if self.rate is not None:
+                    expected += max(0.0, ahead + 1 - self._tokens) / self.rate
+                if ahead >= self.max_queue or expected > self.max_wait:
+                    self.stats["shed"] += 1
+                    reason = f"{ahead} requests waiting" if ahead >= self.max_queue else f"{expected:.1f}s wait"
+                    raise Overloaded(self.name, max(1.0, expected), reason)
+            waiter = _Waiter(priority, wake)
+            heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+            self._grant(now)
+            return waiter
+
+    def _poll(self, waiter: _Waiter) -> float:
+        with self._lock:
+            return 0.0 if waiter.granted else self._grant(time.monotonic())
+
+    def _leave(self, waiter: _Waiter, since: float):
+        with self._lock:
+            self.stats["waited_seconds"] += time.monotonic() - since
+            if not waiter.granted:
+                # Cancelled while waiting, give the place up
+                self._waiters = [entry for entry in self._waiters if entry[2] is not waiter]
+                heapq.heapify(self._waiters)
+
+    # Waiting for a token
+
+    def acquire(self, priority: Optional[int] = None):
+        """Block the calling thread until a token is free"""
+        if not self.enabled:
+            return
+        event = threading.Event()
+        since = time.monotonic()
+        waiter = self._enqueue(current_priority() if priority is None else priority, event.set)
+        try:
+            while not waiter.granted:
+                event.wait(self._poll(waiter) or None)
+        finally:
+            self._leave(waiter, since)
+
+    async def acquire_async(self, priority: Optional[int] = None):
+        """Wait for a token without blocking the event loop"""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # loop already closed
+                pass
+
+        since = time.monotonic()
+        waiter = self._enqueue(current_priority() if priority is None else priority, wake)
+        try:
+            while not waiter.granted:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=self._poll(waiter) or None)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._leave(waiter, since)
+
+    # Feedback from the provider
+
+    def on_success(self):
+        with self._lock:
+            if self.rate is not None:
+                # Additive increase: about a tenth of the base rate per second of successful calls
+                self.rate = min(self.max_rate or math.inf, self.rate + 0.1 * self.base_rate / self.rate)
+
+    def on_rate_limited(self, delay: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self.stats["rate_limited"] += 1
+            if self.rate is None:
+                # First 429 without a configured rate: what the provider took so far is its limit
+                self._set_base(float(max(2, self._last_count, self._count)))
+            if now - self._last_decrease >= 1.0:
+                # Multiplicative decrease, once per second however many calls were in flight
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._last_decrease = now
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            if delay:
+                self._paused_until = max(self._paused_until, now + delay)
+        logger.warning("%s rate limited, %.2f requests/s from now on%s", self.name, self.rate, f", paused {delay:.1f}s" if delay else "")
+
+    def _retry_delay(self, error: Exception, attempt: int, priority: int) -> float:
+        """Seconds to wait before retrying after `error`, re-raises what can't be retried"""
+        if not is_rate_limited(error):
+            raise error
+        delay = retry_after(error)
+        self.on_rate_limited(delay)
+        if attempt > self.retries[priority]:
+            raise Overloaded(self.name, delay or 1.0, f"still rate limited after {attempt} attempts") from error
+        self.stats["retries"] += 1
+        # Retry-After pauses the whole bucket, otherwise back off on our own
+        return 0.0 if delay is not None else random.uniform(0, min(30.0, 0.5 * 2 ** (attempt - 1)))
+
+    # Calls through the limiter
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run a blocking provider call under the limit, retrying rate-limited attempts"""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        priority = current_priority()
+        attempt = 0
+        while True:
+            self.acquire(priority)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                attempt += 1
+                time.sleep(self._retry_delay(e, attempt, priority))
+                continue
+            self.on_success()
+            return result
+
+    async def acall(self, make_call: Callable):
+        """Await `make_call()` under the limit, calling it again after rate-limited attempts"""
+        if not self.enabled:
+            return await make_call()
+        priority = current_priority()
+        attempt = 0
+        while True:
+            await self.acquire_async(priority)
+            try:
+                result = await make_call()
+            except Exception as e:
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(e, attempt, priority))
+                continue
+            self.on_success()
+            return result
+
+    async def astream(self, make_stream: Callable):
+        """Yield from `make_stream()` under the limit; rate limits before the first item are retried"""
+        if not self.enabled:
+            async for item in make_stream():
+                yield item
+            return
+        priority = current_priority()
+        attempt = 0
+        while True:
+            await self.acquire_async(priority)
+            started = False
+            try:
+                async for item in make_stream():
+                    started = True
+                    yield item
+            except Exception as e:
+                if started:
+                    raise
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(e, attempt, priority))
+                continue
+            self.on_success()
+            return
+
+    def info(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            queued = [entry[0] for entry in self._waiters]
+            return {
+                "enabled": self.enabled,
+                "rate": round(self.rate, 3) if self.rate is not None else None,
+                "max_rate": self.max_rate,
+                "tokens": round(self._tokens, 2),
+                "paused_seconds": round(max(0.0, self._paused_until - now), 2),
+                "queued_interactive": queued.count(INTERACTIVE),
+                "queued_bulk": queued.count(BULK),
+                **self.stats,
+                "waited_seconds": round(self.stats["waited_seconds"], 3),
+            }
+
+
+limiters = {provider: RateLimiter(provider, rps) for provider, rps in RATE_LIMIT_RPS.items()}
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    return limiters[provider]
+
+
+class RateLimited:
+    """Proxy sending the listed methods of a client through its provider's limiter"""
+
+    def __init__(self, client, provider: str, methods: Iterable[str]):
+        self._client = client
+        self._limiter = get_limiter(provider)
+        self._methods = frozenset(methods)
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._client, name)
+        if name in self._methods:
+            return partial(self._limiter.call, attribute)
+        return attribute
@@ -0,0 +1,179 @@
+"""Second-stage reranking of retrieved chunks.
+
+Vector search scores each chunk with one dot product against the question
+embedding, which can't tell a chunk that answers the question from one that
+is merely about the same topic. The reranker rescores the over-fetched
+candidates together with the question text in one batched CPU pass, keeps
+the best RERANK_TOP_N and the context packer takes them in that order, so
+fewer prompt tokens go to chunks that don't help.
+
+Scorers are pluggable: anything with `score(query, texts) -> array` works.
+"lexical" (default) needs nothing beyond numpy, "cross-encoder" runs a
+sentence-transformers cross-encoder on CPU, and "package.module:factory"
+loads your own. Scoring runs on the "rerank" chat stage; when it doesn't
+finish within that stage's timeout (CHAT_RERANK_TIMEOUT) the candidates
+keep their vector order.
+"""
+import importlib
+import math
+import os
+from typing import List
+
+import numpy as np
+from dotenv import load_dotenv
+from logger import logger
+from modules.async_stages import StageTimeout, chat_stages
+from modules.bm25_index import tokenize
+from modules.metrics import rerank_results
+
+load_dotenv()
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANK_SCORER = os.getenv("RERANK_SCORER", "lexical")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Matches fetched from the index for the reranker to choose from
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "40"))
+# Candidates handed to the context packer after reranking, 0 keeps all of them
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+# Share of the final score that comes from the retrieval score
+RERANK_RETRIEVAL_WEIGHT = float(os.getenv("RERANK_RETRIEVAL_WEIGHT", "0.2"))
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = float(values.max() - values.min()) if len(values) else 0.0
+    return (values - values.min()) / spread if spread > 0 else np.zeros_like(values)
+
+
+def _tightest_window(positions: List[tuple]) -> float:
+    """Matched distinct query terms per token of the shortest span containing all of them"""
+    wanted = len({term for _, term in positions})
+    if wanted < 2:
+        return 0.0
+    counts, have, best, left = {}, 0, math.inf, 0
+    for right, (position, term) in enumerate(positions):
+        counts[term] = counts.get(term, 0) + 1
+        if counts[term] == 1:
+            have += 1
+        while have == wanted:
+            best = min(best, position - positions[left][0] + 1)
+            left_term = positions[left][1]
+            counts[left_term] -= 1
+            if counts[left_term] == 0:
+                have -= 1
+            left += 1
+    return wanted / best
+
+
+class LexicalScorer:
+    """Question/chunk interaction features combined by a small linear model.
+
+    Per candidate: BM25 against the question with IDF taken over the
+    candidate pool (terms every candidate shares don't count), the
+    IDF-weighted share of question terms it contains, the share of question
+    bigrams it contains as phrases, and how tightly its matched terms
+    cluster. Term frequencies for the whole batch are one matrix.
+    """
+
+    WEIGHTS = np.array([0.3, 0.35, 0.2, 0.15], dtype=np.float32)
+    K1 = 1.2
+    B = 0.75
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        query_tokens = tokenize(query)
+        terms = list(dict.fromkeys(query_tokens))
+        if not terms or not texts:
+            return np.zeros(len(texts), dtype=np.float32)
+        term_ids = {term: i for i, term in enumerate(terms)}
+        bigrams = set(zip(query_tokens, query_tokens[1:]))
+
+        tf = np.zeros((len(texts), len(terms)), dtype=np.float32)
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        phrases = np.zeros(len(texts), dtype=np.float32)
+        proximity = np.zeros(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[i] = len(tokens)
+            positions = [(position, term_ids[token]) for position, token in enumerate(tokens) if token in term_ids]
+            for _, term in positions:
+                tf[i, term] += 1
+            if bigrams:
+                phrases[i] = len(bigrams.intersection(zip(tokens, tokens[1:]))) / len(bigrams)
+            proximity[i] = _tightest_window(positions)
+
+        present = tf > 0
+        df = present.sum(axis=0)
+        idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norms = self.K1 * (1 - self.B + self.B * lengths / max(float(lengths.mean()), 1.0))
+        bm25 = (idf * tf * (self.K1 + 1) / (tf + norms[:, None])).sum(axis=1)
+        coverage = (present * idf).sum(axis=1) / max(float(idf.sum()), 1e-9)
+        features = np.stack([_min_max(bm25), coverage, phrases, proximity], axis=1)
+        return features @ self.WEIGHTS
+
+
+class CrossEncoderScorer:
+    """A sentence-transformers cross-encoder on CPU, one predict call for all candidates"""
+
+    def __init__(self, model: str = RERANK_MODEL, batch_size: int = 64):
+        # Optional dependency, only needed when RERANK_SCORER=cross-encoder
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model, device="cpu")
+        self.batch_size = batch_size
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        pairs = [(query, text) for text in texts]
+        return np.asarray(self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False), dtype=np.float32)
+
+
+SCORERS = {
+    "lexical": LexicalScorer,
+    "cross-encoder": CrossEncoderScorer,
+}
+
+
+def load_scorer(name: str = RERANK_SCORER):
+    if name in SCORERS:
+        return SCORERS[name]()
+    module, _, factory = name.partition(":")
+    if not factory:
+        raise ValueError(f"Unknown rerank scorer {name!r}, use one of {sorted(SCORERS)} or 'package.module:factory'")
+    return getattr(importlib.import_module(module), factory)()
+
+
+class Reranker:
+    def __init__(self, scorer=None, top_n: int = RERANK_TOP_N, retrieval_weight: float = RERANK_RETRIEVAL_WEIGHT):
+        self.scorer = scorer if scorer is not None else load_scorer()
+        self.top_n = top_n
+        self.retrieval_weight = retrieval_weight
+
+    def score(self, question: str, candidates: list) -> np.ndarray:
+        """Final scores: the scorer's blended with the retrieval score, both scaled to [0, 1]"""
+        scores = np.asarray(self.scorer.score(question, [candidate.text for candidate in candidates]), dtype=np.float32)
+        retrieval = np.asarray([candidate.score for candidate in candidates], dtype=np.float32)
+        return (1 - self.retrieval_weight) * _min_max(scores) + self.retrieval_weight * _min_max(retrieval)
+
+    async def rerank(self, question: str, candidates: list, stage=None) -> list:
+        """Candidates in reranked order (best `top_n`), or unchanged if scoring fails or runs out of time"""
+        if len(candidates) < 2:
+            return candidates
+        stage = stage or chat_stages["rerank"]
+        try:
+            scores = await stage.run(self.score, question, candidates)
+        except StageTimeout:
+            rerank_results.inc(result="fallback")
+            logger.warning("Reranking %d candidates ran out of time, keeping vector order", len(candidates))
+            return candidates
+        except Exception:
+            rerank_results.inc(result="error")
+            logger.exception("Reranking failed, keeping vector order")
+            return candidates
+        rerank_results.inc(result="reranked")
+        order = np.argsort(-scores, kind="stable")
+        if self.top_n > 0:
+            order = order[:self.top_n]
+        reranked = []
+        for i in order:
+            # The packer takes candidates by score, sources keep reporting vector similarity
+            candidates[i].score = float(scores[i])
+            reranked.append(candidates[i])
+        return reranked
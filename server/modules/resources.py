@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from logger import logger
+from modules.rate_limit import RateLimited
+from modules.reranker import RERANK_ENABLED
+from modules.vectorstore import PINECONE_POOL_SIZE, VECTOR_BACKEND, create_index
+
+load_dotenv()
+
+EMBEDDING_MODEL = "models/embedding-001"
+# When the app builds its clients: "background" (server answers right away, /readyz
+# turns 200 once they are up), "blocking" (startup waits for them) or "off" (first use)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background").lower()
+
+
+def _build_index():
+    # Pinecone or the local index, picked by VECTOR_BACKEND
+    index = create_index()
+    if VECTOR_BACKEND == "pinecone":
+        # Ingestion and /chat/ share Pinecone's request budget
+        return RateLimited(index, "pinecone", ("query", "fetch", "upsert", "delete"))
+    return index
+
+
+def _build_embeddings():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from modules.embedding_cache import CachedEmbeddings, get_embedding_cache
+
+    # Ingestion and /chat/ share the cache, only misses reach Google, within its rate limit
+    embeddings = RateLimited(GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL), "google", ("embed_query", "embed_documents"))
+    return CachedEmbeddings(embeddings, get_embedding_cache(), EMBEDDING_MODEL)
+
+
+def _build_chain():
+    from modules.llm import get_llm_chain
+
+    return get_llm_chain()
+
+
+def _build_reranker():
+    from modules.reranker import Reranker
+
+    # Loads the cross-encoder model when RERANK_SCORER asks for one
+    return Reranker()
+
+
+DEFAULT_FACTORIES = {
+    "index": _build_index,
+    "embeddings": _build_embeddings,
+    "chain": _build_chain,
+}
+if RERANK_ENABLED:
+    DEFAULT_FACTORIES["reranker"] = _build_reranker
+
+
+class ResourceRegistry:
+    """Process-wide clients shared by every request.
+
+    Each resource is built once on first use (or during warmup) and handed out
+    to all requests afterwards. Usage is counted so pool pressure can be
+    inspected at runtime.
+    """
+
+    def __init__(self, factories: dict = None):
+        self._factories = dict(DEFAULT_FACTORIES)
+        if factories:
+            self._factories.update(factories)
+        self._resources = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {"created": 0, "build_seconds": 0.0, "acquired": 0, "in_use": 0, "peak_in_use": 0, "error": None}
+            for name in self._factories
+        }
+
+    def get(self, name: str):
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+        with self._lock:
+            resource = self._resources.get(name)
+            if resource is None:
+                start = time.perf_counter()
+                stats = self._stats[name]
+                try:
+                    resource = self._factories[name]()
+                except Exception as e:
+                    stats["error"] = f"{type(e).__name__}: {e}"
+                    raise
+                stats["error"] = None
+                stats["created"] += 1
+                stats["build_seconds"] += time.perf_counter() - start
+                self._resources[name] = resource
+                logger.info("Initialized shared resource '%s' in %.3fs", name, time.perf_counter() - start)
+        return resource
+
+    @contextmanager
+    def use(self, name: str):
+        """Borrow a shared resource for the duration of a block"""
+        resource = self.get(name)
+        stats = self._stats[name]
+        with self._lock:
+            stats["acquired"] += 1
+            stats["in_use"] += 1
+            stats["peak_in_use"] = max(stats["peak_in_use"], stats["in_use"])
+        try:
+            yield resource
+        finally:
+            with self._lock:
+                stats["in_use"] -= 1
+
+    def warmup(self):
+        for name in self._factories:
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception("Failed to warm up resource '%s', it will be built on first use", name)
+
+    def ready(self) -> bool:
+        """Whether every resource has been built"""
+        return all(name in self._resources for name in self._factories)
+
+    def stats(self) -> dict:
+        with self._lock:
+            resources = {name: dict(stats, ready=name in self._resources) for name, stats in self._stats.items()}
+        return {"backend": VECTOR_BACKEND, "pool_size": PINECONE_POOL_SIZE, "resources": resources}
+
+    def close(self):
+        with self._lock:
+            resources, self._resources = self._resources, {}
+        for name, resource in resources.items():
+            close = getattr(resource, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    logger.exception("Failed to close resource '%s'", name)
+
+
+# Default registry used by the app lifespan and by code running outside a request.
+registry = ResourceRegistry()
@@ -0,0 +1,232 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploaded_docs")
+# Largest accepted file, bigger uploads are rejected with 413 while streaming
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(512 << 20)))
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds UPLOAD_MAX_BYTES"""
+
+
+@dataclass
+class StoredUpload:
+    # uploaded_docs[/<namespace>]/<filename>, the path the manifest and vector ids are keyed by
+    path: str
+    filename: str
+    sha256: str
+    size: int
+    # The same bytes were already in the store, nothing new was written
+    duplicate: bool
+    # .objects/<sha256><suffix>, never rewritten: ingestion reads this, not `path`
+    object: str
+
+
+class UploadStore:
+    """Content-addressed storage for uploaded files.
+
+    Uploads are streamed in fixed-size chunks to a temp file while their
+    sha256 is computed, so memory stays flat however large the PDF is. The
+    finished file is renamed into `.objects/<sha256><suffix>` and hard-linked
+    (copied where links are not supported) to `<root>/<filename>`, or
+    `<root>/<namespace>/<filename>` for uploads to a collection; both
+    renames are atomic, readers never see a partial file. The hash is the
+    same one the document manifest uses, so indexing doesn't read the file
+    again to decide whether it changed. Which object each name points to is
+    recorded in `.objects/refs.db`; an object is deleted once no name
+    refers to it, whether names are links or copies. Uploads saved with
+    `hold=True` also keep their object until `release()`, so a job still
+    reads the bytes it was submitted with after the name is uploaded again.
+    """
+
+    def __init__(self, root: str = UPLOAD_DIR, max_bytes: int = UPLOAD_MAX_BYTES, chunk_bytes: int = UPLOAD_CHUNK_BYTES):
+        self.root = Path(root)
+        self.objects_dir = self.root / ".objects"
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        # Deduplicating against an object, linking a name and dropping unreferenced objects must not interleave
+        self._lock = threading.Lock()
+        refs_path = self.objects_dir / "refs.db"
+        created = not refs_path.exists()
+        self._refs = sqlite3.connect(refs_path, check_same_thread=False)
+        with self._refs:
+            self._refs.execute("PRAGMA journal_mode=WAL")
+            self._refs.execute("CREATE TABLE IF NOT EXISTS refs (path TEXT PRIMARY KEY, object TEXT NOT NULL)")
+            self._refs.execute("CREATE INDEX IF NOT EXISTS refs_object ON refs (object)")
+            self._refs.execute("CREATE TABLE IF NOT EXISTS holds (object TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        if created:
+            self._rebuild_refs()
+
+    def _rebuild_refs(self):
+        """Record the object behind every stored name, for stores written before refs were tracked"""
+        objects = {entry.inode(): entry.name for entry in os.scandir(self.objects_dir) if self._is_object(entry.name)}
+        rows = []
+        for directory, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if Path(directory, d) != self.objects_dir]
+            for name in files:
+                path = Path(directory, name)
+                obj = objects.get(os.stat(path).st_ino)
+                if obj is None:
+                    # A copy, not a link: find its object by content
+                    digest = hashlib.sha256()
+                    with open(path, "rb") as f:
+                        for block in iter(lambda: f.read(self.chunk_bytes), b""):
+                            digest.update(block)
+                    obj = self.object_path(digest.hexdigest(), path.suffix).name
+                    if not (self.objects_dir / obj).exists():
+                        continue
+                rows.append((str(path), obj))
+        with self._refs:
+            self._refs.executemany("INSERT OR REPLACE INTO refs (path, object) VALUES (?, ?)", rows)
+
+    @staticmethod
+    def _is_object(name: str) -> bool:
+        return not name.endswith(".part") and not name.startswith("refs.db")
+
+    def object_path(self, sha256: str, suffix: str = "") -> Path:
+        return self.objects_dir / f"{sha256}{suffix.lower()}"
+
+    def document_path(self, filename: str, namespace: str = "") -> Path:
+        # No directories from the client, namespaces are validated by the caller
+        filename = Path(filename).name
+        return self.root / namespace / filename if namespace else self.root / filename
+
+    def save(self, filename: str, stream, namespace: str = "", hold: bool = False) -> StoredUpload:
+        """Stream a file-like object into the store under `filename`, holding its object if `hold`"""
+        path = self.document_path(filename, namespace)
+        filename = path.name
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.objects_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for block in iter(lambda: stream.read(self.chunk_bytes), b""):
+                    size += len(block)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"{filename} is larger than {self.max_bytes} bytes")
+                    digest.update(block)
+                    f.write(block)
+            sha256 = digest.hexdigest()
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        blob = self.object_path(sha256, Path(filename).suffix)
+        with self._lock:
+            try:
+                duplicate = blob.exists()
+                if duplicate:
+                    os.unlink(temp_path)
+                else:
+                    os.replace(temp_path, blob)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            if hold:
+                with self._refs:
+                    self._refs.execute(
+                        "INSERT INTO holds (object, count) VALUES (?, 1) ON CONFLICT (object) DO UPDATE SET count = count + 1",
+                        (blob.name,),
+                    )
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._link(blob, path)
+        return StoredUpload(str(path), filename, sha256, size, duplicate, str(blob))
+
+    def release(self, object_path: str):
+        """Drop one hold taken by save(), deleting the object if nothing refers to it any more"""
+        name = Path(object_path).name
+        with self._lock:
+            row = self._refs.execute("SELECT count FROM holds WHERE object = ?", (name,)).fetchone()
+            if row is None:
+                return
+            with self._refs:
+                if row[0] > 1:
+                    self._refs.execute("UPDATE holds SET count = count - 1 WHERE object = ?", (name,))
+                else:
+                    self._refs.execute("DELETE FROM holds WHERE object = ?", (name,))
+            self._drop_orphan(name)
+
+    def _link(self, blob: Path, path: Path):
+        """Point `path` at `blob` atomically, dropping the object it replaced if nothing else uses it"""
+        row = self._refs.execute("SELECT object FROM refs WHERE path = ?", (str(path),)).fetchone()
+        previous = row[0] if row else None
+        if previous == blob.name and path.exists():
+            return
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.link")
+        try:
+            os.link(blob, temp_path)
+        except OSError:
+            shutil.copyfile(blob, temp_path)
+        os.replace(temp_path, path)
+        with self._refs:
+            self._refs.execute("INSERT OR REPLACE INTO refs (path, object) VALUES (?, ?)", (str(path), blob.name))
+        if previous is not None and previous != blob.name:
+            self._drop_orphan(previous)
+
+    def _drop_orphan(self, name: str):
+        """Delete an object no stored name or held upload refers to any more"""
+        referenced = self._refs.execute(
+            "SELECT 1 FROM refs WHERE object = ? UNION ALL SELECT 1 FROM holds WHERE object = ? LIMIT 1", (name, name)
+        ).fetchone()
+        if referenced is None:
+            (self.objects_dir / name).unlink(missing_ok=True)
+
+    def remove(self, filename: str, namespace: str = "") -> bool:
+        """Delete a stored document, returns False if there was none"""
+        path = self.document_path(filename, namespace)
+        with self._lock:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                return False
+            row = self._refs.execute("SELECT object FROM refs WHERE path = ?", (str(path),)).fetchone()
+            if row is not None:
+                with self._refs:
+                    self._refs.execute("DELETE FROM refs WHERE path = ?", (str(path),))
+                self._drop_orphan(row[0])
+        return True
+
+    def remove_namespace(self, namespace: str) -> int:
+        """Delete every document stored for a collection, returns how many"""
+        directory = self.root / namespace
+        if not namespace or not directory.is_dir():
+            return 0
+        removed = sum(self.remove(entry.name, namespace) for entry in list(os.scandir(directory)) if entry.is_file())
+        try:
+            directory.rmdir()
+        except OSError:
+            pass
+        return removed
+
+    def info(self) -> dict:
+        objects = [entry for entry in os.scandir(self.objects_dir) if entry.is_file() and self._is_object(entry.name)]
+        return {
+            "root": str(self.root),
+            "objects": len(objects),
+            "bytes": sum(entry.stat().st_size for entry in objects),
+            "max_bytes": self.max_bytes,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UploadStore()
+    return _store
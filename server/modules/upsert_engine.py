@@ -0,0 +1,182 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List
+from logger import logger
+from modules.metrics import ingest_chunks, span
+
+# Pinecone rejects upsert requests over 2MB or 1000 vectors, stay below both
+UPSERT_MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", str(1536 * 1024)))
+UPSERT_MAX_BATCH_VECTORS = int(os.getenv("UPSERT_MAX_BATCH_VECTORS", "1000"))
+UPSERT_MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "5"))
+UPSERT_BASE_DELAY = float(os.getenv("UPSERT_BASE_DELAY", "0.5"))
+UPSERT_MAX_DELAY = float(os.getenv("UPSERT_MAX_DELAY", "30"))
+UPSERT_DEAD_LETTER_DIR = os.getenv("UPSERT_DEAD_LETTER_DIR", "./dead_letters")
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def vector_size(vector: dict) -> int:
+    """Approximate JSON payload size of one vector"""
+    # ~10 bytes per float once serialized, metadata carries the chunk text
+    return len(vector["id"]) + 10 * len(vector["values"]) + len(json.dumps(vector.get("metadata", {}), default=str))
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if status is not None:
+        try:
+            return int(status) in RETRYABLE_STATUS
+        except (TypeError, ValueError):
+            return False
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__module__.startswith("urllib3")
+
+
+def split_batches(vectors: List[dict], max_bytes: int, max_vectors: int) -> List[List[dict]]:
+    """Group vectors into batches bounded by payload size and count"""
+    batches = []
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        size = vector_size(vector)
+        if batch and (batch_bytes + size > max_bytes or len(batch) >= max_vectors):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class UpsertEngine:
+    """Concurrent upserts with retry and a dead-letter file for batches that fail for good.
+
+    `submit` blocks once `max_in_flight` batches are outstanding, which gives
+    the ingestion pipeline backpressure instead of an unbounded backlog.
+    Retryable errors (429, 5xx, connection problems) are retried with
+    exponential backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        index,
+        max_in_flight: int = UPSERT_MAX_IN_FLIGHT,
+        max_batch_bytes: int = UPSERT_MAX_BATCH_BYTES,
+        max_batch_vectors: int = UPSERT_MAX_BATCH_VECTORS,
+        max_retries: int = UPSERT_MAX_RETRIES,
+        base_delay: float = UPSERT_BASE_DELAY,
+        max_delay: float = UPSERT_MAX_DELAY,
+        dead_letter_dir: str = UPSERT_DEAD_LETTER_DIR,
+    ):
+        self.index = index
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_vectors = max_batch_vectors
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_letter_path = Path(dead_letter_dir) / f"upserts-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl"
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="upsert")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.stats = {"batches": 0, "upserted": 0, "retries": 0, "dead_lettered": 0}
+
+    def submit(self, vectors: List[dict], on_done: Callable[[int, int], None] = None, **upsert_kwargs) -> List[Future]:
+        """Queue vectors for upsert. `on_done(upserted, failed)` runs once per batch."""
+        futures = []
+        for batch in split_batches(vectors, self.max_batch_bytes, self.max_batch_vectors):
+            self._slots.acquire()
+            # Sent in the submitter's context, e.g. its rate limit priority
+            future = self._executor.submit(contextvars.copy_context().run, self._send, batch, upsert_kwargs, on_done)
+            with self._lock:
+                self._pending.add(future)
+            future.add_done_callback(self._release)
+            futures.append(future)
+        return futures
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def _send(self, batch: List[dict], upsert_kwargs: dict, on_done=None) -> tuple:
+        upserted, failed = self._send_with_retry(batch, upsert_kwargs)
+        # Runs before the future resolves, so waiting on it also waits for the callback
+        if on_done is not None:
+            on_done(upserted, failed)
+        return upserted, failed
+
+    def _send_with_retry(self, batch: List[dict], upsert_kwargs: dict) -> tuple:
+        attempt = 0
+        while True:
+            try:
+                with span("upsert"):
+                    self.index.upsert(vectors=batch, **upsert_kwargs)
+                with self._lock:
+                    self.stats["batches"] += 1
+                    self.stats["upserted"] += len(batch)
+                ingest_chunks.inc(len(batch), stage="upserted")
+                return len(batch), 0
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries or not is_retryable(e):
+                    logger.error("Upsert of %d vectors failed after %d attempts: %s", len(batch), attempt, e)
+                    self._dead_letter(batch, e, attempt, upsert_kwargs)
+                    return 0, len(batch)
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                with self._lock:
+                    self.stats["retries"] += 1
+                logger.warning("Upsert attempt %d failed (%s), retrying in %.2fs", attempt, e, delay)
+                time.sleep(delay)
+
+    def _dead_letter(self, batch: List[dict], error: Exception, attempts: int, upsert_kwargs: dict):
+        record = {
+            "time": time.time(),
+            "error": str(error),
+            "attempts": attempts,
+            "upsert_kwargs": upsert_kwargs,
+            "vectors": batch,
+        }
+        with self._lock:
+            self.stats["dead_lettered"] += len(batch)
+            self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def flush(self):
+        """Wait for every submitted batch to finish"""
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+            for future in pending:
+                future.exception()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay_dead_letters(path: str, index) -> int:
+    """Re-send every batch recorded in a dead-letter file, returns vectors upserted"""
+    with UpsertEngine(index, dead_letter_dir=str(Path(path).parent)) as engine:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                engine.submit(record["vectors"], **record.get("upsert_kwargs", {}))
+        engine.flush()
+    return engine.stats["upserted"]
@@ -0,0 +1,126 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import List
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+# "pinecone" (managed, default) or "local" (in-process, see modules/local_index.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+VECTOR_DIMENSION = 768
+
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "ragindex")
+PINECONE_ENV = "us-east-1"
+# Size of the urllib3 connection pool behind the shared Pinecone index handle.
+# Every request reuses these keep-alive connections instead of doing a fresh TLS handshake.
+PINECONE_POOL_SIZE = int(os.getenv("PINECONE_POOL_SIZE", "16"))
+
+
+class VectorIndex(ABC):
+    """The part of the Pinecone Index API the app relies on.
+
+    Pinecone's own Index object satisfies it as is; other backends subclass
+    this (a backend missing one of the methods fails when it is created)
+    and return plain dicts shaped like Pinecone responses, so callers can
+    index `result["matches"]`, `match["metadata"]` etc. either way.
+    Every call is scoped to one namespace ("" is the default one), a query
+    only searches the vectors of its namespace.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors: List[dict], namespace: str = "", **kwargs):
+        ...
+
+    @abstractmethod
+    def query(self, vector, top_k: int, include_metadata: bool = False, include_values: bool = False, filter: dict = None, namespace: str = "", **kwargs) -> dict:
+        ...
+
+    @abstractmethod
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> dict:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str] = None, delete_all: bool = False, namespace: str = "", **kwargs):
+        ...
+
+    @abstractmethod
+    def describe_index_stats(self, **kwargs) -> dict:
+        ...
+
+    def close(self):
+        pass
+
+
+def fetch_vectors(index, ids: List[str], namespace: str = "") -> dict:
+    """Fetch vectors by id from any backend as {id: {"id", "values", "metadata"}}"""
+    if not ids:
+        return {}
+    response = index.fetch(ids=list(ids), namespace=namespace)
+    # Pinecone returns a FetchResponse dataclass, other backends a plain dict
+    vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+    return {
+        vector_id: {"id": vector_id, "values": list(vector["values"] or []), "metadata": dict(vector["metadata"] or {})}
+        for vector_id, vector in vectors.items()
+    }
+
+
+def delete_vectors(vector_index, ids, batch_size=1000, namespace: str = "") -> bool:
+    """Delete vectors by id in batches, returns False if any batch failed"""
+    ids = sorted(ids)
+    for i in range(0, len(ids), batch_size):
+        try:
+            vector_index.delete(ids=ids[i:i + batch_size], namespace=namespace)
+        except Exception as e:
+            logger.error("❌ Failed to delete stale vectors: %s", e)
+            return False
+    return True
+
+
+def namespace_counts(vector_index) -> dict:
+    """Vector count of every namespace in the index"""
+    # Pinecone's stats response supports the same item access as a dict
+    stats = vector_index.describe_index_stats()
+    return {name: summary["vector_count"] for name, summary in (stats.get("namespaces") or {}).items()}
+
+
+def create_pinecone_index():
+    """Connect to the Pinecone index, creating it on first run"""
+    from pinecone import Pinecone, ServerlessSpec
+
+    pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"], pool_threads=PINECONE_POOL_SIZE)
+    existing_indexes = [i["name"] for i in pc.list_indexes()]
+    if PINECONE_INDEX_NAME not in existing_indexes:
+        logger.info("Creating Pinecone index '%s'", PINECONE_INDEX_NAME)
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=VECTOR_DIMENSION,
+            metric="dotproduct",
+            spec=ServerlessSpec(cloud="aws", region=PINECONE_ENV),
+        )
+        while not pc.describe_index(PINECONE_INDEX_NAME).status["ready"]:
+            time.sleep(1)
+    return pc.Index(
+        PINECONE_INDEX_NAME,
+        pool_threads=PINECONE_POOL_SIZE,
+        connection_pool_maxsize=PINECONE_POOL_SIZE,
+    )
+
+
+def create_local_index():
+    from modules.local_index import LocalVectorIndex
+
+    return LocalVectorIndex()
+
+
+BACKENDS = {
+    "pinecone": create_pinecone_index,
+    "local": create_local_index,
+}
+
+
+def create_index(backend: str = VECTOR_BACKEND):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown VECTOR_BACKEND '{backend}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend]()
@@ -1,154 +1,305 @@
-from fastapi import APIRouter, Form
-from fastapi.responses import JSONResponse
-from modules.llm import get_llm_chain
-from modules.query_handlers import query_chain
-from langchain_core.documents import Document
-from langchain.schema import BaseRetriever
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from pinecone import Pinecone
-from pydantic import Field
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass
 from typing import List, Optional
-from logger import logger
-import os
+import numpy as np
+from fastapi import APIRouter, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from modules.answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from modules.async_stages import chat_stages, StageTimeout
+from modules.batch_questions import (
+    BATCH_EMBED_SIZE, BATCH_QUERY_CONCURRENCY, ChunkCache, InvalidBatch, generation_scheduler, group_duplicates, parse_questions,
+)
+from modules.bm25_index import BM25_ENABLED, get_bm25_index, reciprocal_rank_fusion
+from modules.chunk_store import CHUNK_STORE_ENABLED, get_chunk_store
+from modules.context_builder import CONTEXT_CANDIDATES, Candidate, count_tokens, pack_context
+from modules.embed_batcher import EMBED_BATCH_ENABLED, query_batcher
+from modules.embedding_cache import embed_query_batch
+from modules.latency import chat_latency
+from modules.metrics import llm_tokens, span
+from modules.namespaces import DEFAULT_COLLECTION, InvalidCollection, collection_namespace, document_filter
+from modules.prompts import PROMPT_TEMPLATE
+from modules.query_handlers import aquery_chain, astream_chain
+from modules.rate_limit import Overloaded, bulk
+from modules.reranker import RERANK_CANDIDATES, RERANK_ENABLED
+from modules.vectorstore import fetch_vectors
+from logger import logger, should_trace
 
 # Create the router instance
 router = APIRouter()
 
-@router.post("/chat/")
-async def ask_question(question: str = Form(...)):
-    try:
-        logger.info(f"user query: {question}")
-
-        # Embed model + Pinecone setup
-        pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"])
-        index = pc.Index(os.environ["PINECONE_INDEX_NAME"])
-        embed_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        embedded_query = embed_model.embed_query(question)
-        
-        # Retrieve documents with better filtering
-        res = index.query(
-            vector=embedded_query, 
-            top_k=10,  # Get more candidates
-            include_metadata=True
+# Instructions and labels sent with every question, on top of the packed context
+PROMPT_OVERHEAD_TOKENS = count_tokens(PROMPT_TEMPLATE.replace("{context}", "").replace("{input}", ""))
+
+NO_CONTEXT_ANSWER = "I couldn't find relevant information to answer your question. The documents may not contain the information you're looking for, or they may need to be re-indexed with better content extraction."
+
+
+@dataclass
+class RetrievedContext:
+    """Documents retrieved for one question, shared by /chat/, /chat/stream and /chat/batch"""
+
+    embedded_query: list
+    docs: list
+    doc_ids: list  # Identify the retrieved context for the answer cache
+    doc_files: set
+    sources: list
+    prompt_tokens: int = 0
+    namespace: str = ""
+
+
+async def fuse_keyword_matches(resources, embedded_query, matches, keyword_hits, namespace: str = "", files: Optional[set] = None) -> list:
+    """Reciprocal rank fusion of vector and BM25 matches.
+
+    Keyword-only hits are fetched from the vector index for their text and
+    values, and get their vector similarity computed locally so sources keep
+    reporting comparable relevance scores. With a document filter, keyword
+    hits from other documents of the collection are dropped.
+    """
+    by_id = {
+        match["id"]: {"id": match["id"], "score": match.get("score", 0), "metadata": match["metadata"], "values": match.get("values")}
+        for match in matches
+    }
+    # The whole union is kept, the context packer's token budget does the cutting
+    fused = reciprocal_rank_fusion(list(by_id), [chunk_id for chunk_id, _ in keyword_hits])
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+    if missing:
+        with resources.use("index") as index:
+            fetched = await chat_stages["query"].run(fetch_vectors, index, missing, namespace)
+        query = np.asarray(embedded_query, dtype=np.float32)
+        for chunk_id, vector in fetched.items():
+            if files and vector["metadata"].get("filename") not in files:
+                continue
+            score = float(query @ np.asarray(vector["values"], dtype=np.float32)) if vector["values"] else 0.0
+            by_id[chunk_id] = {**vector, "score": score}
+    logger.info(
+        "Hybrid retrieval: %d vector matches, %d keyword matches, %d fetched for keyword only",
+        len(matches), len(keyword_hits), len(missing),
+    )
+    return [{**by_id[chunk_id], "fused_score": score} for chunk_id, score in fused if chunk_id in by_id]
+
+
+def build_candidates(matches, stored: Optional[dict] = None) -> list:
+    """Turn index matches into packing candidates, dropping chunks without usable text.
+
+    `stored` maps vector ids to their text and metadata from the chunk store;
+    vectors indexed before it existed still carry them in the index.
+    """
+    candidates = []
+    stored = stored or {}
+
+    for match in matches:
+        metadata = stored.get(match["id"]) or match["metadata"]
+        text = metadata.get("text", "").strip()
+
+        # Enhanced content handling
+        if len(text) <= 3 or text.isdigit():  # Just page numbers or minimal content
+            # Try to create meaningful content from metadata
+            enhanced_content = []
+
+            if metadata.get('title'):
+                enhanced_content.append(f"Title: {metadata['title']}")
+
+            if metadata.get('subject'):
+                enhanced_content.append(f"Subject: {metadata['subject']}")
+
+            if metadata.get('keywords'):
+                enhanced_content.append(f"Keywords: {metadata['keywords']}")
+
+            if metadata.get('author'):
+                enhanced_content.append(f"Author: {metadata['author']}")
+
+            page_info = metadata.get('page_label', metadata.get('page', ''))
+            if page_info:
+                enhanced_content.append(f"Page: {page_info}")
+
+            if enhanced_content:
+                text = "\n".join(enhanced_content)
+            else:
+                continue  # Skip if no meaningful content
+
+        # Skip very short content
+        if len(text) < 20:
+            continue
+
+        candidates.append(Candidate(
+            id=match["id"],
+            text=text,
+            # Packing order follows the fused rank when hybrid retrieval is on
+            score=match.get("fused_score", match.get("score", 0)),
+            metadata={
+                "source": metadata.get("filename", metadata.get("source", "Unknown")),
+                "page": metadata.get("page_label", metadata.get("page", "Unknown")),
+                "title": metadata.get("title", "Unknown"),
+                "start_index": metadata.get("start_index"),
+                "similarity": match.get("score", 0),
+            },
+            values=match.get("values") or None,
+        ))
+    return candidates
+
+
+async def retrieve_context(
+    resources,
+    question: str,
+    namespace: str = "",
+    files: Optional[List[str]] = None,
+    embedded_query: Optional[list] = None,
+    chunk_lookup=None,
+) -> RetrievedContext:
+    """Retrieve, hydrate, rerank and pack the context for one question.
+
+    /chat/batch passes the question's `embedded_query` from its batch call
+    and a `chunk_lookup` shared by the questions of the batch.
+    """
+    # Shared clients are built once in the app lifespan and reused here
+    # Blocking SDK calls run on bounded stage executors so the event loop stays free
+    if embedded_query is None:
+        with resources.use("embeddings") as embed_model, span("embed_query"):
+            if EMBED_BATCH_ENABLED:
+                # Concurrent questions share one batch embedding call
+                embedded_query = await query_batcher.embed(embed_model, question)
+            else:
+                embedded_query = await chat_stages["embed"].run(embed_model.embed_query, question)
+
+    # Retrieve more candidates than fit, the context builder picks within the token budget
+    # Only the collection's namespace is searched, and within it only the requested documents
+    doc_filter = document_filter(files)
+    top_k = RERANK_CANDIDATES if RERANK_ENABLED else CONTEXT_CANDIDATES
+    with resources.use("index") as index, span("vector_query"):
+        res = await chat_stages["query"].run(
+            index.query,
+            vector=embedded_query,
+            top_k=top_k,
+            include_metadata=True,
+            include_values=True,  # For near-duplicate detection
+            namespace=namespace,
+            filter=doc_filter,
         )
-        
-        # DEBUG: Check Pinecone response
-        logger.info(f"Pinecone matches found: {len(res['matches'])}")
-        for i, match in enumerate(res['matches']):
-            score = match.get('score', 0)
-            metadata = match.get('metadata', {})
-            text_length = len(metadata.get('text', ''))
-            logger.info(f"Match {i}: score={score:.3f}, text_length={text_length}")
+
+    logger.info("Pinecone matches found: %d", len(res['matches']))
+    matches = res["matches"]
+    if BM25_ENABLED:
+        # Exact terms (part numbers, error codes, names) the embedding may miss
+        with span("keyword_search"):
+            keyword_hits = await chat_stages["query"].run(get_bm25_index(namespace).search, question, top_k)
+        with span("fusion"):
+            allowed = set(doc_filter["filename"]["$in"]) if doc_filter else None
+            matches = await fuse_keyword_matches(resources, embedded_query, matches, keyword_hits, namespace, allowed)
+
+    stored = None
+    if CHUNK_STORE_ENABLED and matches:
+        # Texts of every candidate in one lookup, the index only returns ids and filter fields
+        with span("hydrate"):
+            lookup = chunk_lookup or get_chunk_store().get_many
+            stored = await chat_stages["query"].run(lookup, [match["id"] for match in matches], namespace)
+
+    # Per-match previews only for traced requests (all of them at DEBUG level)
+    trace = should_trace()
+    if trace:
+        for i, match in enumerate(matches):
+            metadata = (stored or {}).get(match["id"]) or match.get('metadata', {})
+            logger.info("Match %d: score=%.3f, text_length=%d", i, match.get('score', 0), len(metadata.get('text', '')))
             if metadata.get('text'):
-                logger.info(f"Match {i} text preview: {metadata['text'][:200]}...")
-
-        # Process documents with better validation
-        docs = []
-        seen_content = set()  # Avoid duplicate content
-        
-        for match in res["matches"]:
-            metadata = match["metadata"]
-            text = metadata.get("text", "").strip()
-            
-            # Enhanced content handling
-            if len(text) <= 3 or text.isdigit():  # Just page numbers or minimal content
-                # Try to create meaningful content from metadata
-                enhanced_content = []
-                
-                if metadata.get('title'):
-                    enhanced_content.append(f"Title: {metadata['title']}")
-                
-                if metadata.get('subject'):
-                    enhanced_content.append(f"Subject: {metadata['subject']}")
-                
-                if metadata.get('keywords'):
-                    enhanced_content.append(f"Keywords: {metadata['keywords']}")
-                
-                if metadata.get('author'):
-                    enhanced_content.append(f"Author: {metadata['author']}")
-                
-                page_info = metadata.get('page_label', metadata.get('page', ''))
-                if page_info:
-                    enhanced_content.append(f"Page: {page_info}")
-                
-                if enhanced_content:
-                    text = "\n".join(enhanced_content)
-                else:
-                    continue  # Skip if no meaningful content
-            
-            # Skip duplicates and very short content
-            if text in seen_content or len(text) < 20:
-                continue
-                
-            seen_content.add(text)
-            
-            docs.append(Document(
-                page_content=text,
-                metadata={
-                    "source": metadata.get("filename", metadata.get("source", "Unknown")),
-                    "page": metadata.get("page_label", metadata.get("page", "Unknown")),
-                    "title": metadata.get("title", "Unknown"),
-                    "score": match.get("score", 0)
-                }
-            ))
-            
-            # Limit to top documents
-            if len(docs) >= 5:
-                break
-        
-        logger.info(f"Created {len(docs)} valid documents for retrieval")
-        
+                logger.info("Match %d text preview: %.200s...", i, metadata['text'])
+
+    with span("filter"):
+        candidates = build_candidates(matches, stored)
+
+    if RERANK_ENABLED:
+        # Rescore the over-fetched candidates against the question text, vector order if out of time
+        with resources.use("reranker") as reranker, span("rerank"):
+            candidates = await reranker.rerank(question, candidates)
+
+    # Best non-redundant chunks within the token budget, neighbouring chunks merged
+    with span("prompt_build"):
+        packed = pack_context(candidates)
+        prompt_tokens = PROMPT_OVERHEAD_TOKENS + count_tokens(question) + packed.tokens
+    docs = packed.docs
+    doc_files = {doc.metadata["source"] for doc in docs}
+    logger.info(
+        "Packed %d of %d candidates into %d context tokens (%d duplicates, %d over budget, %d merged)",
+        len(packed.doc_ids), packed.candidates, packed.tokens, packed.duplicates, packed.over_budget, packed.merged,
+    )
+
+    if trace:
+        for i, doc in enumerate(docs):
+            logger.info("Doc %d preview: %.100s...", i, doc.page_content)
+
+    # Extract sources from documents
+    sources = []
+    for doc in docs:
+        source_info = {
+            "source": doc.metadata.get("source", "Unknown"),
+            "page": doc.metadata.get("page", "Unknown"),
+            "title": doc.metadata.get("title", "Unknown"),
+            "relevance_score": round(doc.metadata.get("similarity", doc.metadata.get("score", 0)), 3)
+        }
+        if source_info not in sources:
+            sources.append(source_info)
+
+    return RetrievedContext(embedded_query, docs, packed.doc_ids, doc_files, sources, prompt_tokens, namespace)
+
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    """503 telling the client when the provider has room again"""
+    logger.warning("Shedding question: %s", e)
+    return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+@router.post("/chat/")
+async def ask_question(
+    request: Request,
+    question: str = Form(...),
+    collection: str = Form(DEFAULT_COLLECTION),
+    files: Optional[List[str]] = Form(None),
+):
+    """Answer a question from one collection, optionally only from some of its documents (`files`)"""
+    start = time.perf_counter()
+    try:
+        logger.info("user query: %s", question)
+
+        resources = request.app.state.resources
+        context = await retrieve_context(resources, question, collection_namespace(collection), files)
+
         # If no valid documents found, return helpful message
-        if not docs:
+        if not context.docs:
             return JSONResponse(
                 status_code=200,
                 content={
-                    "answer": "I couldn't find relevant information to answer your question. The documents may not contain the information you're looking for, or they may need to be re-indexed with better content extraction.",
+                    "answer": NO_CONTEXT_ANSWER,
                     "sources": []
                 }
             )
 
-        # Custom retriever class
-        class SimpleRetriever(BaseRetriever):
-            tags: Optional[List[str]] = Field(default_factory=list)
-            metadata: Optional[dict] = Field(default_factory=dict)
+        # Near-identical questions over the same documents reuse the stored answer
+        answer_cache = get_answer_cache() if ANSWER_CACHE_ENABLED else None
+        if answer_cache is not None:
+            cached = answer_cache.lookup(context.embedded_query, context.doc_ids, context.namespace)
+            if cached is not None:
+                logger.info("Answer cache hit, skipping the LLM")
+                chat_latency.record("chat_total", time.perf_counter() - start)
+                return JSONResponse(status_code=200, content=cached)
 
-            def __init__(self, documents: List[Document]):
-                super().__init__()
-                self._docs = documents
+        logger.info("Prompt tokens: %d", context.prompt_tokens)
+        chat_latency.observe("prompt_tokens", context.prompt_tokens)
+        llm_start = time.perf_counter()
+        with resources.use("chain") as chain, span("llm"):
+            result = await chat_stages["llm"].run_async(aquery_chain(chain, question, documents=context.docs))
+        llm_seconds = time.perf_counter() - llm_start
 
-            def _get_relevant_documents(self, query: str) -> List[Document]:
-                return self._docs
+        sources = context.sources
 
-        # Log document previews for debugging
-        for i, doc in enumerate(docs):
-            logger.info(f"Doc {i} preview: {doc.page_content[:100]}...")
-
-        retriever = SimpleRetriever(docs)
-        chain = get_llm_chain(retriever)
-        result = query_chain(chain, question)
-        
-        # Extract sources from documents
-        sources = []
-        for doc in docs:
-            source_info = {
-                "source": doc.metadata.get("source", "Unknown"),
-                "page": doc.metadata.get("page", "Unknown"),
-                "title": doc.metadata.get("title", "Unknown"),
-                "relevance_score": round(doc.metadata.get("score", 0), 3)
-            }
-            if source_info not in sources:
-                sources.append(source_info)
-        
         # Ensure consistent response structure
         if isinstance(result, dict):
             # The result from query_chain already has the right structure
             answer = result.get("answer") or result.get("response") or "No answer provided"
             result_sources = result.get("sources", [])
-            
+
             # Merge sources from result and extracted sources
             all_sources = result_sources if result_sources else sources
-            
+
             response = {
                 "answer": answer,
                 "sources": all_sources
@@ -163,14 +314,322 @@ async def ask_question(question: str = Form(...)):
                 "answer": str(result),
                 "sources": sources
             }
-        
-        logger.info(f"Sending response with {len(response['sources'])} sources")
+
+        if answer_cache is not None and not (isinstance(result, dict) and result.get("error")):
+            answer_cache.store(
+                question, context.embedded_query, context.doc_ids, context.doc_files, response, llm_seconds, context.namespace
+            )
+
+        llm_tokens.inc(context.prompt_tokens, kind="prompt")
+        llm_tokens.inc(count_tokens(response["answer"]), kind="completion")
+        logger.info("Sending response with %d sources", len(response['sources']))
         logger.info("query successful")
-        return JSONResponse(status_code=200, content=response)
+        chat_latency.record("chat_total", time.perf_counter() - start)
+        return JSONResponse(status_code=200, content=response, headers={"X-Prompt-Tokens": str(context.prompt_tokens)})
+
+    except InvalidCollection as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    except StageTimeout as e:
+        logger.error("Timed out processing question: %s", e)
+        return JSONResponse(
+            status_code=504,
+            content={"error": str(e)}
+        )
 
     except Exception as e:
         logger.exception("Error processing question")
         return JSONResponse(
-            status_code=500, 
+            status_code=500,
             content={"error": f"Internal server error: {str(e)}"}
-        )
\ No newline at end of file
+        )
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _answer_events(resources, question: str, context: RetrievedContext, start: float):
+    """Server-sent events for one answer: sources, then tokens, then a summary"""
+    timings = {}
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    yield _sse("sources", context.sources)
+    timings["ttfb_ms"] = elapsed_ms()
+    chat_latency.record("stream_ttfb", timings["ttfb_ms"] / 1000)
+
+    if not context.docs:
+        yield _sse("token", {"text": NO_CONTEXT_ANSWER})
+        yield _sse("done", {"answer": NO_CONTEXT_ANSWER, "cached": False, **timings, "total_ms": elapsed_ms()})
+        return
+
+    answer_cache = get_answer_cache() if ANSWER_CACHE_ENABLED else None
+    if answer_cache is not None:
+        cached = answer_cache.lookup(context.embedded_query, context.doc_ids, context.namespace)
+        if cached is not None:
+            logger.info("Answer cache hit, skipping the LLM")
+            yield _sse("token", {"text": cached["answer"]})
+            yield _sse("done", {"answer": cached["answer"], "cached": True, **timings, "total_ms": elapsed_ms()})
+            chat_latency.record("stream_total", time.perf_counter() - start)
+            return
+
+    # The llm stage bounds concurrent generations and the whole stream's duration
+    stage = chat_stages["llm"]
+    chat_latency.observe("prompt_tokens", context.prompt_tokens)
+    tokens = []
+    llm_start = time.perf_counter()
+    try:
+        async with stage.slot():
+            with resources.use("chain") as chain, span("llm"):
+                stream = astream_chain(chain, question, documents=context.docs)
+                deadline = time.perf_counter() + stage.timeout
+                while True:
+                    try:
+                        token = await asyncio.wait_for(stream.__anext__(), timeout=max(0.0, deadline - time.perf_counter()))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise StageTimeout(stage.name, stage.timeout) from None
+                    if not tokens:
+                        timings["first_token_ms"] = elapsed_ms()
+                        chat_latency.record("stream_first_token", timings["first_token_ms"] / 1000)
+                    tokens.append(token)
+                    yield _sse("token", {"text": token})
+    except asyncio.CancelledError:
+        # Client went away: Starlette cancels the response and with it the LLM request
+        logger.info("Client disconnected after %d streamed tokens, generation cancelled", len(tokens))
+        chat_latency.increment("stream_cancelled")
+        raise
+    except StageTimeout as e:
+        logger.error("Timed out streaming answer: %s", e)
+        yield _sse("error", {"error": str(e)})
+        return
+    except Overloaded as e:
+        logger.warning("Shedding streamed answer: %s", e)
+        yield _sse("error", {"error": str(e), "retry_after": math.ceil(e.retry_after)})
+        return
+    except Exception:
+        logger.exception("Error streaming answer")
+        yield _sse("error", {"error": "Failed to process the query."})
+        return
+
+    answer = "".join(tokens)
+    llm_tokens.inc(context.prompt_tokens, kind="prompt")
+    llm_tokens.inc(count_tokens(answer), kind="completion")
+    if answer_cache is not None and answer:
+        answer_cache.store(
+            question, context.embedded_query, context.doc_ids, context.doc_files,
+            {"answer": answer, "sources": context.sources}, time.perf_counter() - llm_start, context.namespace,
+        )
+    yield _sse("done", {
+        "answer": answer, "cached": False, "prompt_tokens": context.prompt_tokens, **timings, "total_ms": elapsed_ms(),
+    })
+    chat_latency.record("stream_total", time.perf_counter() - start)
+    logger.info("streamed query successful")
+
+
+@router.post("/chat/stream")
+async def stream_answer(
+    request: Request,
+    question: str = Form(...),
+    collection: str = Form(DEFAULT_COLLECTION),
+    files: Optional[List[str]] = Form(None),
+):
+    """Like /chat/ but answers as server-sent events while the LLM generates.
+
+    Events: `sources` (list) first, then one `token` per chunk of answer text,
+    then `done` with the full answer, `prompt_tokens` and timings (`ttfb_ms`,
+    `first_token_ms`, `total_ms`), or `error`. Closing the connection cancels
+    the generation. `collection` and `files` scope retrieval as for /chat/.
+    """
+    start = time.perf_counter()
+    try:
+        logger.info("user query (stream): %s", question)
+        resources = request.app.state.resources
+        context = await retrieve_context(resources, question, collection_namespace(collection), files)
+    except InvalidCollection as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Overloaded as e:
+        return overloaded_response(e)
+    except StageTimeout as e:
+        logger.error("Timed out processing question: %s", e)
+        return JSONResponse(status_code=504, content={"error": str(e)})
+    except Exception as e:
+        logger.exception("Error processing question")
+        return JSONResponse(status_code=500, content={"error": f"Internal server error: {str(e)}"})
+
+    return StreamingResponse(
+        _answer_events(resources, question, context, start),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _answer_batch_question(resources, group: List[dict], embedded_query, namespace: str, chunks, answer_cache, stats: dict) -> dict:
+    """Answer for the first question of a group of duplicates"""
+    question, files = group[0]["question"], group[0]["files"]
+    start = time.perf_counter()
+    context = await retrieve_context(
+        resources, question, namespace, files,
+        embedded_query=embedded_query, chunk_lookup=chunks.get_many if chunks is not None else None,
+    )
+    if not context.docs:
+        stats["no_context"] += 1
+        return {"answer": NO_CONTEXT_ANSWER, "sources": [], "cached": False}
+
+    if answer_cache is not None:
+        cached = answer_cache.lookup(context.embedded_query, context.doc_ids, context.namespace)
+        if cached is not None:
+            stats["cached"] += 1
+            return {**cached, "cached": True, "ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    llm_start = time.perf_counter()
+    with resources.use("chain") as chain, span("llm"):
+        result = await generation_scheduler.run(
+            lambda: chat_stages["llm"].run_async(aquery_chain(chain, question, documents=context.docs, raise_errors=True)),
+        )
+    response = {
+        "answer": result.get("answer") or result.get("response") or "No answer provided",
+        "sources": result.get("sources") or context.sources,
+    }
+    if answer_cache is not None:
+        answer_cache.store(
+            question, context.embedded_query, context.doc_ids, context.doc_files, response, time.perf_counter() - llm_start, context.namespace
+        )
+    llm_tokens.inc(context.prompt_tokens, kind="prompt")
+    llm_tokens.inc(count_tokens(response["answer"]), kind="completion")
+    return {
+        **response, "cached": False, "prompt_tokens": context.prompt_tokens,
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+async def answer_batch(resources, items: List[dict], namespace: str = "", use_cache: bool = True):
+    """Answers to parsed batch questions as they complete, then a summary.
+
+    Yields one dict per question (`id`, `question`, then the answer fields
+    or `error`; repeated questions add `duplicate_of`) in completion order,
+    and finally {"summary": {...}}.
+    """
+    start = time.perf_counter()
+    groups = group_duplicates(items)
+    chunks = ChunkCache(get_chunk_store()) if CHUNK_STORE_ENABLED else None
+    answer_cache = get_answer_cache() if ANSWER_CACHE_ENABLED and use_cache else None
+    stats = {"answered": 0, "failed": 0, "cached": 0, "no_context": 0}
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(BATCH_QUERY_CONCURRENCY)
+    tasks = set()
+
+    async def answer(group, embedded_query):
+        try:
+            result = await _answer_batch_question(resources, group, embedded_query, namespace, chunks, answer_cache, stats)
+        except (StageTimeout, Overloaded) as e:
+            result = {"error": str(e)}
+        except Exception as e:
+            logger.exception("Error answering batch question")
+            result = {"error": f"Internal server error: {str(e)}"}
+        finally:
+            slots.release()
+        await results.put((group, result))
+
+    async def produce_answers():
+        for i in range(0, len(groups), BATCH_EMBED_SIZE):
+            window = groups[i:i + BATCH_EMBED_SIZE]
+            try:
+                with resources.use("embeddings") as embed_model, span("embed_query"):
+                    vectors = await chat_stages["embed"].run(embed_query_batch, embed_model, [group[0]["question"] for group in window])
+            except Exception as e:
+                logger.error("Embedding %d batch questions failed: %s", len(window), e)
+                for group in window:
+                    await results.put((group, {"error": f"Embedding failed: {str(e)}"}))
+                continue
+            for group, vector in zip(window, vectors):
+                # Embedding the next window overlaps with answering this one
+                await slots.acquire()
+                task = asyncio.create_task(answer(group, vector))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        while tasks:
+            await asyncio.gather(*tasks)
+
+    async def produce():
+        try:
+            # Every provider call of the batch, here and in the tasks started from here, waits behind /chat/
+            with bulk():
+                await produce_answers()
+        finally:
+            await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            entry = await results.get()
+            if entry is None:
+                break
+            group, result = entry
+            stats["failed" if "error" in result else "answered"] += len(group)
+            first = group[0]
+            for item in group:
+                line = {"id": item["id"], "question": item["question"], **result}
+                if item is not first:
+                    line["duplicate_of"] = first["id"]
+                yield line
+    finally:
+        # Client went away or the run ended: stop whatever is still in flight
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+    seconds = time.perf_counter() - start
+    yield {"summary": {
+        "questions": len(items),
+        "unique": len(groups),
+        **stats,
+        "chunks_fetched": chunks.fetched if chunks is not None else 0,
+        "chunks_reused": chunks.reused if chunks is not None else 0,
+        "seconds": round(seconds, 3),
+        "questions_per_min": round(len(items) / seconds * 60, 1) if seconds else 0,
+    }}
+
+
+@router.post("/chat/batch")
+async def ask_batch(
+    request: Request,
+    questions: UploadFile = File(...),
+    collection: str = Form(DEFAULT_COLLECTION),
+    use_cache: bool = Form(True),
+):
+    """Answer a JSONL file of questions from one collection, streamed back as NDJSON.
+
+    Each line of `questions` is a question string or an object with
+    `question` and optionally `id` and `files`. Answers come back one JSON
+    object per line as they complete, followed by a `summary` line with
+    counts and questions per minute. `use_cache=false` bypasses the answer
+    cache, e.g. to evaluate a prompt or model change.
+    """
+    try:
+        namespace = collection_namespace(collection)
+        raw = await questions.read()
+        items = parse_questions(raw.decode("utf-8-sig").splitlines())
+    except (InvalidCollection, InvalidBatch) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except UnicodeDecodeError:
+        return JSONResponse(status_code=400, content={"error": "Questions file must be UTF-8 JSONL"})
+    if not items:
+        return JSONResponse(status_code=400, content={"error": "No questions in the file"})
+
+    logger.info("Batch of %d questions for collection %s", len(items), collection)
+    resources = request.app.state.resources
+    lines = answer_batch(resources, items, namespace, use_cache)
+
+    async def ndjson():
+        async for line in lines:
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from modules.bm25_index import BM25_ENABLED, get_bm25_index
+from modules.manifest import get_manifest
+from modules.namespaces import (
+    InvalidCollection, collection_name, collection_namespace, delete_collection, delete_document,
+)
+from modules.vectorstore import namespace_counts
+from logger import logger
+
+router = APIRouter()
+
+
+@router.get("/collections")
+async def list_collections(request: Request):
+    """Every collection in the index with its vector count"""
+    with request.app.state.resources.use("index") as index:
+        counts = await run_in_threadpool(namespace_counts, index)
+    return {
+        "collections": [
+            {"collection": collection_name(namespace), "vectors": count}
+            for namespace, count in sorted(counts.items())
+        ]
+    }
+
+
+@router.get("/collections/{collection}")
+async def collection_stats(request: Request, collection: str):
+    """Vectors, indexed documents and keyword index size of one collection"""
+    try:
+        namespace = collection_namespace(collection)
+    except InvalidCollection as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    with request.app.state.resources.use("index") as index:
+        counts = await run_in_threadpool(namespace_counts, index)
+    files = get_manifest().files(namespace)
+    if namespace not in counts and not files:
+        return JSONResponse(status_code=404, content={"error": f"Unknown collection {collection}"})
+    stats = {"collection": collection_name(namespace), "vectors": counts.get(namespace, 0), "files": files}
+    if BM25_ENABLED:
+        stats["keyword_index"] = get_bm25_index(namespace).info()
+    return stats
+
+
+@router.delete("/collections/{collection}")
+async def remove_collection(request: Request, collection: str):
+    """Delete a collection's vectors, keyword index, manifest entries and stored files"""
+    try:
+        namespace = collection_namespace(collection)
+        with request.app.state.resources.use("index") as index:
+            if namespace not in await run_in_threadpool(namespace_counts, index) and not get_manifest().files(namespace):
+                return JSONResponse(status_code=404, content={"error": f"Unknown collection {collection}"})
+            return await run_in_threadpool(delete_collection, index, namespace)
+    except InvalidCollection as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.exception("Error deleting collection %s", collection)
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.delete("/collections/{collection}/documents/{filename}")
+async def remove_document(request: Request, collection: str, filename: str):
+    """Delete one document from a collection"""
+    try:
+        namespace = collection_namespace(collection)
+        if get_manifest().content_hash(filename, namespace) is None:
+            return JSONResponse(status_code=404, content={"error": f"{filename} is not indexed in {collection}"})
+        with request.app.state.resources.use("index") as index:
+            return await run_in_threadpool(delete_document, index, filename, namespace)
+    except InvalidCollection as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.exception("Error deleting %s from collection %s", filename, collection)
+        return JSONResponse(status_code=500, content={"error": str(e)})
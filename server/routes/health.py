@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from modules.resources import STARTUP_WARMUP
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readiness(request: Request):
+    """503 until the shared clients are built and the ingestion queue is running"""
+    resources = request.app.state.resources
+    ingestion = getattr(request.app.state, "ingestion", None)
+    # Without warmup clients are built by the first request that needs them
+    pending = "lazy" if STARTUP_WARMUP == "off" else "starting"
+    checks = {
+        name: "ready" if stats["ready"] else stats["error"] or pending
+        for name, stats in resources.stats()["resources"].items()
+    }
+    checks["ingestion"] = "ready" if ingestion is not None and ingestion.running else "starting"
+    ready = all(status in ("ready", "lazy") for status in checks.values())
+    return JSONResponse(status_code=200 if ready else 503, content={"status": "ready" if ready else "starting", "checks": checks})
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from modules.metrics import registry
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics():
+    """Stage latency histograms and pipeline counters in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Request
+from modules.answer_cache import get_answer_cache
+from modules.batch_questions import generation_scheduler
+from modules.bm25_index import get_bm25_index
+from modules.chunk_store import get_chunk_store
+from modules.embed_batcher import query_batcher
+from modules.embedding_cache import get_embedding_cache
+from modules.latency import chat_latency
+from modules.rate_limit import limiters
+
+router = APIRouter()
+
+@router.get("/stats/pool")
+async def pool_stats(request: Request):
+    """Usage counters for the shared Pinecone / embedding / LLM clients"""
+    return request.app.state.resources.stats()
+
+
+@router.get("/stats/embedding-cache")
+async def embedding_cache_stats():
+    """Hit/miss counters of the persistent embedding cache"""
+    return get_embedding_cache().info()
+
+
+@router.get("/stats/embed-batcher")
+async def embed_batcher_stats():
+    """Batch sizes and queue waits of coalesced query embeddings"""
+    return query_batcher.info()
+
+
+@router.get("/stats/answer-cache")
+async def answer_cache_stats():
+    """Hit rate and LLM time saved by the semantic answer cache"""
+    return get_answer_cache().info()
+
+
+@router.get("/stats/bm25")
+async def bm25_stats():
+    """Size of the local keyword index used for hybrid retrieval"""
+    return get_bm25_index().info()
+
+
+@router.get("/stats/chunk-store")
+async def chunk_store_stats():
+    """Chunks, documents and compressed bytes in the local chunk store"""
+    return get_chunk_store().info()
+
+
+@router.get("/stats/batch-scheduler")
+async def batch_scheduler_stats():
+    """Calls, rate-limit retries and pacing of /chat/batch generations"""
+    return generation_scheduler.info()
+
+
+@router.get("/stats/rate-limits")
+async def rate_limit_stats():
+    """Current rate, queued callers, 429s, retries and shed requests per provider"""
+    return {provider: limiter.info() for provider, limiter in limiters.items()}
+
+
+@router.get("/stats/chat")
+async def chat_latency_stats():
+    """Latency percentiles of /chat/ and /chat/stream (time to first byte, first token, total) and prompt tokens"""
+    return chat_latency.summary()
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from typing import List
-from modules.load_vectorstore import load_vectorstore
+from modules.ingest_jobs import QueueFull
+from modules.namespaces import DEFAULT_COLLECTION, InvalidCollection, collection_name, collection_namespace
+from modules.pdf_handler import release_uploads, save_uploaded_files
+from modules.upload_store import UploadTooLarge
 from fastapi.responses import JSONResponse
 from logger import logger
 
@@ -8,14 +12,58 @@ from logger import logger
 router=APIRouter()
 
 @router.post("/upload/")
-async def upload_pdfs(files:List[UploadFile] = File(...)):
+async def upload_pdfs(request: Request, files:List[UploadFile] = File(...), collection: str = Form(DEFAULT_COLLECTION)):
     try:
-        logger.info("Recieved uploaded files")
-        load_vectorstore(files)
-        logger.info("Document added to vectorstore")
-        return {"messages":"Files processed and vectorstore updated"}
+        # Each collection is its own index namespace, chat only searches the one it names
+        namespace = collection_namespace(collection)
+        logger.info("Recieved uploaded files for collection %s", collection_name(namespace))
+        # Streamed to disk in chunks and hashed on the way, never read into memory whole
+        uploads = await run_in_threadpool(save_uploaded_files, files, namespace)
+        # Parsing, embedding and upserting run in the background ingestion queue, which
+        # reads the stored objects: the names can be uploaded again before the job runs
+        try:
+            job = request.app.state.ingestion.submit(
+                [upload.path for upload in uploads],
+                file_hashes={upload.path: upload.sha256 for upload in uploads},
+                collection=collection_name(namespace),
+                sources={upload.path: upload.object for upload in uploads},
+            )
+        except Exception:
+            release_uploads(uploads)
+            raise
+        return JSONResponse(
+            status_code=202,
+            content={
+                "messages": "Files queued for processing", "job_id": job["id"], "status": job["status"],
+                "collection": job["collection"],
+                # Same bytes as an upload already stored, kept once on disk
+                "deduplicated": [upload.filename for upload in uploads if upload.duplicate],
+            }
+        )
+    except InvalidCollection as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except UploadTooLarge as e:
+        logger.warning("Rejected upload: %s", e)
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except QueueFull as e:
+        logger.warning("Rejected upload: %s", e)
+        return JSONResponse(status_code=503, content={"error": str(e)})
     except Exception as e:
         logger.exception("Error during PDF upload")
         return JSONResponse(status_code=500,content={"error":str(e)})
-    
 
+
+@router.get("/upload/{job_id}")
+async def upload_status(request: Request, job_id: str):
+    job = request.app.state.ingestion.store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return job
+
+
+@router.delete("/upload/{job_id}")
+async def cancel_upload(request: Request, job_id: str):
+    job = request.app.state.ingestion.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return job
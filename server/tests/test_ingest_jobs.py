@@ -0,0 +1,157 @@
+import asyncio
+import functools
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from benchmarks.stubs import FakeEmbeddings, FakeIndex
+from benchmarks.synthetic_pdf import write_pdf
+from modules.bm25_index import BM25Index
+from modules.chunk_store import ChunkStore
+from modules.ingest_jobs import CANCELLED, COMPLETED, FINISHED_STATES, IngestionQueue, JobStore
+from modules.load_vectorstore import index_files
+from modules.manifest import DocumentManifest
+from modules.upload_store import UploadStore
+
+
+class RecordingIndex:
+    """index_fn stand-in that records when each job ran"""
+
+    def __init__(self, seconds: float = 0.1):
+        self.seconds = seconds
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def __call__(self, file_paths, **kwargs):
+        start = time.monotonic()
+        time.sleep(self.seconds)
+        with self._lock:
+            self.runs.append((tuple(file_paths), start, time.monotonic()))
+        return len(file_paths)
+
+
+class IngestionQueueOrderTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = RecordingIndex()
+        self.queue = IngestionQueue(JobStore(os.path.join(self.directory.name, "jobs.db")), workers=2, index_fn=self.index)
+        await self.queue.start()
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+        self.directory.cleanup()
+
+    async def wait_finished(self, *job_ids):
+        for _ in range(200):
+            if all(self.queue.store.get(job_id)["status"] in FINISHED_STATES for job_id in job_ids):
+                return
+            await asyncio.sleep(0.02)
+        self.fail("jobs did not finish")
+
+    async def test_jobs_for_the_same_file_run_in_submission_order(self):
+        first = self.queue.submit(["docs/a.pdf"])
+        second = self.queue.submit(["docs/a.pdf", "docs/b.pdf"])
+        other = self.queue.submit(["docs/c.pdf"])
+        await self.wait_finished(first["id"], second["id"], other["id"])
+
+        runs = {paths: (start, end) for paths, start, end in self.index.runs}
+        self.assertLessEqual(runs[("docs/a.pdf",)][1], runs[("docs/a.pdf", "docs/b.pdf")][0])
+        # A job for other files doesn't wait behind them
+        self.assertLess(runs[("docs/c.pdf",)][0], runs[("docs/a.pdf",)][1])
+        self.assertEqual(self.queue.store.get(second["id"])["status"], COMPLETED)
+        self.assertEqual(self.queue.pending, 0)
+
+    async def test_cancelling_a_waiting_job_lets_later_ones_run(self):
+        first = self.queue.submit(["docs/a.pdf"])
+        waiting = self.queue.submit(["docs/a.pdf"])
+        last = self.queue.submit(["docs/a.pdf"])
+        await asyncio.sleep(0.02)
+        self.queue.cancel(waiting["id"])
+        await self.wait_finished(first["id"], waiting["id"], last["id"])
+
+        self.assertEqual(self.queue.store.get(waiting["id"])["status"], CANCELLED)
+        self.assertEqual(self.queue.store.get(last["id"])["status"], COMPLETED)
+        self.assertEqual(len(self.index.runs), 2)
+        self.assertLessEqual(self.index.runs[0][2], self.index.runs[1][1])
+
+
+def pdf_bytes(directory: str, name: str, pages: int, word: str) -> bytes:
+    path = os.path.join(directory, name)
+    write_pdf(path, [[f"{word} page {page} line {line}." for line in range(30)] for page in range(pages)])
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ReuploadTest(unittest.IsolatedAsyncioTestCase):
+    """Two versions of one file uploaded back to back, before the first job ran"""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = self.directory.name
+        self.uploads = UploadStore(os.path.join(root, "uploads"))
+        self.manifest = DocumentManifest(os.path.join(root, "manifest.db"))
+        self.index = FakeIndex()
+        self.chunks = ChunkStore(os.path.join(root, "chunks.db"))
+        index_fn = functools.partial(
+            index_files, embed_model=FakeEmbeddings(), vector_index=self.index, manifest=self.manifest,
+            keyword_index=BM25Index(os.path.join(root, "bm25.db")), chunk_store=self.chunks,
+        )
+        self.queue = IngestionQueue(
+            JobStore(os.path.join(root, "jobs.db")), workers=2, index_fn=index_fn, upload_store=self.uploads
+        )
+        await self.queue.start()
+        self.versions = {
+            "long": pdf_bytes(root, "long.pdf", 12, "Second"),
+            "short": pdf_bytes(root, "short.pdf", 2, "First"),
+        }
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+        self.manifest.close()
+        self.chunks.close()
+        self.directory.cleanup()
+
+    def upload(self, version: str):
+        # What /upload/ does, without the HTTP layer
+        upload = self.uploads.save("doc.pdf", io.BytesIO(self.versions[version]), hold=True)
+        job = self.queue.submit(
+            [upload.path], file_hashes={upload.path: upload.sha256}, sources={upload.path: upload.object}
+        )
+        return upload, job
+
+    async def wait_finished(self, *job_ids):
+        for _ in range(500):
+            if all(self.queue.store.get(job_id)["status"] in FINISHED_STATES for job_id in job_ids):
+                return
+            await asyncio.sleep(0.02)
+        self.fail("jobs did not finish")
+
+    def assert_indexed(self, upload, pages: int):
+        self.assertEqual(self.manifest.content_hash(upload.path), upload.sha256)
+        self.assertEqual(set(self.index.vectors), self.manifest.chunk_ids(upload.path))
+        stored = self.chunks.get_many(self.index.vectors)
+        self.assertEqual({chunk["total_pages"] for chunk in stored.values()}, {pages})
+
+    async def test_index_holds_the_last_upload(self):
+        _, first = self.upload("long")
+        last, second = self.upload("short")
+        await self.wait_finished(first["id"], second["id"])
+
+        # Each job parsed the bytes it was submitted with
+        self.assertEqual(self.queue.store.get(first["id"])["files"][0]["pages"], 12)
+        self.assertEqual(self.queue.store.get(second["id"])["files"][0]["pages"], 2)
+        self.assert_indexed(last, pages=2)
+        # The replaced version's object went away once its job was done with it
+        self.assertEqual(self.uploads.info()["objects"], 1)
+
+        again, third = self.upload("long")
+        await self.wait_finished(third["id"])
+        self.assertNotEqual(self.queue.store.get(third["id"])["files"][0]["status"], "unchanged")
+        self.assert_indexed(again, pages=12)
+
+
+if __name__ == "__main__":
+    unittest.main()